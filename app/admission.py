@@ -0,0 +1,242 @@
+"""
+Admission control and load shedding for the HTTP API.
+
+Requests are grouped into classes (search, ingest, delete). Each class has a
+concurrency limit and a bounded wait queue, and all classes share a global
+capacity matching the worker threadpool. When a slot frees up, waiting
+requests of the highest-priority class are admitted first, so bulk ingestion
+cannot starve search. Priority only decides who gets the shared capacity: a
+request whose class has room is admitted while global capacity is left, even
+if a higher-priority class has requests waiting on its own limit. Requests are shed with 429 when their queue is full and
+with 503 when they have waited too long, both with a Retry-After hint.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.metrics import metrics
+
+
+@dataclass
+class AdmissionClass:
+    """Limits for one class of requests."""
+    name: str
+    limit: int
+    max_queue: int
+    queue_timeout: float
+    priority: int  # lower value is admitted first
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _ClassState:
+    def __init__(self, config: AdmissionClass):
+        self.config = config
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_ewma = 0.0
+        self.service_ewma = 0.0
+
+    def retry_after(self) -> int:
+        """Estimate how long until a queued request would be admitted."""
+        backlog = len(self.waiters) + self.in_flight
+        estimate = self.service_ewma * backlog / max(1, self.config.limit)
+        return int(min(60, max(1, math.ceil(estimate))))
+
+
+class AdmissionController:
+    """Priority-aware admission across request classes sharing a global capacity."""
+
+    def __init__(self, capacity: int, classes: Dict[str, AdmissionClass], clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the controller.
+
+        Args:
+            capacity: Maximum number of requests in flight across all classes
+            classes: Admission classes by name
+            clock: Monotonic clock, overridable for tests
+        """
+        self.capacity = capacity
+        self.in_flight = 0
+        self._clock = clock
+        self._classes = {name: _ClassState(config) for name, config in classes.items()}
+        self._by_priority = sorted(self._classes.values(), key=lambda state: state.config.priority)
+
+    def _has_room(self, state: _ClassState) -> bool:
+        return self.in_flight < self.capacity and state.in_flight < state.config.limit
+
+    def _admit(self, state: _ClassState):
+        self.in_flight += 1
+        state.in_flight += 1
+        state.admitted += 1
+
+    async def acquire(self, name: str) -> float:
+        """
+        Wait for a slot in the given class.
+
+        Args:
+            name: Admission class name
+
+        Returns:
+            Admission timestamp, to be passed back to release()
+
+        Raises:
+            AdmissionRejected: If the request is shed
+        """
+        state = self._classes[name]
+        start = self._clock()
+
+        if not state.waiters and self._has_room(state):
+            self._admit(state)
+            return start
+
+        if len(state.waiters) >= state.config.max_queue:
+            state.rejected_queue_full += 1
+            raise AdmissionRejected(429, state.retry_after(), f"Too many queued {name} requests")
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=state.config.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the timeout fired; keep the slot.
+                pass
+            else:
+                waiter.cancel()
+                state.waiters.remove(waiter)
+                state.rejected_timeout += 1
+                self._dispatch()
+                raise AdmissionRejected(503, state.retry_after(), f"Timed out waiting to admit {name} request")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(name, self._clock())
+            else:
+                waiter.cancel()
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+                self._dispatch()
+            raise
+
+        admitted_at = self._clock()
+        state.wait_ewma = 0.9 * state.wait_ewma + 0.1 * (admitted_at - start)
+        return admitted_at
+
+    def release(self, name: str, admitted_at: float):
+        """
+        Free the slot held by a finished request and admit waiting requests.
+
+        Args:
+            name: Admission class name
+            admitted_at: Value returned by acquire()
+        """
+        state = self._classes[name]
+        self.in_flight -= 1
+        state.in_flight -= 1
+        state.service_ewma = 0.9 * state.service_ewma + 0.1 * (self._clock() - admitted_at)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiting requests that have room, highest priority first."""
+        for state in self._by_priority:
+            while state.waiters and self._has_room(state):
+                waiter = state.waiters.popleft()
+                if waiter.done():
+                    continue
+                self._admit(state)
+                waiter.set_result(None)
+            if state.waiters and self.in_flight >= self.capacity:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the current admission state for metrics."""
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                name: {
+                    "limit": state.config.limit,
+                    "max_queue": state.config.max_queue,
+                    "priority": state.config.priority,
+                    "in_flight": state.in_flight,
+                    "queued": len(state.waiters),
+                    "admitted": state.admitted,
+                    "rejected_queue_full": state.rejected_queue_full,
+                    "rejected_timeout": state.rejected_timeout,
+                    "wait_ewma_ms": round(state.wait_ewma * 1000, 2),
+                    "service_ewma_ms": round(state.service_ewma * 1000, 2)
+                }
+                for name, state in self._classes.items()
+            }
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to HTTP requests.
+
+    The slot is held until the response body has been fully sent, so
+    streaming responses count against their class for their whole duration.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        classify: Callable[[str, str], Optional[str]]
+    ):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: Wrapped ASGI application
+            controller: Admission controller
+            classify: Maps (method, path) to an admission class name, or None to bypass
+        """
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = self.classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admitted_at = await self.controller.acquire(name)
+        except AdmissionRejected as e:
+            metrics.increment(f"admission.{name}.rejected_{e.status_code}")
+            response = JSONResponse(
+                {"detail": e.reason},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name, admitted_at)
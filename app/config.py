@@ -7,7 +7,7 @@ FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY", "fc-XXXXXXXx")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "XXXXXX")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")  # Options: gemini, openai, huggingface
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")  # Options: gemini, openai, huggingface, sidecar
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
 HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
@@ -19,3 +19,111 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "XXXXXXXXXXXX")
 MAX_CHUNK_SIZE = int(os.getenv("MAX_CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
 CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "paragraph")  # paragraph, sentence, token
+CHUNKING_WORKERS = int(os.getenv("CHUNKING_WORKERS", "1"))  # 1 = chunk in-process, 0 = one worker per CPU core
+CHUNKING_BATCH_SIZE = int(os.getenv("CHUNKING_BATCH_SIZE", "16"))  # documents per worker task
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # OpenAI-compatible embeddings endpoint, empty = api.openai.com
+# Fallbacks must serve the primary's model, as vectors of different models cannot share a collection.
+# E.g. with EMBEDDING_PROVIDER=openai@http://tei-1:8080/v1 and OPENAI_EMBEDDING_MODEL and HUGGINGFACE_MODEL
+# both set to BAAI/bge-small-en-v1.5: "openai@http://tei-2:8080/v1,huggingface" (a replica, then the same model locally)
+EMBEDDING_FALLBACK_PROVIDERS = os.getenv("EMBEDDING_FALLBACK_PROVIDERS", "")
+EMBEDDING_HEDGE_DELAY_MS = int(os.getenv("EMBEDDING_HEDGE_DELAY_MS", "250"))  # 0 disables hedged requests
+EMBEDDING_BREAKER_FAILURES = int(os.getenv("EMBEDDING_BREAKER_FAILURES", "5"))
+EMBEDDING_BREAKER_RESET_SECONDS = float(os.getenv("EMBEDDING_BREAKER_RESET_SECONDS", "30"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "0"))  # texts kept as last-resort fallback, 0 = disabled
+
+OPENAI_MAX_TOKENS_PER_REQUEST = int(os.getenv("OPENAI_MAX_TOKENS_PER_REQUEST", "300000"))
+OPENAI_MAX_INPUTS_PER_REQUEST = int(os.getenv("OPENAI_MAX_INPUTS_PER_REQUEST", "2048"))
+OPENAI_MAX_INPUT_TOKENS = int(os.getenv("OPENAI_MAX_INPUT_TOKENS", "8191"))
+OPENAI_EMBEDDING_CONCURRENCY = int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "4"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "1000000"))  # 0 = unlimited
+OPENAI_LONG_INPUT_MODE = os.getenv("OPENAI_LONG_INPUT_MODE", "split")  # split, truncate
+
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000"))  # log span breakdown above this, 0 = never
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Debug-Trace")  # request header that asks for a Server-Timing response header
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # required in X-Admin-Token for /api/admin endpoints, which are disabled while unset
+
+QDRANT_TENANT_SHARDING = os.getenv("QDRANT_TENANT_SHARDING", "false").lower() == "true"  # custom shard key per tenant
+DEDICATED_TENANT_REFRESH_SECONDS = float(os.getenv("DEDICATED_TENANT_REFRESH_SECONDS", "30"))
+
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "40"))  # requests in flight across all classes, also sizes the threadpool
+ADMISSION_SEARCH_LIMIT = int(os.getenv("ADMISSION_SEARCH_LIMIT", "32"))
+ADMISSION_SEARCH_QUEUE = int(os.getenv("ADMISSION_SEARCH_QUEUE", "128"))
+ADMISSION_SEARCH_TIMEOUT_MS = float(os.getenv("ADMISSION_SEARCH_TIMEOUT_MS", "2000"))
+ADMISSION_INGEST_LIMIT = int(os.getenv("ADMISSION_INGEST_LIMIT", "4"))
+ADMISSION_INGEST_QUEUE = int(os.getenv("ADMISSION_INGEST_QUEUE", "16"))
+ADMISSION_INGEST_TIMEOUT_MS = float(os.getenv("ADMISSION_INGEST_TIMEOUT_MS", "30000"))
+ADMISSION_DELETE_LIMIT = int(os.getenv("ADMISSION_DELETE_LIMIT", "4"))
+ADMISSION_DELETE_QUEUE = int(os.getenv("ADMISSION_DELETE_QUEUE", "16"))
+ADMISSION_DELETE_TIMEOUT_MS = float(os.getenv("ADMISSION_DELETE_TIMEOUT_MS", "10000"))
+
+CONTENT_EXTRACTION = os.getenv("CONTENT_EXTRACTION", "true").lower() == "true"  # strip HTML boilerplate before chunking
+EXTRACTION_MIN_WORDS = int(os.getenv("EXTRACTION_MIN_WORDS", "5"))  # shorter blocks only kept after content in the same section
+EXTRACTION_MAX_LINK_DENSITY = float(os.getenv("EXTRACTION_MAX_LINK_DENSITY", "0.5"))  # fraction of block text inside links
+
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))  # query texts embedded together by batching providers (huggingface, sidecar), 1 = no micro-batching
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "2"))  # how long to collect queries for a batch
+
+SIDECAR_SOCKET_PATH = os.getenv("SIDECAR_SOCKET_PATH", "/tmp/kb-embeddings.sock")  # used with EMBEDDING_PROVIDER=sidecar
+SIDECAR_PROVIDER = os.getenv("SIDECAR_PROVIDER", "huggingface")  # provider loaded by the sidecar process itself
+SIDECAR_TIMEOUT_SECONDS = float(os.getenv("SIDECAR_TIMEOUT_SECONDS", "60"))
+
+INGEST_RETRY_ATTEMPTS = int(os.getenv("INGEST_RETRY_ATTEMPTS", "4"))  # tries per scrape, embed and store call, 1 = no retries
+INGEST_RETRY_BASE_DELAY_MS = float(os.getenv("INGEST_RETRY_BASE_DELAY_MS", "500"))  # first backoff cap, doubled per retry
+INGEST_RETRY_MAX_DELAY_MS = float(os.getenv("INGEST_RETRY_MAX_DELAY_MS", "8000"))
+INGEST_SPOOL_PATH = os.getenv("INGEST_SPOOL_PATH", "")  # SQLite file spooling ingestion stages, empty = no spool
+INGEST_SPOOL_LEASE_SECONDS = float(os.getenv("INGEST_SPOOL_LEASE_SECONDS", "300"))  # pages reserved by a worker while it drains them
+INGEST_SPOOL_DRAIN_INTERVAL_SECONDS = float(os.getenv("INGEST_SPOOL_DRAIN_INTERVAL_SECONDS", "30"))  # background retry of deferred pages
+INGEST_SPOOL_RETENTION_HOURS = float(os.getenv("INGEST_SPOOL_RETENTION_HOURS", "24"))  # finished jobs kept for status queries
+
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))  # crawler processes sharing one frontier
+CRAWL_FRONTIER_DIR = os.getenv("CRAWL_FRONTIER_DIR", "")  # keeps frontiers of interrupted crawl runs so retries of the same job resume, empty = temporary
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", "2"))  # fetches in flight per host, across all workers
+CRAWL_DELAY_MS = float(os.getenv("CRAWL_DELAY_MS", "500"))  # minimum time between fetch starts on one host
+CRAWL_LEASE_SECONDS = float(os.getenv("CRAWL_LEASE_SECONDS", "60"))  # URLs of a crashed worker are refetched after this
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "1000"))  # per crawl, 0 = unlimited
+CRAWL_MAX_ATTEMPTS = int(os.getenv("CRAWL_MAX_ATTEMPTS", "3"))
+CRAWL_BLOOM_CAPACITY = int(os.getenv("CRAWL_BLOOM_CAPACITY", "1000000"))  # distinct URLs the seen-filter is sized for
+CRAWL_BLOOM_ERROR_RATE = float(os.getenv("CRAWL_BLOOM_ERROR_RATE", "0.001"))  # share of new URLs wrongly skipped as seen
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "15"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "vector-scraper/1.0")
+
+# The semantic cache is opt-in: below a threshold of 1 it answers similar queries with another query's results,
+# and as it is per worker, another worker's ingests and deletes can stay unnoticed for up to the TTL.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "0"))  # cached queries per worker, 0 = no semantic cache
+QUERY_CACHE_THRESHOLD = float(os.getenv("QUERY_CACHE_THRESHOLD", "0.95"))  # cosine similarity at which a cached query is reused
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))  # upper bound on staleness across workers
+
+REINDEX_CHUNKS_PER_MINUTE = float(os.getenv("REINDEX_CHUNKS_PER_MINUTE", "6000"))  # re-embedding rate of a reindex, 0 = unlimited
+REINDEX_SYNC_SECONDS = float(os.getenv("REINDEX_SYNC_SECONDS", "10"))  # how often workers check for a new or building generation
+REINDEX_KEEP_PREVIOUS = os.getenv("REINDEX_KEEP_PREVIOUS", "true").lower() == "true"  # keep the replaced generation for rollback
+
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
+FIRECRAWL_TIMEOUT_SECONDS = float(os.getenv("FIRECRAWL_TIMEOUT_SECONDS", "60"))  # per request; scrapes of slow pages take a while
+FIRECRAWL_POOL_SIZE = int(os.getenv("FIRECRAWL_POOL_SIZE", "16"))  # keep-alive connections to the API
+FIRECRAWL_MAX_PAGES = int(os.getenv("FIRECRAWL_MAX_PAGES", "1000"))  # page limit of a crawl job
+FIRECRAWL_POLL_MIN_SECONDS = float(os.getenv("FIRECRAWL_POLL_MIN_SECONDS", "1"))  # crawl status polling starts here
+FIRECRAWL_POLL_MAX_SECONDS = float(os.getenv("FIRECRAWL_POLL_MAX_SECONDS", "15"))  # and backs off to this while no pages arrive
+FIRECRAWL_CRAWL_TIMEOUT_SECONDS = float(os.getenv("FIRECRAWL_CRAWL_TIMEOUT_SECONDS", "1800"))  # crawl jobs are cancelled after this
+FIRECRAWL_MAX_RETRY_AFTER_SECONDS = float(os.getenv("FIRECRAWL_MAX_RETRY_AFTER_SECONDS", "60"))  # cap on a 429's Retry-After
+
+SEARCH_DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS", "3000"))  # default time budget of a search, 0 = no deadline
+SEARCH_MAX_DEADLINE_MS = float(os.getenv("SEARCH_MAX_DEADLINE_MS", "30000"))  # cap on the deadlineMs a request may ask for
+SEARCH_EMBED_BUDGET_SHARE = float(os.getenv("SEARCH_EMBED_BUDGET_SHARE", "0.5"))  # share of the budget the query embedding may use
+SEARCH_MIN_STAGE_MS = float(os.getenv("SEARCH_MIN_STAGE_MS", "20"))  # stages are not started with less budget left than this
+SEARCH_DEGRADE_BELOW_MS = float(os.getenv("SEARCH_DEGRADE_BELOW_MS", "300"))  # below this, Qdrant searches cheaper and skips context fetches
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))  # query embeddings kept to serve when embedding is too slow
+QDRANT_TIMEOUT_SECONDS = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "10"))  # HTTP timeout of Qdrant requests
+
+RECRAWL_DB_PATH = os.getenv("RECRAWL_DB_PATH", "")  # SQLite file of the re-crawl scheduler, empty = no scheduled re-crawls
+RECRAWL_INTERVAL_SECONDS = float(os.getenv("RECRAWL_INTERVAL_SECONDS", "300"))  # time between two scheduling passes
+RECRAWL_PAGES_PER_HOUR = float(os.getenv("RECRAWL_PAGES_PER_HOUR", "600"))  # page fetches re-crawls may spend, 0 = unlimited
+RECRAWL_CHUNKS_PER_HOUR = float(os.getenv("RECRAWL_CHUNKS_PER_HOUR", "20000"))  # chunk embeddings re-crawls may spend, 0 = unlimited
+RECRAWL_MIN_STALENESS = float(os.getenv("RECRAWL_MIN_STALENESS", "0.3"))  # probability of having changed at which a page is due
+RECRAWL_MIN_INTERVAL_MINUTES = float(os.getenv("RECRAWL_MIN_INTERVAL_MINUTES", "60"))  # pages are never re-crawled sooner than this
+RECRAWL_DEFAULT_CHANGE_DAYS = float(os.getenv("RECRAWL_DEFAULT_CHANGE_DAYS", "7"))  # assumed days between changes of a new page
+
+QDRANT_UPLOAD_BATCH_BYTES = int(os.getenv("QDRANT_UPLOAD_BATCH_BYTES", str(4 * 1024 * 1024)))  # target size of one upsert request
+QDRANT_UPLOAD_PARALLEL = int(os.getenv("QDRANT_UPLOAD_PARALLEL", "4"))  # upsert requests in flight per store
+QDRANT_UPLOAD_WAIT = os.getenv("QDRANT_UPLOAD_WAIT", "true").lower() == "true"  # wait for every batch; false sends unacknowledged batches followed by one final barrier
@@ -0,0 +1,143 @@
+"""
+End-to-end deadlines for search requests.
+
+A search gets one time budget, from the request or SEARCH_DEADLINE_MS. Each
+stage (query embedding, the Qdrant call) runs with a timeout carved out of
+what is left of it, so a slow stage shrinks the budget of the next one
+instead of stretching the request. The caller stops waiting when a stage
+times out. The stage passes its own timeout down as the request timeout of
+the clients it calls (see stage_time_left), so its thread is not left
+running in the shared executor long after the caller has given up.
+"""
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional, TypeVar
+
+from app.config import SEARCH_DEADLINE_MS, SEARCH_MAX_DEADLINE_MS, SEARCH_MIN_STAGE_MS, ADMISSION_SEARCH_LIMIT
+from app.metrics import metrics
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Monotonic time at which the stage running in this context times out.
+_stage_expires_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("stage_expires_at", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of a request ran out before a stage could finish."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Search deadline of {budget * 1000:.0f} ms exceeded during {stage}")
+        self.stage = stage
+        self.budget = budget
+
+
+def _stage_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Room for every admitted search plus as many stages abandoned after their timeout.
+            _executor = ThreadPoolExecutor(max_workers=max(8, 2 * ADMISSION_SEARCH_LIMIT), thread_name_prefix="search-stage")
+        return _executor
+
+
+def stage_time_left() -> Optional[float]:
+    """
+    Seconds left for the deadline stage running in this context.
+
+    Lets code deep inside a stage bound its own waits by the stage timeout.
+
+    Returns:
+        Seconds left, None outside a stage or without a deadline
+    """
+    expires_at = _stage_expires_at.get()
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
+
+
+class Deadline:
+    """Time budget of one request, shared by its stages."""
+
+    def __init__(self, seconds: Optional[float], clock: Callable[[], float] = time.monotonic):
+        """
+        Start the budget.
+
+        Args:
+            seconds: Budget in seconds, None for no deadline
+            clock: Monotonic clock, overridable for tests
+        """
+        self.budget = seconds
+        self._clock = clock
+        self._expires_at = None if seconds is None else clock() + seconds
+
+    @classmethod
+    def from_ms(cls, deadline_ms: Optional[float] = None, **kwargs) -> "Deadline":
+        """
+        Deadline for a request asking for `deadline_ms`, or the server default.
+
+        Requested deadlines are capped at SEARCH_MAX_DEADLINE_MS; a default of 0 means none.
+        """
+        if deadline_ms is None:
+            deadline_ms = SEARCH_DEADLINE_MS
+        elif SEARCH_MAX_DEADLINE_MS > 0:
+            deadline_ms = min(deadline_ms, SEARCH_MAX_DEADLINE_MS)
+        return cls(deadline_ms / 1000 if deadline_ms > 0 else None, **kwargs)
+
+    def remaining(self) -> float:
+        """Seconds left, infinite without a deadline."""
+        if self._expires_at is None:
+            return math.inf
+        return max(0.0, self._expires_at - self._clock())
+
+    def stage_timeout(self, share: float = 1.0) -> Optional[float]:
+        """
+        Timeout for the next stage: `share` of the remaining budget, None without a deadline.
+        """
+        if self._expires_at is None:
+            return None
+        return self.remaining() * share
+
+    def tight(self, threshold: float) -> bool:
+        """Whether less than `threshold` seconds are left."""
+        return self.remaining() < threshold
+
+    def run(self, stage: str, fn: Callable[[], T], share: float = 1.0) -> T:
+        """
+        Run a stage within its share of the remaining budget.
+
+        Args:
+            stage: Stage name, for errors and the `search.deadline_exceeded.{stage}` counter
+            fn: Function to call without arguments
+            share: Fraction of the remaining budget the stage may use
+
+        Returns:
+            Result of `fn`
+
+        Raises:
+            DeadlineExceeded: If too little budget is left to start the stage, or it timed out
+        """
+        timeout = self.stage_timeout(share)
+        if timeout is None:
+            return fn()
+        if timeout < SEARCH_MIN_STAGE_MS / 1000:
+            raise self.exceeded(stage)
+        # Run in the caller's context so the stage's spans land in the request trace.
+        context = contextvars.copy_context()
+        context.run(_stage_expires_at.set, time.monotonic() + timeout)
+        future = _stage_executor().submit(context.run, fn)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise self.exceeded(stage) from None
+
+    def exceeded(self, stage: str) -> DeadlineExceeded:
+        """Count the exhausted deadline and build its error."""
+        metrics.increment("search.deadline_exceeded")
+        metrics.increment(f"search.deadline_exceeded.{stage}")
+        return DeadlineExceeded(stage, self.budget)
@@ -1,10 +1,51 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Iterable, Iterator, Tuple
+from collections import OrderedDict
 import datetime
+import threading
+import time
 
+from app.config import (
+    CHUNKING_WORKERS, CONTENT_EXTRACTION, QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS,
+    INGEST_RETRY_ATTEMPTS, INGEST_RETRY_BASE_DELAY_MS, INGEST_RETRY_MAX_DELAY_MS,
+    INGEST_SPOOL_PATH, INGEST_SPOOL_LEASE_SECONDS, INGEST_SPOOL_DRAIN_INTERVAL_SECONDS,
+    INGEST_SPOOL_RETENTION_HOURS, QUERY_CACHE_SIZE, QUERY_CACHE_THRESHOLD, QUERY_CACHE_TTL_SECONDS,
+    REINDEX_SYNC_SECONDS, SEARCH_EMBED_BUDGET_SHARE, SEARCH_DEGRADE_BELOW_MS, QUERY_EMBEDDING_CACHE_SIZE,
+    RECRAWL_DB_PATH
+)
+
+from app.deadline import Deadline
+from app.metrics import metrics
+from app.query_cache import SemanticQueryCache, cache_scope
+from app.recrawl import RecrawlScheduler, page_fingerprint
+from app.reindex import Reindexer, BUILDING, ACTIVE
+from app.retry import RetryPolicy, call_with_retry
 from app.scraper.firecrawl import FirecrawlProvider
+from app.processing.batch import ChunkBatch, as_embedding_matrix
 from app.processing.chunker import TextChunker
+from app.processing.extractor import extract_sections, looks_like_html
+from app.processing.parallel import ParallelChunker
 from app.processing.embeddings import get_embedding_provider
+from app.processing.batching import MicroBatchingEmbeddings
 from app.storage.qdrant_client import QdrantStorage
+from app.storage.spool import IngestionSpool, SpoolJob, SpooledPage, SCRAPED, CHUNKED, EMBEDDED, STORED, JOB_DONE
+from app.tracing import span
+
+# Deferred pages back off exponentially from the drain interval up to this many seconds.
+MAX_DEFER_SECONDS = 3600
+# Jobs are failed once a page has been deferred this many times.
+MAX_DEFERRALS = 12
+
+
+class IngestionDeferred(Exception):
+    """
+    Raised when a spooled ingestion could not be completed within its retries.
+
+    The remaining pages stay in the spool and are retried in the background.
+    """
+
+    def __init__(self, status: Dict[str, Any]):
+        super().__init__(f"Ingestion of {status['url']} deferred: {status['last_error']}")
+        self.status = status
 
 
 class KnowledgeBase:
@@ -12,15 +53,65 @@ class KnowledgeBase:
         """Initialize the knowledge base components."""
         self.scraper = FirecrawlProvider()
         self.chunker = TextChunker()
+        self.parallel_chunker = ParallelChunker() if CHUNKING_WORKERS != 1 else None
         self.embedder = get_embedding_provider()
+        self._query_batcher: Optional[MicroBatchingEmbeddings] = None
+        self._query_batcher_lock = threading.Lock()
         self.storage = QdrantStorage()
+        self.retry_policy = RetryPolicy(
+            attempts=INGEST_RETRY_ATTEMPTS,
+            base_delay=INGEST_RETRY_BASE_DELAY_MS / 1000,
+            max_delay=INGEST_RETRY_MAX_DELAY_MS / 1000
+        )
+        self.spool = IngestionSpool(INGEST_SPOOL_PATH, INGEST_SPOOL_LEASE_SECONDS) if INGEST_SPOOL_PATH else None
+        self._drainer: Optional[threading.Thread] = None
+        self._drainer_stop = threading.Event()
+        self.query_cache = SemanticQueryCache(
+            capacity=QUERY_CACHE_SIZE,
+            threshold=QUERY_CACHE_THRESHOLD,
+            ttl=QUERY_CACHE_TTL_SECONDS
+        ) if QUERY_CACHE_SIZE > 0 else None
+        self.reindexer = Reindexer(self)
+        self.recrawl = RecrawlScheduler(self, RECRAWL_DB_PATH) if RECRAWL_DB_PATH else None
+        # Bumped before and after switching to a new generation, so it is odd
+        # while the storage and embedder may not belong together.
+        self._generation = 0
+        self._generation_lock = threading.RLock()
+        self._generation_synced_at = float("-inf")
+        self._dual_write: Optional[Tuple[QdrantStorage, Any, Optional[TextChunker]]] = None
+        # Recent query embeddings by (model, normalized query), served when embedding is too slow.
+        self._query_embeddings: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+    
+    @property
+    def query_embedder(self):
+        """
+        Embedder for search queries, micro-batching concurrent queries for
+        providers that batch texts, unless disabled.
+        
+        Remote APIs that take one request per text gain nothing from it, and
+        would have every search wait on the single batching worker.
+        """
+        if QUERY_BATCH_MAX_SIZE <= 1 or not self.embedder.batches_texts:
+            return self.embedder
+        with self._query_batcher_lock:
+            if self._query_batcher is None or self._query_batcher.provider is not self.embedder:
+                if self._query_batcher is not None:
+                    self._query_batcher.close()
+                self._query_batcher = MicroBatchingEmbeddings(
+                    self.embedder,
+                    max_batch_size=QUERY_BATCH_MAX_SIZE,
+                    max_wait=QUERY_BATCH_MAX_WAIT_MS / 1000
+                )
+            return self._query_batcher
     
     def process_website(
         self, 
         url: str, 
         depth: int = 1, 
         parse_js: bool = False,
-        chunking_strategy: Optional[str] = None
+        chunking_strategy: Optional[str] = None,
+        tenant_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Process a website by scraping, chunking, embedding, and storing.
@@ -30,9 +121,13 @@ class KnowledgeBase:
             depth: Crawling depth
             parse_js: Whether to parse JavaScript
             chunking_strategy: Override default chunking strategy if provided
+            tenant_id: Optional tenant that owns the website's content
             
         Returns:
             Dictionary with processing stats
+            
+        Raises:
+            IngestionDeferred: If the spool is enabled and some pages are left for a later retry
         """
         if chunking_strategy:
             valid_strategies = ['paragraph', 'sentence', 'token']
@@ -43,53 +138,819 @@ class KnowledgeBase:
             else:
                 print(f"Warning: Invalid chunking strategy '{chunking_strategy}'. Using default strategy '{self.chunker.strategy}'.")
         
-        scraped_pages = self.scraper.scrape(url, depth, parse_js)
+        timestamp = datetime.datetime.now().isoformat()
+        self._sync_generation()
+        if self.spool is not None:
+            return self._process_spooled(url, depth, parse_js, tenant_id, timestamp)
+        generation = self._generation
         
-        total_chunks = 0
-        stored_ids = []
-        
-        for page in scraped_pages:
-            page_url = page.get("url", url)
-            chunks = self.chunker.chunk_text(
-                page.get("text", ""),
-                metadata={
-                    "url": page_url,
-                    "source": "web",
-                    "timestamp": datetime.datetime.now().isoformat()
-                }
+        with span("scrape"):
+            scraped_pages = call_with_retry(
+                lambda: self.scraper.scrape(url, depth, parse_js), self.retry_policy, "scrape"
             )
-            
-            if not chunks:
-                continue
-                
-            texts = [chunk["text"] for chunk in chunks]
-            embeddings = self.embedder.get_embeddings(texts)
-            chunk_ids = self.storage.store_embeddings(chunks, embeddings)
-            stored_ids.extend(chunk_ids)
-            total_chunks += len(chunks)
+        
+        fingerprints = {}
+        documents = (
+            document
+            for page in scraped_pages
+            for document in self._tracked_documents(page, url, timestamp, fingerprints)
+        )
+        total_chunks, stored_ids = self._ingest_documents(documents, tenant_id, generation)
+        self._observe_pages(fingerprints, tenant_id, parse_js)
         
         return {
             "url": url,
+            "tenant_id": tenant_id,
             "pages_processed": len(scraped_pages),
             "chunks_created": total_chunks,
             "vectors_stored": len(stored_ids)
         }
     
-    def search(self, query: str, limit: int = 5, url_filter: Optional[str] = None) -> List[Dict[str, Any]]:
-        query_embedding = self.embedder.get_embeddings([query])[0]
+    def _ingest_documents(
+        self,
+        documents: Iterable[Tuple[str, Dict[str, Any]]],
+        tenant_id: Optional[str],
+        generation: Optional[int] = None
+    ) -> Tuple[int, List[str]]:
+        """
+        Chunk, embed and store documents.
+        
+        Returns:
+            (number of chunks, stored point IDs)
+        """
+        total_chunks = 0
+        stored_ids = []
+        batches = self._merge_pages(self._chunk_documents(documents))
+        while True:
+            with span("chunk"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            if not batch:
+                continue
+            
+            embeddings = self._embed_batch(batch)
+            stored_ids.extend(self._store_batch(batch, embeddings, tenant_id, generation))
+            total_chunks += len(batch)
+        return total_chunks, stored_ids
+    
+    def refresh_page(
+        self,
+        url: str,
+        fingerprint: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        parse_js: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Re-crawl a single page, ingesting it again only if its content changed.
         
-        results = self.storage.search(
-            query_vector=query_embedding,
-            limit=limit,
-            url_filter=url_filter
+        Args:
+            url: Page URL
+            fingerprint: page_fingerprint of the content currently indexed
+            tenant_id: Tenant that owns the page
+            parse_js: Whether to parse JavaScript
+            
+        Returns:
+            Dictionary with 'changed', the new 'fingerprint' and the page's 'chunks'
+            (0 if unchanged)
+        """
+        timestamp = datetime.datetime.now().isoformat()
+        self._sync_generation()
+        generation = self._generation
+        with span("scrape"):
+            pages = self.scraper.scrape(url, 1, parse_js)
+        if not pages:
+            raise ValueError(f"No content scraped from {url}")
+        
+        page = pages[0]
+        documents = list(self._page_documents(page, url, timestamp))
+        new_fingerprint = page_fingerprint(documents)
+        if new_fingerprint == fingerprint:
+            return {"url": url, "changed": False, "fingerprint": new_fingerprint, "chunks": 0}
+        
+        chunks, _ = self._ingest_documents(documents, tenant_id, generation)
+        # A shorter page leaves its old trailing chunks behind.
+        page_url = page.get("url", url)
+        with span("storage_delete"):
+            self.storage.delete_chunks_from(page_url, chunks, tenant_id=tenant_id)
+            dual_write = self._dual_write
+            if dual_write is not None:
+                dual_write[0].delete_chunks_from(page_url, chunks, tenant_id=tenant_id)
+        return {"url": url, "changed": True, "fingerprint": new_fingerprint, "chunks": chunks}
+    
+    def _tracked_documents(
+        self,
+        page: Dict[str, Any],
+        default_url: str,
+        timestamp: str,
+        fingerprints: Dict[str, Tuple[str, int]]
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        _page_documents, also recording the page's fingerprint and estimated
+        chunk count for the re-crawl scheduler.
+        """
+        if self.recrawl is None:
+            yield from self._page_documents(page, default_url, timestamp)
+            return
+        documents = list(self._page_documents(page, default_url, timestamp))
+        size = sum(len(text) for text, _ in documents)
+        fingerprints[page.get("url", default_url)] = (
+            page_fingerprint(documents),
+            size // max(1, self.chunker.max_chunk_size) + 1
         )
+        yield from documents
+    
+    def _observe_pages(self, fingerprints: Dict[str, Tuple[str, int]], tenant_id: Optional[str], parse_js: bool):
+        """Let the re-crawl scheduler learn from freshly ingested pages."""
+        if self.recrawl is None:
+            return
+        for page_url, (fingerprint, chunks) in fingerprints.items():
+            try:
+                self.recrawl.observe(page_url, fingerprint, chunks, tenant_id, parse_js)
+            except Exception as e:
+                print(f"Error tracking {page_url} for re-crawls: {e}")
+    
+    def _embed_batch(self, batch: ChunkBatch):
+        """Embed a batch of chunks, retrying failures with backoff."""
+        def embed():
+            if batch.has_token_counts:
+                return self.embedder.get_embeddings(batch.texts, token_counts=list(batch.token_counts))
+            return self.embedder.get_embeddings(batch.texts)
+        
+        with span("embed"):
+            return call_with_retry(embed, self.retry_policy, "embed")
+    
+    def _store_batch(
+        self,
+        batch: ChunkBatch,
+        embeddings,
+        tenant_id: Optional[str],
+        generation: Optional[int] = None
+    ) -> List[str]:
+        """
+        Store a batch of embedded chunks, retrying failures with backoff.
+        
+        Retrying is safe because point IDs are derived from the URL and chunk
+        index, so a partially applied upsert is simply overwritten. During a
+        reindex the batch is also written to the generation being built.
+        
+        Args:
+            batch: Chunks to store
+            embeddings: Their embeddings
+            tenant_id: Tenant that owns the chunks
+            generation: Value of _generation when the batch was embedded; the
+                batch is embedded again if the embedding model changed since
+        """
+        if generation is not None and generation != self._generation:
+            embeddings = self._embed_batch(batch)
+        matrix = as_embedding_matrix(embeddings)
+        with span("store"):
+            chunk_ids = call_with_retry(
+                lambda: self.storage.store_embeddings(batch, matrix, tenant_id=tenant_id),
+                self.retry_policy,
+                "store"
+            )
+        self._dual_write_batch(batch, tenant_id)
+        if self.query_cache is not None:
+            self.query_cache.invalidate({metadata.get("url") for metadata in batch.metadata}, tenant_id)
+        return chunk_ids
+    
+    def _dual_write_batch(self, batch: ChunkBatch, tenant_id: Optional[str]):
+        """
+        Write a batch to the generation being built by a reindex, if any,
+        re-chunked with the new generation's settings.
+        
+        Failures are only logged: the reindex's catch-up sweep copies any page
+        that differs between the generations.
+        """
+        dual_write = self._dual_write
+        if dual_write is None:
+            return
+        storage, embedder, chunker = dual_write
+        try:
+            with span("dual_write"):
+                if chunker is not None:
+                    batch = self.reindexer.rechunk(batch, chunker)
+                    if not batch:
+                        return
+                vectors = as_embedding_matrix(embedder.get_embeddings(batch.texts))
+                storage.store_embeddings(batch, vectors, tenant_id=tenant_id)
+            metrics.increment("reindex.dual_writes")
+        except Exception as e:
+            metrics.increment("reindex.dual_write_errors")
+            print(f"Error writing to {storage.collection_name} during reindex: {e}")
+    
+    def _sync_generation(self, force: bool = False):
+        """
+        Follow reindexes started by any worker, at most every REINDEX_SYNC_SECONDS.
+        
+        While a generation is being built, stored batches are also written to
+        it. Once the alias points to it, this worker switches to its
+        collection, embedding model and chunking settings.
+        """
+        if not force and time.monotonic() - self._generation_synced_at < REINDEX_SYNC_SECONDS:
+            return
+        with self._generation_lock:
+            if not force and time.monotonic() - self._generation_synced_at < REINDEX_SYNC_SECONDS:
+                return
+            self._generation_synced_at = time.monotonic()
+            try:
+                state = self.storage.reindex_state()
+                if not isinstance(state, dict):
+                    self._dual_write = None
+                    return
+                if state["state"] in (BUILDING, ACTIVE) and state["target"] == self.storage.alias_target():
+                    if (state["target"] != self.storage.collection_name
+                            or self.embedder.model_id != state["embedding"]["model_id"]):
+                        self._switch_generation(state)
+                    self._dual_write = None
+                elif state["state"] == BUILDING and state["target"] != self.storage.collection_name:
+                    if self._dual_write is None or self._dual_write[0].collection_name != state["target"]:
+                        target = self.storage.for_collection(state["target"], state["embedding"]["dimension"])
+                        self._dual_write = (target, self.reindexer.embedder_for(state), self.reindexer.chunker_for(state))
+                else:
+                    self._dual_write = None
+            except Exception as e:
+                print(f"Error checking for a new collection generation: {e}")
+    
+    def _switch_generation(self, state: Dict[str, Any], storage: Optional[QdrantStorage] = None, embedder=None):
+        """
+        Start using the collection, embedding model and chunking settings of a reindexed generation.
+        
+        Args:
+            state: Reindex state of the generation
+            storage: Storage for the generation, built from the state if not given
+            embedder: Embedder for the generation, built from the state if not given
+        """
+        storage = storage or self.storage.for_collection(state["target"], state["embedding"]["dimension"])
+        embedder = embedder or self.reindexer.embedder_for(state)
+        chunking = state["chunking"]
+        
+        with self._generation_lock:
+            self._switch_to(storage, embedder, chunking)
+        
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        if self.spool is not None:
+            self.spool.discard_embeddings()
+        print(f"Switched to {storage.collection_name} with embedding model {embedder.model_id}")
+    
+    def _switch_to(self, storage: QdrantStorage, embedder, chunking: Dict[str, Any]):
+        self._generation += 1
+        self.storage = storage
+        self.embedder = embedder
+        self._dual_write = None
+        self.chunker.max_chunk_size = chunking["max_chunk_size"]
+        self.chunker.chunk_overlap = chunking["chunk_overlap"]
+        self.chunker.strategy = chunking["strategy"]
+        if self.parallel_chunker is not None and (
+            self.parallel_chunker.max_chunk_size != chunking["max_chunk_size"]
+            or self.parallel_chunker.chunk_overlap != chunking["chunk_overlap"]
+        ):
+            self.parallel_chunker.close()
+            self.parallel_chunker = ParallelChunker(
+                max_chunk_size=chunking["max_chunk_size"],
+                chunk_overlap=chunking["chunk_overlap"],
+                strategy=chunking["strategy"]
+            )
+        self._generation += 1
+    
+    def _embed_query(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Any, QdrantStorage]:
+        """
+        Embed a search query.
+        
+        With a deadline, embedding may use SEARCH_EMBED_BUDGET_SHARE of the
+        remaining budget. If it fails or runs out of time, the cached
+        embedding of the same query is served instead, when there is one.
+        
+        Args:
+            query: Search query
+            deadline: Time budget of the search
         
+        Returns:
+            (query embedding, storage holding vectors of the same model)
+        
+        Raises:
+            DeadlineExceeded: If the embedding timed out and no cached one exists
+        """
+        deadline = deadline or Deadline(None)
+        while True:
+            generation = self._generation
+            if generation % 2:
+                self._wait_for_switch(deadline)
+                continue
+            embedder = self.query_embedder
+            key = (embedder.model_id, " ".join(query.lower().split()))
+            with span("embed_query"):
+                try:
+                    query_embedding = deadline.run(
+                        "embed_query", lambda: embedder.get_embeddings([query])[0], share=SEARCH_EMBED_BUDGET_SHARE
+                    )
+                except Exception:
+                    query_embedding = self._cached_query_embedding(key)
+                    if query_embedding is None:
+                        raise
+                    metrics.increment("search.degraded.cached_embedding")
+                else:
+                    self._cache_query_embedding(key, query_embedding)
+            storage = self.storage
+            if generation % 2 == 0 and generation == self._generation:
+                return query_embedding, storage
+    
+    def _wait_for_switch(self, deadline: Deadline):
+        """
+        Wait for a generation switch in progress to finish, instead of embedding
+        again with a model that is about to be replaced.
+        
+        Raises:
+            DeadlineExceeded: If the switch outlasts the search's budget
+        """
+        remaining = deadline.remaining()
+        timeout = -1 if remaining == float("inf") else max(remaining, 0)
+        # _switch_to runs with the lock held.
+        if not self._generation_lock.acquire(timeout=timeout):
+            raise deadline.exceeded("embed_query")
+        self._generation_lock.release()
+    
+    def _cached_query_embedding(self, key: Tuple[str, str]):
+        with self._query_embeddings_lock:
+            embedding = self._query_embeddings.get(key)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(key)
+            return embedding
+    
+    def _cache_query_embedding(self, key: Tuple[str, str], embedding):
+        if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+            return
+        with self._query_embeddings_lock:
+            self._query_embeddings[key] = embedding
+            self._query_embeddings.move_to_end(key)
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+    
+    def _process_spooled(
+        self,
+        url: str,
+        depth: int,
+        parse_js: bool,
+        tenant_id: Optional[str],
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """
+        Process a website through the ingestion spool.
+        
+        Scraped pages are persisted as they arrive, then drained stage by stage.
+        
+        Raises:
+            IngestionDeferred: If some pages could not be stored within the retries
+        """
+        job = self.spool.create_job(url, tenant_id, self.chunker.strategy, timestamp)
+        
+        def crawl():
+            # A retried crawl resumes the job's run where the scraper supports it, and
+            # otherwise re-adds pages under the same URLs, replacing the earlier copies.
+            if self.scraper.resumable:
+                pages = self.scraper.scrape_iter(url, depth, parse_js, run_id=job.id)
+            else:
+                pages = self.scraper.scrape_iter(url, depth, parse_js)
+            for page in pages:
+                self.spool.add_page(job.id, page, url)
+        
+        try:
+            with span("scrape"):
+                call_with_retry(crawl, self.retry_policy, "scrape")
+        except Exception as e:
+            self.spool.fail_job(job.id, f"{type(e).__name__}: {e}")
+            raise
+        self.spool.finish_scrape(job.id)
+        
+        state = self.drain_job(job.id, force=True)
+        status = self.spool.job_status(job.id)
+        if state != JOB_DONE:
+            raise IngestionDeferred(status)
+        
+        return {
+            "url": url,
+            "tenant_id": tenant_id,
+            "pages_processed": sum(status["pages"].values()),
+            "chunks_created": status["chunks_created"],
+            "vectors_stored": status["vectors_stored"],
+            "job_id": job.id
+        }
+    
+    def drain_job(self, job_id: str, force: bool = False) -> str:
+        """
+        Take a spooled job's pending pages as far through the pipeline as possible.
+        
+        Each page resumes after its last completed stage. Pages that still fail
+        after the retries are deferred with exponential backoff, and the job is
+        failed once a page has been deferred MAX_DEFERRALS times.
+        
+        Args:
+            job_id: Spooled job to drain
+            force: Also drain pages whose backoff has not yet expired
+            
+        Returns:
+            The job's state afterwards
+        """
+        job = self.spool.get_job(job_id)
+        pages = self.spool.claim(job_id, force=force)
+        try:
+            self._drain_pages(job, pages)
+        except Exception as e:
+            pending = [page for page in pages if page.state != STORED]
+            error = f"{type(e).__name__}: {e}"
+            if not pending:
+                # Every page was stored before the failure; there is nothing to retry.
+                print(f"Stored every claimed page of {job.url}, then failed: {error}")
+                return self.spool.refresh_job(job_id)
+            deferrals = max((page.attempts for page in pending), default=0) + 1
+            delay = min(MAX_DEFER_SECONDS, INGEST_SPOOL_DRAIN_INTERVAL_SECONDS * 2 ** (deferrals - 1))
+            self.spool.defer(pending, error, delay)
+            metrics.increment("ingest.deferred_pages", len(pending))
+            print(f"Deferred {len(pending)} pages of {job.url} for {delay:.0f}s: {error}")
+            if deferrals >= MAX_DEFERRALS:
+                self.spool.fail_job(job_id, error)
+        return self.spool.refresh_job(job_id)
+    
+    def _drain_pages(self, job: SpoolJob, pages: List[SpooledPage]):
+        """Chunk, embed and store leased pages, persisting the output of every stage."""
+        chunker = self.chunker
+        if job.strategy and job.strategy != chunker.strategy:
+            # A chunker of the job's own, as other ingests share self.chunker concurrently.
+            chunker = TextChunker(chunker.max_chunk_size, chunker.chunk_overlap, job.strategy)
+        generation = self._generation
+        
+        scraped = {page.url: page for page in pages if page.state == SCRAPED}
+        fingerprints = {}
+        if scraped:
+            documents = (
+                document
+                for page in scraped.values()
+                for document in self._tracked_documents(page.page, job.url, job.timestamp, fingerprints)
+            )
+            with span("chunk"):
+                for batch in self._merge_pages(self._chunk_documents(documents, chunker)):
+                    self.spool.save_chunks(scraped[batch.get_metadata(0).get("url")], batch)
+            for page in scraped.values():
+                if page.state == SCRAPED:
+                    # Nothing left after extraction and chunking.
+                    self.spool.mark_stored(page, 0)
+        
+        for page in pages:
+            if page.state == CHUNKED:
+                self.spool.save_embeddings(page, as_embedding_matrix(self._embed_batch(page.batch)))
+            if page.state == EMBEDDED:
+                chunk_ids = self._store_batch(page.batch, page.vectors, job.tenant_id, generation)
+                self.spool.mark_stored(page, len(chunk_ids))
+        # Spool jobs do not keep parse_js; a page that needs it gets it back when it is processed again.
+        self._observe_pages(fingerprints, job.tenant_id, False)
+    
+    def drain_spool(self) -> int:
+        """
+        Drain every spooled job that has pages due for another attempt.
+        
+        Returns:
+            Number of jobs drained
+        """
+        job_ids = self.spool.ready_jobs()
+        for job_id in job_ids:
+            self.drain_job(job_id)
+        self.spool.purge(INGEST_SPOOL_RETENTION_HOURS * 3600)
+        return len(job_ids)
+    
+    def start_spool_drainer(self, interval: float = INGEST_SPOOL_DRAIN_INTERVAL_SECONDS):
+        """Start a background thread that periodically drains the spool."""
+        if self.spool is None or self._drainer is not None:
+            return
+        self._drainer_stop.clear()
+        
+        def run():
+            while not self._drainer_stop.wait(interval):
+                try:
+                    self.drain_spool()
+                except Exception as e:
+                    print(f"Error draining ingestion spool: {e}")
+        
+        self._drainer = threading.Thread(target=run, name="spool-drainer", daemon=True)
+        self._drainer.start()
+    
+    def stop_spool_drainer(self):
+        """Stop the background drainer started by start_spool_drainer."""
+        if self._drainer is None:
+            return
+        self._drainer_stop.set()
+        self._drainer.join()
+        self._drainer = None
+    
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the progress of a spooled ingestion job.
+        
+        Returns:
+            Job status, or None if there is no spool or the job is unknown
+        """
+        if self.spool is None:
+            return None
+        return self.spool.job_status(job_id)
+    
+    def _page_documents(
+        self,
+        page: Dict[str, Any],
+        default_url: str,
+        timestamp: str
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Turn a scraped page into (text, metadata) documents for chunking.
+        
+        HTML pages are reduced to their main content and split into one
+        document per heading, with the heading as the chunks' title.
+        
+        Args:
+            page: Scraped page with 'url' and 'text' or 'html'
+            default_url: URL to use when the page has none
+            timestamp: Ingestion timestamp
+            
+        Yields:
+            (text, metadata) pairs, in page order
+        """
+        page_url = page.get("url", default_url)
+        text = page.get("text", "")
+        html = page.get("html")
+        if html is None and looks_like_html(text):
+            html = text
+        
+        if CONTENT_EXTRACTION and html:
+            with span("extract"):
+                sections = extract_sections(html)
+            for section in sections:
+                yield section.text, {
+                    "url": page_url,
+                    "source": "web",
+                    "title": section.title,
+                    "timestamp": timestamp
+                }
+            return
+        
+        yield text, {
+            "url": page_url,
+            "source": "web",
+            "title": page.get("title", ""),
+            "timestamp": timestamp
+        }
+    
+    @staticmethod
+    def _merge_pages(batches: Iterable[ChunkBatch]) -> Iterator[ChunkBatch]:
+        """
+        Merge consecutive section batches of the same page into one batch.
+        
+        Chunk indices are renumbered to run across the whole page, so every
+        chunk of a page gets a distinct point ID.
+        
+        Args:
+            batches: One ChunkBatch per document, in page order
+            
+        Yields:
+            One ChunkBatch per page
+        """
+        page = None
+        page_url = None
+        for batch in batches:
+            if not batch:
+                continue
+            url = batch.get_metadata(0).get("url")
+            if page is not None and url == page_url:
+                page.extend(batch, renumber=True)
+                continue
+            if page is not None:
+                yield page
+            page, page_url = batch, url
+        if page is not None:
+            yield page
+    
+    def _chunk_documents(
+        self,
+        documents: Iterable[Tuple[str, Dict[str, Any]]],
+        chunker: Optional[TextChunker] = None
+    ) -> Iterator[ChunkBatch]:
+        """
+        Chunk (text, metadata) documents, using the process pool when parallel chunking is enabled.
+        
+        Args:
+            documents: Iterable of (text, metadata) pairs
+            chunker: Chunker to use instead of self.chunker
+            
+        Yields:
+            ChunkBatch for each document, in input order
+        """
+        chunker = chunker or self.chunker
+        if self.parallel_chunker is None:
+            for text, metadata in documents:
+                yield chunker.chunk_batch(text, metadata=metadata)
+        else:
+            yield from self.parallel_chunker.chunk_documents(documents, strategy=chunker.strategy)
+    
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        url_filter: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for the chunks most similar to a query.
+        
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            url_filter: Optional URL to filter results by
+            tenant_id: Optional tenant to restrict the search to
+            filters: Optional structured filters
+            deadline: Time budget of the search, SEARCH_DEADLINE_MS by default
+            
+        Returns:
+            List of results, best first
+        
+        Raises:
+            DeadlineExceeded: If the budget ran out before results were found
+        """
+        deadline = deadline or Deadline.from_ms()
+        self._sync_generation()
+        query_embedding, storage = self._embed_query(query, deadline)
+        
+        scope = cache_scope("search", tenant_id, url_filter, filters=filters)
+        cached, generation = self._cached(query_embedding, scope, limit)
+        if cached is not None:
+            return cached
+        
+        degraded = self._degraded(deadline)
+        with span("storage_search"):
+            results = deadline.run("storage_search", lambda: storage.search(
+                query_vector=query_embedding,
+                limit=limit,
+                url_filter=url_filter,
+                tenant_id=tenant_id,
+                filters=filters,
+                timeout=deadline.stage_timeout(),
+                degraded=degraded
+            ))
+        
+        if degraded:
+            # Possibly incomplete; do not let later queries reuse it.
+            return results
+        if self.query_cache is not None:
+            self.query_cache.put(query_embedding, scope, limit, results, tenant_id, url_filter, generation)
         return results
     
-    def delete_website(self, url: str) -> Dict[str, Any]:
-        deleted_count = self.storage.delete_by_url(url)
+    @staticmethod
+    def _degraded(deadline: Deadline) -> bool:
+        """Whether the budget left calls for a cheaper, possibly incomplete search."""
+        if not deadline.tight(SEARCH_DEGRADE_BELOW_MS / 1000):
+            return False
+        metrics.increment("search.degraded.reduced_search")
+        return True
+    
+    def _cached(self, query_embedding, scope: str, limit: int) -> Tuple[Optional[List[Dict[str, Any]]], Optional[int]]:
+        """
+        Look up the results of a similar recent query.
+        
+        Returns:
+            (cached results or None, cache generation to store fresh results with)
+        """
+        if self.query_cache is None:
+            return None, None
+        generation = self.query_cache.generation
+        with span("query_cache"):
+            return self.query_cache.get(query_embedding, scope, limit), generation
+    
+    def search_pages(
+        self,
+        query: str,
+        groups: int = 5,
+        group_size: int = 3,
+        url_filter: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        stitch: bool = True,
+        context_chunks: int = 0,
+        deadline: Optional[Deadline] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for the best matching pages, with their best chunks grouped per page.
+        
+        Args:
+            query: Search query
+            groups: Maximum number of pages to return
+            group_size: Maximum number of chunks per page
+            url_filter: Optional URL to filter results by
+            tenant_id: Optional tenant to restrict the search to
+            filters: Optional structured filters
+            stitch: Merge consecutive chunks into context windows
+            context_chunks: Neighbouring chunks to include around each hit
+            deadline: Time budget of the search, SEARCH_DEADLINE_MS by default.
+                When it runs short, neighbouring chunks are not fetched.
+            
+        Returns:
+            List of page groups, best first
+        
+        Raises:
+            DeadlineExceeded: If the budget ran out before results were found
+        """
+        deadline = deadline or Deadline.from_ms()
+        self._sync_generation()
+        query_embedding, storage = self._embed_query(query, deadline)
+        
+        scope = cache_scope(
+            "search_pages", tenant_id, url_filter,
+            filters=filters, group_size=group_size, stitch=stitch, context_chunks=context_chunks
+        )
+        cached, generation = self._cached(query_embedding, scope, groups)
+        if cached is not None:
+            return cached
+        
+        degraded = self._degraded(deadline)
+        if degraded and context_chunks:
+            metrics.increment("search.degraded.skipped_context")
+        with span("storage_search_pages"):
+            pages = deadline.run("storage_search_pages", lambda: storage.search_pages(
+                query_vector=query_embedding,
+                groups=groups,
+                group_size=group_size,
+                url_filter=url_filter,
+                tenant_id=tenant_id,
+                filters=filters,
+                stitch=stitch,
+                context_chunks=0 if degraded else context_chunks,
+                timeout=deadline.stage_timeout(),
+                degraded=degraded
+            ))
+        
+        if degraded:
+            return pages
+        if self.query_cache is not None:
+            self.query_cache.put(query_embedding, scope, groups, pages, tenant_id, url_filter, generation)
+        return pages
+    
+    def delete_website(self, url: str, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        self._sync_generation()
+        with span("storage_delete"):
+            deleted_count = self.storage.delete_by_url(url, tenant_id=tenant_id)
+            dual_write = self._dual_write
+            if dual_write is not None:
+                dual_write[0].delete_by_url(url, tenant_id=tenant_id)
+        if self.query_cache is not None:
+            self.query_cache.invalidate([url], tenant_id, added=False)
+        if self.recrawl is not None:
+            self.recrawl.forget(url, tenant_id)
         
         return {
             "url": url,
+            "tenant_id": tenant_id,
             "deleted_vectors": deleted_count
+        }
+    
+    def migrate_to_alias(self) -> Dict[str, Any]:
+        """
+        Move a collection created before aliases were used behind its alias, so it can be reindexed.
+        
+        Returns:
+            Dictionary with the new physical collection and the number of vectors copied
+            
+        Raises:
+            ValueError: If the collection is already behind an alias or a reindex is running
+        """
+        self._sync_generation(force=True)
+        if self._dual_write is not None or self.reindexer.running:
+            raise ValueError("The collection cannot be migrated while a reindex is running")
+        with span("storage_migrate"):
+            result = self.storage.migrate_to_alias()
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        return result
+    
+    def promote_tenant(self, tenant_id: str) -> Dict[str, Any]:
+        """
+        Move a tenant's content into its own collection.
+        
+        Args:
+            tenant_id: Tenant to promote
+            
+        Returns:
+            Dictionary with the number of vectors moved
+            
+        Raises:
+            ValueError: If a reindex is running
+        """
+        self._sync_generation(force=True)
+        if self._dual_write is not None or self.reindexer.running:
+            raise ValueError("Tenants cannot be promoted while a reindex is running")
+        with span("storage_promote"):
+            moved = self.storage.promote_tenant(tenant_id)
+        
+        return {
+            "tenant_id": tenant_id,
+            "collection": self.storage.dedicated_collection_name(tenant_id),
+            "moved_vectors": moved
         }
\ No newline at end of file
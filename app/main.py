@@ -1,6 +1,10 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Header, Depends
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from typing import Optional, List
 
+import anyio
+from starlette.concurrency import run_in_threadpool
+
 from app.schemas import (
     ScrapeRequest, 
     ScrapeResponse, 
@@ -9,11 +13,29 @@ from app.schemas import (
     ProcessWebsiteResponse,
     SearchRequest,
     SearchResponse,
-    SearchResult
+    SearchResult,
+    GroupedSearchRequest,
+    GroupedSearchResponse,
+    PageGroup,
+    ReindexRequest,
+    TENANT_ID_PATTERN
 )
 from app.scraper.firecrawl import FirecrawlProvider
 from app.scraper.proprietary import OwnScraperProvider
-from app.knowledge_base import KnowledgeBase
+from app.knowledge_base import KnowledgeBase, IngestionDeferred
+from app.deadline import Deadline, DeadlineExceeded
+from app.streaming import NDJSON_MEDIA_TYPE, stream_ndjson
+from app.tracing import start_trace, end_trace, log_slow_trace
+from app.profiling import profiler
+from app.admission import AdmissionClass, AdmissionController, AdmissionMiddleware
+from app.metrics import metrics
+from app.config import (
+    SLOW_REQUEST_THRESHOLD_MS, TRACE_HEADER, ADMIN_TOKEN,
+    ADMISSION_CAPACITY,
+    ADMISSION_SEARCH_LIMIT, ADMISSION_SEARCH_QUEUE, ADMISSION_SEARCH_TIMEOUT_MS,
+    ADMISSION_INGEST_LIMIT, ADMISSION_INGEST_QUEUE, ADMISSION_INGEST_TIMEOUT_MS,
+    ADMISSION_DELETE_LIMIT, ADMISSION_DELETE_QUEUE, ADMISSION_DELETE_TIMEOUT_MS
+)
 
 app = FastAPI(
     title="Scraper and Knowledge Base API",
@@ -22,9 +44,83 @@ app = FastAPI(
 
 kb = KnowledgeBase()
 
+admission = AdmissionController(
+    capacity=ADMISSION_CAPACITY,
+    classes={
+        "search": AdmissionClass("search", ADMISSION_SEARCH_LIMIT, ADMISSION_SEARCH_QUEUE, ADMISSION_SEARCH_TIMEOUT_MS / 1000, priority=0),
+        "delete": AdmissionClass("delete", ADMISSION_DELETE_LIMIT, ADMISSION_DELETE_QUEUE, ADMISSION_DELETE_TIMEOUT_MS / 1000, priority=1),
+        "ingest": AdmissionClass("ingest", ADMISSION_INGEST_LIMIT, ADMISSION_INGEST_QUEUE, ADMISSION_INGEST_TIMEOUT_MS / 1000, priority=2)
+    }
+)
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Map a request to its admission class, or None if it is not limited."""
+    if path.startswith("/api/kb/search"):
+        return "search"
+    if path == "/api/kb/process" or path.startswith("/api/scrape"):
+        return "ingest"
+    if method == "DELETE" and path == "/api/kb/website":
+        return "delete"
+    return None
+
+app.add_middleware(AdmissionMiddleware, controller=admission, classify=classify_request)
+
+@app.on_event("startup")
+async def size_threadpool():
+    # Sync handlers run in anyio's default threadpool; make sure it can hold
+    # every admitted request so admission, not the pool, is the bottleneck.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, ADMISSION_CAPACITY)
+
+@app.on_event("startup")
+def start_spool_drainer():
+    kb.start_spool_drainer()
+
+@app.on_event("shutdown")
+def stop_spool_drainer():
+    kb.stop_spool_drainer()
+
+@app.on_event("startup")
+def start_recrawl_scheduler():
+    if kb.recrawl is not None:
+        kb.recrawl.start()
+
+@app.on_event("shutdown")
+def stop_recrawl_scheduler():
+    if kb.recrawl is not None:
+        kb.recrawl.stop()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Trace every request, returning a Server-Timing header when the trace header
+    is set and logging the span breakdown of slow requests.
+    """
+    profiled = profiler.active and not request.url.path.startswith("/api/admin/")
+    token = start_trace(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        trace = end_trace(token)
+        if profiled:
+            # The last profiled request joins the sampler thread; keep that off the event loop.
+            await run_in_threadpool(profiler.request_finished)
+    
+    if request.headers.get(TRACE_HEADER):
+        response.headers["Server-Timing"] = trace.server_timing()
+    log_slow_trace(trace, SLOW_REQUEST_THRESHOLD_MS)
+    return response
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 def get_provider(source: str):
     if source == "firecrawl":
-        return FirecrawlProvider()
+        # Shared with the knowledge base so requests reuse its pooled connections.
+        return kb.scraper if isinstance(kb.scraper, FirecrawlProvider) else FirecrawlProvider()
     else:
         return OwnScraperProvider()
 
@@ -47,6 +143,24 @@ def scrape(payload: ScrapeRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(
+    "/api/scrape/stream",
+    summary="Scrape a website, streaming pages as NDJSON",
+    response_description="One JSON object per scraped page"
+)
+def scrape_stream(payload: ScrapeRequest, request: Request):
+    """
+    Scrape a website and stream each page as a newline-delimited JSON object
+    as soon as it is fetched. Closing the connection stops the crawl.
+    """
+    provider = get_provider(payload.source)
+    pages = provider.scrape_iter(
+        url=str(payload.url),
+        depth=payload.depth,
+        parse_js=payload.parseJs
+    )
+    return StreamingResponse(stream_ndjson(pages, request), media_type=NDJSON_MEDIA_TYPE)
+
 @app.post(
     "/api/kb/process",
     response_model=ProcessWebsiteResponse,
@@ -56,6 +170,10 @@ def scrape(payload: ScrapeRequest):
 def process_website(payload: ProcessWebsiteRequest):
     """
     Process a website by scraping, chunking, embedding, and storing in the vector database.
+    
+    With the ingestion spool enabled, pages that still fail after the retries
+    are kept for a background retry and the response is 202 with the job
+    status, which can be polled at /api/kb/jobs/{job_id}.
     """
     try:
         if payload.chunkingStrategy:
@@ -67,15 +185,33 @@ def process_website(payload: ProcessWebsiteRequest):
             url=str(payload.url),
             depth=payload.depth,
             parse_js=payload.parseJs,
-            chunking_strategy=payload.chunkingStrategy
+            chunking_strategy=payload.chunkingStrategy,
+            tenant_id=payload.tenantId
         )
         return ProcessWebsiteResponse(status="success", data=result)
+    except IngestionDeferred as e:
+        return JSONResponse(status_code=202, content={"status": "pending", "data": e.status})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error processing website: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get(
+    "/api/kb/jobs/{job_id}",
+    summary="Get the progress of a spooled ingestion job",
+    response_description="Job state and page counts per stage"
+)
+def get_job(job_id: str):
+    """
+    Report how far a spooled ingestion job has got, and the last error of
+    pages waiting for a retry.
+    """
+    status = kb.job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return {"status": "success", "data": status}
+
 @app.post(
     "/api/kb/search",
     response_model=SearchResponse,
@@ -90,24 +226,257 @@ def search_kb(payload: SearchRequest):
         results = kb.search(
             query=payload.query,
             limit=payload.limit,
-            url_filter=payload.urlFilter
+            url_filter=payload.urlFilter,
+            tenant_id=payload.tenantId,
+            filters=payload.filter.to_filters() if payload.filter else None,
+            deadline=Deadline.from_ms(payload.deadlineMs)
         )
         search_results = [SearchResult(**result) for result in results]
         return SearchResponse(status="success", data=search_results)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(
+    "/api/kb/search/pages",
+    response_model=GroupedSearchResponse,
+    summary="Search the knowledge base for the best pages",
+    response_description="Pages with their best matching chunks"
+)
+def search_kb_pages(payload: GroupedSearchRequest):
+    """
+    Search the knowledge base and return the top pages, each with its best
+    matching chunks and the context windows stitched from them.
+    """
+    try:
+        pages = kb.search_pages(
+            query=payload.query,
+            groups=payload.groups,
+            group_size=payload.groupSize,
+            url_filter=payload.urlFilter,
+            tenant_id=payload.tenantId,
+            filters=payload.filter.to_filters() if payload.filter else None,
+            stitch=payload.stitch,
+            context_chunks=payload.contextChunks,
+            deadline=Deadline.from_ms(payload.deadlineMs)
+        )
+        return GroupedSearchResponse(status="success", data=[PageGroup(**page) for page in pages])
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/api/kb/search/stream",
+    summary="Search the knowledge base, streaming results as NDJSON",
+    response_description="One JSON object per search result"
+)
+def search_kb_stream(payload: SearchRequest, request: Request):
+    """
+    Search the knowledge base and stream each result as a newline-delimited
+    JSON object, without building a response model for the whole result set.
+    """
+    try:
+        results = kb.search(
+            query=payload.query,
+            limit=payload.limit,
+            url_filter=payload.urlFilter,
+            tenant_id=payload.tenantId,
+            filters=payload.filter.to_filters() if payload.filter else None,
+            deadline=Deadline.from_ms(payload.deadlineMs)
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(stream_ndjson(results, request), media_type=NDJSON_MEDIA_TYPE)
+
 @app.delete(
     "/api/kb/website",
     summary="Delete website data from the knowledge base",
     response_description="Deletion statistics"
 )
-def delete_website(url: str = Query(..., description="Website URL to delete")):
+def delete_website(
+    url: str = Query(..., description="Website URL to delete"),
+    tenant_id: Optional[str] = Query(None, pattern=TENANT_ID_PATTERN, description="Tenant that owns the website")
+):
     """
     Delete all content related to a specific website from the knowledge base.
     """
     try:
-        result = kb.delete_website(url)
+        result = kb.delete_website(url, tenant_id=tenant_id)
+        return {"status": "success", "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/api/admin/tenants/{tenant_id}/promote",
+    summary="Move a tenant into a dedicated collection",
+    dependencies=[Depends(require_admin)]
+)
+def promote_tenant(tenant_id: str):
+    """
+    Move a large tenant out of the shared collection so that its searches
+    no longer scan other tenants' data. Returns once the shared copies are
+    deleted, which waits until every worker has noticed the promotion.
+    """
+    try:
+        result = kb.promote_tenant(tenant_id)
         return {"status": "success", "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/api/admin/reindex",
+    summary="Re-embed the knowledge base into a new collection generation",
+    status_code=202,
+    dependencies=[Depends(require_admin)]
+)
+def start_reindex(payload: ReindexRequest):
+    """
+    Build a new collection with another embedding model or chunking settings
+    in the background, while the current one keeps serving searches. New
+    ingests are written to both until the alias is swapped to the new one.
+    """
+    try:
+        state = kb.reindexer.start(
+            provider=payload.embeddingProvider,
+            model=payload.embeddingModel,
+            chunking_strategy=payload.chunkingStrategy,
+            max_chunk_size=payload.maxChunkSize,
+            chunk_overlap=payload.chunkOverlap
+        )
+        return {"status": "success", "data": state}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/api/admin/reindex/migrate",
+    summary="Move a collection created before aliases behind its alias",
+    dependencies=[Depends(require_admin)]
+)
+def migrate_to_alias():
+    """
+    One-time migration of a collection that has the alias' own name into
+    generation 0 behind the alias, which reindexing requires. Pause
+    ingestion while it runs and restart the other workers afterwards.
+    """
+    try:
+        return {"status": "success", "data": kb.migrate_to_alias()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get(
+    "/api/admin/reindex",
+    summary="Get the progress of the last reindex",
+    response_description="Reindex state, progress, rate and estimated time left",
+    dependencies=[Depends(require_admin)]
+)
+def get_reindex():
+    """
+    Report the state of the last reindex, started from any worker.
+    """
+    status = kb.reindexer.status()
+    if status is None:
+        raise HTTPException(status_code=404, detail="The knowledge base was never reindexed")
+    return {"status": "success", "data": status}
+
+@app.delete(
+    "/api/admin/reindex",
+    summary="Cancel the running reindex",
+    dependencies=[Depends(require_admin)]
+)
+def cancel_reindex():
+    """
+    Stop the running reindex and delete the collection it was building.
+    """
+    try:
+        return {"status": "success", "data": kb.reindexer.cancel()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def require_recrawl():
+    if kb.recrawl is None:
+        raise HTTPException(status_code=404, detail="Scheduled re-crawling is disabled (RECRAWL_DB_PATH is not set)")
+    return kb.recrawl
+
+@app.get(
+    "/api/admin/recrawl",
+    summary="Get the freshness of the index and the re-crawl budget spent on it",
+    response_description="Expected freshness, due pages, spending and budget",
+    dependencies=[Depends(require_admin)]
+)
+def get_recrawl_report(window_hours: float = Query(24, gt=0, le=24 * 30, description="Hours the spending is summed over")):
+    """
+    Report the expected share of fresh pages, from each page's learned change
+    rate, against the page fetches and embeddings re-crawls spent.
+    """
+    return {"status": "success", "data": require_recrawl().report(window_hours)}
+
+@app.post(
+    "/api/admin/recrawl/run",
+    summary="Run a re-crawl pass now",
+    response_description="Pages checked, changed and re-embedded by the pass",
+    dependencies=[Depends(require_admin)]
+)
+def run_recrawl_pass():
+    """
+    Re-crawl the due pages that fit in the remaining budget, without waiting
+    for the next scheduled pass.
+    """
+    scheduler = require_recrawl()
+    try:
+        return {"status": "success", "data": scheduler.run_pass()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/api/admin/profile",
+    summary="Profile the next N requests",
+    dependencies=[Depends(require_admin)]
+)
+def start_profile(requests: int = Query(10, ge=1, le=10000, description="Number of requests to profile")):
+    """
+    Arm the sampling profiler for the next N requests. Samples collected by a
+    previous run are discarded.
+    """
+    profiler.arm(requests)
+    return {"status": "success", "data": profiler.status()}
+
+@app.get(
+    "/api/admin/profile",
+    summary="Get collected profile samples",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_admin)]
+)
+def get_profile():
+    """
+    Return the collected samples as folded stacks, ready for flamegraph.pl or speedscope.
+    """
+    return PlainTextResponse(profiler.folded(), headers={"X-Profile-Samples": str(profiler.status()["samples"])})
+
+@app.get(
+    "/api/metrics",
+    summary="Get service metrics",
+    response_description="Admission state, counters and embedding provider health"
+)
+def get_metrics():
+    """
+    Return the admission state of each request class, the in-process
+    counters, and the embedding provider health when it is tracked.
+    """
+    data = {
+        "admission": admission.stats(),
+        "counters": metrics.snapshot()
+    }
+    health = getattr(kb.embedder, "health", None)
+    if callable(health):
+        data["embeddings"] = health()
+    return {"status": "success", "data": data}
@@ -0,0 +1,31 @@
+"""
+Minimal in-process metrics registry.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """Thread-safe named counters, exposed through /api/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+
+    def increment(self, name: str, value: float = 1):
+        """Add `value` to the counter `name`."""
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Get a copy of all counters."""
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
@@ -0,0 +1,180 @@
+"""
+Compact columnar representation of text chunks moving through the pipeline.
+"""
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+
+class ChunkBatch:
+    """
+    Columnar batch of chunks with shared per-document metadata.
+
+    Chunk texts are kept in a list and numeric columns in typed arrays, while
+    each document's metadata dict is stored once and referenced by index, so a
+    batch costs a few machine words per chunk on top of the text itself.
+    """
+
+    __slots__ = ("texts", "chunk_indices", "token_counts", "metadata", "metadata_ids")
+
+    def __init__(self):
+        """Initialize an empty batch."""
+        self.texts: List[str] = []
+        self.chunk_indices = array("I")
+        self.token_counts: Optional[array] = array("I")
+        self.metadata: List[Dict[str, Any]] = []
+        self.metadata_ids = array("I")
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: Sequence[str],
+        metadata: Optional[Dict[str, Any]] = None,
+        token_counts: Optional[Sequence[int]] = None
+    ) -> "ChunkBatch":
+        """
+        Build a batch holding the chunks of a single document.
+
+        Args:
+            texts: Chunk texts, in order
+            metadata: Metadata shared by all chunks of the document
+            token_counts: Optional token count of each chunk
+
+        Returns:
+            New ChunkBatch
+        """
+        batch = cls()
+        batch.add_document(texts, metadata, token_counts)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, chunks: Iterable[Dict[str, Any]]) -> "ChunkBatch":
+        """
+        Build a batch from chunk dictionaries as returned by TextChunker.chunk_text.
+
+        Args:
+            chunks: Chunk dictionaries with 'text', 'chunk_index' and metadata keys
+
+        Returns:
+            New ChunkBatch with one metadata entry per chunk
+        """
+        batch = cls()
+        for i, chunk in enumerate(chunks):
+            metadata = {
+                key: value for key, value in chunk.items()
+                if key not in ("text", "chunk_index", "token_count")
+            }
+            batch.metadata.append(metadata)
+            batch.metadata_ids.append(len(batch.metadata) - 1)
+            batch.texts.append(chunk["text"])
+            batch.chunk_indices.append(chunk.get("chunk_index", i))
+            if batch.token_counts is not None:
+                if "token_count" in chunk:
+                    batch.token_counts.append(chunk["token_count"])
+                else:
+                    batch.token_counts = None
+        return batch
+
+    def add_document(
+        self,
+        texts: Sequence[str],
+        metadata: Optional[Dict[str, Any]] = None,
+        token_counts: Optional[Sequence[int]] = None
+    ):
+        """
+        Append the chunks of one document, numbering them from zero.
+
+        Args:
+            texts: Chunk texts, in order
+            metadata: Metadata shared by all chunks of the document
+            token_counts: Optional token count of each chunk
+        """
+        if not texts:
+            return
+        metadata_id = len(self.metadata)
+        self.metadata.append(metadata or {})
+        self.texts.extend(texts)
+        self.chunk_indices.extend(range(len(texts)))
+        self.metadata_ids.extend([metadata_id] * len(texts))
+        if self.token_counts is not None:
+            if token_counts is None:
+                self.token_counts = None
+            else:
+                self.token_counts.extend(token_counts)
+
+    def extend(self, other: "ChunkBatch", renumber: bool = False):
+        """
+        Append all chunks of another batch.
+
+        Args:
+            other: Batch to append
+            renumber: Continue this batch's chunk numbering instead of keeping
+                the other batch's indices, for sections of the same document
+        """
+        offset = len(self.metadata)
+        self.metadata.extend(other.metadata)
+        self.texts.extend(other.texts)
+        if renumber:
+            start = self.chunk_indices[-1] + 1 if self.chunk_indices else 0
+            self.chunk_indices.extend(range(start, start + len(other.chunk_indices)))
+        else:
+            self.chunk_indices.extend(other.chunk_indices)
+        self.metadata_ids.extend(metadata_id + offset for metadata_id in other.metadata_ids)
+        if self.token_counts is not None:
+            if other.token_counts is None:
+                self.token_counts = None
+            else:
+                self.token_counts.extend(other.token_counts)
+
+    @property
+    def has_token_counts(self) -> bool:
+        """Whether every chunk in the batch has a known token count."""
+        return self.token_counts is not None and len(self.token_counts) == len(self.texts)
+
+    def get_metadata(self, index: int) -> Dict[str, Any]:
+        """Get the shared metadata of the chunk at `index`."""
+        return self.metadata[self.metadata_ids[index]]
+
+    def to_dict(self, index: int) -> Dict[str, Any]:
+        """Materialize the chunk at `index` as a chunk dictionary."""
+        chunk = {
+            "text": self.texts[index],
+            "chunk_index": self.chunk_indices[index],
+            **self.get_metadata(index)
+        }
+        if self.has_token_counts:
+            chunk["token_count"] = self.token_counts[index]
+        return chunk
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Materialize every chunk as a chunk dictionary."""
+        return [self.to_dict(i) for i in range(len(self.texts))]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.texts)):
+            yield self.to_dict(i)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.to_dict(index)
+
+
+def as_embedding_matrix(embeddings: Any) -> np.ndarray:
+    """
+    View embeddings as a contiguous float32 matrix.
+
+    A float32 NumPy matrix is returned as-is; lists of vectors are converted once.
+
+    Args:
+        embeddings: List of vectors or array of shape (n, dim)
+
+    Returns:
+        Contiguous float32 array of shape (n, dim)
+    """
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    return matrix
@@ -0,0 +1,162 @@
+"""
+Dynamic micro-batching of small embedding requests.
+
+Concurrent searches each embed a single query. Running those one at a time
+wastes most of a local model's forward pass, so MicroBatchingEmbeddings
+queues the texts, lets a worker thread collect them for up to a few
+milliseconds, embeds them as one batch and hands each caller its row.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.deadline import stage_time_left
+from app.metrics import metrics
+from app.processing.batch import as_embedding_matrix
+from app.processing.embeddings import EmbeddingProvider
+
+
+# Backstop for callers outside a deadline stage, as the worker answers within one provider call.
+RESULT_TIMEOUT_SECONDS = 120
+
+
+class BatcherClosed(Exception):
+    """Set on requests the worker did not take before the batcher was closed."""
+
+
+class MicroBatchingEmbeddings(EmbeddingProvider):
+    """
+    Embedding provider that merges concurrent small requests into batches.
+
+    Requests with more than `max_batch_size` texts (e.g. ingestion batches)
+    bypass the queue and go straight to the wrapped provider.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, max_batch_size: int = 32, max_wait: float = 0.002):
+        """
+        Initialize the micro-batching provider.
+
+        Args:
+            provider: Provider that embeds the collected batches
+            max_batch_size: Maximum number of texts per batch
+            max_wait: Seconds to keep collecting texts after the first one arrives
+        """
+        self.provider = provider
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def model_id(self) -> str:
+        return self.provider.model_id
+
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> np.ndarray:
+        """Embed texts, batching them with other concurrent callers."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if len(texts) > self.max_batch_size:
+            return self.provider.get_embeddings(texts, token_counts=token_counts)
+
+        futures = []
+        with self._lock:
+            # Checked and queued under the lock, so nothing is queued behind close()'s sentinel.
+            if not self._closed:
+                self._ensure_worker()
+                for text in texts:
+                    future = Future()
+                    self._queue.put((text, future))
+                    futures.append(future)
+        if not futures:
+            return self.provider.get_embeddings(texts, token_counts=token_counts)
+        # Inside a search, wait no longer than its deadline stage allows.
+        timeout = stage_time_left()
+        timeout = RESULT_TIMEOUT_SECONDS if timeout is None else min(timeout, RESULT_TIMEOUT_SECONDS)
+        expires_at = time.monotonic() + timeout
+        try:
+            rows = [future.result(timeout=max(0.0, expires_at - time.monotonic())) for future in futures]
+        except BatcherClosed:
+            return self.provider.get_embeddings(texts, token_counts=token_counts)
+        except FutureTimeoutError:
+            # Texts the worker has not taken yet are dropped from its next batch.
+            for future in futures:
+                future.cancel()
+            raise TimeoutError(f"Query embedding did not finish within {timeout:.3f} s") from None
+        return np.vstack(rows)
+
+    def _ensure_worker(self):
+        """Start the worker thread if needed; called with the lock held."""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def _collect(self, first: Tuple[str, Future]) -> List[Tuple[str, Future]]:
+        """Gather queued texts until the batch is full or max_wait has passed."""
+        items = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                self._queue.put(None)
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            items = self._collect(first)
+            items = [(text, future) for text, future in items if future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+
+            # Identical concurrent queries are embedded once.
+            positions: Dict[str, int] = {}
+            for text, _ in items:
+                positions.setdefault(text, len(positions))
+            try:
+                matrix = as_embedding_matrix(self.provider.get_embeddings(list(positions)))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            metrics.increment("query_batching.batches")
+            metrics.increment("query_batching.texts", len(items))
+            for text, future in items:
+                future.set_result(matrix[positions[text]])
+
+    def close(self):
+        """Stop the worker thread; later calls go straight to the wrapped provider."""
+        with self._lock:
+            self._closed = True
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._queue.put(None)
+        if worker is not None:
+            worker.join()
+        # Anything still queued would never be picked up: hand it back to its caller.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(BatcherClosed())
@@ -2,6 +2,7 @@ import re
 from typing import List, Dict, Any, Optional
 import tiktoken
 from app.config import MAX_CHUNK_SIZE, CHUNK_OVERLAP, CHUNKING_STRATEGY
+from app.processing.batch import ChunkBatch
 
 
 class TextChunker:
@@ -66,12 +67,28 @@ class TextChunker:
             metadata: Optional metadata to include with each chunk
             
         Returns:
-            List of dictionaries containing chunks and their metadata
+            List of dictionaries containing chunks and their metadata. With the
+            'token' strategy each chunk also carries its 'token_count'.
         """
-        if not text:
-            return []
+        return self.chunk_batch(text, metadata).to_dicts()
+    
+    def chunk_batch(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> ChunkBatch:
+        """
+        Split text into chunks, returning them as a compact ChunkBatch.
+        
+        The metadata dict is shared by all chunks instead of being copied into each one.
+        
+        Args:
+            text: The text to chunk
+            metadata: Optional metadata shared by all chunks
             
-        chunks = []
+        Returns:
+            ChunkBatch with the chunks of the text
+        """
+        if not text:
+            return ChunkBatch()
+        
+        token_counts = None
         
         strategy = str(self.strategy).lower().strip()
         
@@ -80,21 +97,14 @@ class TextChunker:
         elif strategy == 'sentence':
             text_chunks = self._chunk_by_sentence(text)
         elif strategy == 'token':
-            text_chunks = self._chunk_by_token(text)
+            token_chunks = self._split_tokens(text)
+            text_chunks = [self.tokenizer.decode(chunk_tokens) for chunk_tokens in token_chunks]
+            token_counts = [len(chunk_tokens) for chunk_tokens in token_chunks]
         else:
             print(f"Warning: Unknown chunking strategy: '{self.strategy}'. Using 'paragraph' instead.")
             text_chunks = self._chunk_by_paragraph(text)
         
-        base_metadata = metadata or {}
-        for i, chunk_text in enumerate(text_chunks):
-            chunk = {
-                "text": chunk_text,
-                "chunk_index": i,
-                **base_metadata
-            }
-            chunks.append(chunk)
-            
-        return chunks
+        return ChunkBatch.from_texts(text_chunks, metadata, token_counts)
     
     def _chunk_by_paragraph(self, text: str) -> List[str]:
         """Split text by paragraphs and combine until max chunk size is reached."""
@@ -108,14 +118,17 @@ class TextChunker:
     
     def _chunk_by_token(self, text: str) -> List[str]:
         """Split text by tokens and combine until max chunk size is reached."""
+        return [self.tokenizer.decode(chunk_tokens) for chunk_tokens in self._split_tokens(text)]
+    
+    def _split_tokens(self, text: str) -> List[List[int]]:
+        """Split text into overlapping windows of token IDs."""
         tokens = self.tokenizer.encode(text)
         chunks = []
         
         i = 0
         while i < len(tokens):
             chunk_end = min(i + self.max_chunk_size, len(tokens))
-            chunk_tokens = tokens[i:chunk_end]
-            chunks.append(self.tokenizer.decode(chunk_tokens))
+            chunks.append(tokens[i:chunk_end])
             i += self.max_chunk_size - self.chunk_overlap
             
         return chunks
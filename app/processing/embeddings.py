@@ -1,78 +1,257 @@
 """
 Embeddings module for generating vector representations of text.
 """
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import base64
 import numpy as np
 import json
 import requests
 from abc import ABC, abstractmethod
 
+from app.deadline import stage_time_left
+from app.processing.ratelimit import TokenBucket
 from app.config import (
     EMBEDDING_PROVIDER, 
     OPENAI_API_KEY, 
     OPENAI_EMBEDDING_MODEL,
+    OPENAI_BASE_URL,
+    OPENAI_MAX_TOKENS_PER_REQUEST,
+    OPENAI_MAX_INPUTS_PER_REQUEST,
+    OPENAI_MAX_INPUT_TOKENS,
+    OPENAI_EMBEDDING_CONCURRENCY,
+    OPENAI_TOKENS_PER_MINUTE,
+    OPENAI_LONG_INPUT_MODE,
     HUGGINGFACE_MODEL,
-    GEMINI_API_KEY
+    GEMINI_API_KEY,
+    EMBEDDING_FALLBACK_PROVIDERS,
+    EMBEDDING_HEDGE_DELAY_MS,
+    EMBEDDING_BREAKER_FAILURES,
+    EMBEDDING_BREAKER_RESET_SECONDS,
+    EMBEDDING_CACHE_SIZE,
+    SIDECAR_SOCKET_PATH
 )
 
 
 class EmbeddingProvider(ABC):
     """Base class for embedding providers."""
     
+    # Providers that embed a batch of texts for little more than the cost of one
+    # text, so concurrent queries are worth micro-batching in front of them.
+    batches_texts = False
+    
     @abstractmethod
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
         """
         Generate embeddings for a list of texts.
         
         Args:
             texts: List of text strings to embed
+            token_counts: Optional tiktoken counts for each text, if already known
             
         Returns:
-            List of embedding vectors (as lists of floats)
+            List of embedding vectors (as lists of floats), or a float32
+            NumPy matrix of shape (len(texts), dimension)
         """
         pass
+    
+    @property
+    def model_id(self) -> str:
+        """
+        Identifier of the embedding space this provider produces.
+        
+        Providers with the same model_id return interchangeable vectors.
+        """
+        return str(getattr(self, "model", type(self).__name__))
 
 
 class OpenAIEmbeddings(EmbeddingProvider):
     """OpenAI embeddings provider."""
     
-    def __init__(self, api_key: str = OPENAI_API_KEY, model: str = OPENAI_EMBEDDING_MODEL):
+    def __init__(
+        self,
+        api_key: str = OPENAI_API_KEY,
+        model: str = OPENAI_EMBEDDING_MODEL,
+        base_url: Optional[str] = OPENAI_BASE_URL or None,
+        max_tokens_per_request: int = OPENAI_MAX_TOKENS_PER_REQUEST,
+        max_inputs_per_request: int = OPENAI_MAX_INPUTS_PER_REQUEST,
+        max_input_tokens: int = OPENAI_MAX_INPUT_TOKENS,
+        concurrency: int = OPENAI_EMBEDDING_CONCURRENCY,
+        tokens_per_minute: int = OPENAI_TOKENS_PER_MINUTE,
+        long_input_mode: str = OPENAI_LONG_INPUT_MODE
+    ):
         """
         Initialize OpenAI embeddings provider.
         
         Args:
             api_key: OpenAI API key
             model: OpenAI embedding model name
+            base_url: Optional URL of an OpenAI-compatible embeddings endpoint
+            max_tokens_per_request: Maximum total tokens sent in one request
+            max_inputs_per_request: Maximum number of inputs sent in one request
+            max_input_tokens: Maximum tokens in a single input
+            concurrency: Number of requests kept in flight at once
+            tokens_per_minute: Tokens-per-minute budget (0 disables limiting)
+            long_input_mode: 'split' to embed over-long inputs in pieces and average them,
+                or 'truncate' to cut them at max_input_tokens
         """
         self.api_key = api_key
         self.model = model
+        self.base_url = base_url
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_inputs_per_request = max_inputs_per_request
+        self.max_input_tokens = max_input_tokens
+        self.concurrency = max(1, concurrency)
+        self.long_input_mode = long_input_mode
+        self.rate_limiter = TokenBucket(tokens_per_minute)
+        self._tokenizer = None
+        self._executor = None
         
         try:
             from openai import OpenAI
-            self.client = OpenAI(api_key=api_key)
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
         except ImportError:
             raise ImportError("OpenAI package not installed. Please install with: pip install openai")
     
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using OpenAI API."""
+    @property
+    def tokenizer(self):
+        """Get the tiktoken encoding for the model, initializing it on first use."""
+        if self._tokenizer is None:
+            import tiktoken
+            try:
+                self._tokenizer = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._tokenizer = tiktoken.get_encoding("cl100k_base")
+        return self._tokenizer
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency,
+                thread_name_prefix="openai-embeddings"
+            )
+        return self._executor
+    
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        """
+        Generate embeddings using OpenAI API.
+        
+        Inputs are packed into requests by token count, over-long inputs are
+        split or truncated, and several requests run concurrently under the
+        tokens-per-minute limit. Results are returned in input order as a
+        float32 matrix.
+        """
         if not texts:
             return []
-            
-        batch_size = 100
-        all_embeddings = []
         
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=batch_texts
-            )
-            
-            batch_embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(batch_embeddings)
+        pieces, owners = self._prepare_inputs(texts, token_counts)
+        batches = self._pack_batches(pieces)
+        
+        if len(batches) == 1 or self.concurrency == 1:
+            batch_results = [self._embed_batch(batch) for batch in batches]
+        else:
+            batch_results = list(self.executor.map(self._embed_batch, batches))
+        
+        piece_embeddings = np.concatenate(batch_results)
+        
+        if len(owners) == len(texts):
+            return piece_embeddings
+        return self._combine_pieces(texts, pieces, owners, piece_embeddings)
+    
+    def _prepare_inputs(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[int]]
+    ) -> Tuple[List[Tuple[str, int]], List[int]]:
+        """
+        Count tokens and split or truncate inputs above max_input_tokens.
+        
+        Returns:
+            List of (text, token_count) pieces to embed and, for each piece, the
+            index of the input text it belongs to
+        """
+        if token_counts is None or len(token_counts) != len(texts):
+            token_counts = [len(tokens) for tokens in self.tokenizer.encode_ordinary_batch(texts)]
+        
+        pieces = []
+        owners = []
+        for index, (text, count) in enumerate(zip(texts, token_counts)):
+            if count <= self.max_input_tokens:
+                pieces.append((text, count))
+                owners.append(index)
+                continue
             
-        return all_embeddings
+            tokens = self.tokenizer.encode_ordinary(text)
+            if self.long_input_mode == "truncate":
+                windows = [tokens[:self.max_input_tokens]]
+            else:
+                windows = [
+                    tokens[i:i + self.max_input_tokens]
+                    for i in range(0, len(tokens), self.max_input_tokens)
+                ]
+            for window in windows:
+                pieces.append((self.tokenizer.decode(window), len(window)))
+                owners.append(index)
+        
+        return pieces, owners
+    
+    def _pack_batches(self, pieces: List[Tuple[str, int]]) -> List[List[Tuple[str, int]]]:
+        """Greedily pack pieces, in order, into batches within the per-request limits."""
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for text, count in pieces:
+            if current and (
+                current_tokens + count > self.max_tokens_per_request
+                or len(current) >= self.max_inputs_per_request
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append((text, count))
+            current_tokens += count
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _embed_batch(self, batch: List[Tuple[str, int]]) -> np.ndarray:
+        """Send one batch to the API once the rate limiter allows it."""
+        self.rate_limiter.acquire(sum(count for _, count in batch))
+        
+        # Within a search, the request may take no longer than its deadline stage.
+        timeout = stage_time_left()
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=[text for text, _ in batch],
+            encoding_format="base64",
+            **({"timeout": timeout} if timeout is not None else {})
+        )
+        
+        items = sorted(response.data, key=lambda item: item.index)
+        return np.vstack([_decode_embedding(item.embedding) for item in items])
+    
+    def _combine_pieces(
+        self,
+        texts: List[str],
+        pieces: List[Tuple[str, int]],
+        owners: List[int],
+        piece_embeddings: np.ndarray
+    ) -> np.ndarray:
+        """Average the embeddings of split inputs, weighted by token count, and re-normalize."""
+        owners = np.asarray(owners)
+        weights = np.asarray([count for _, count in pieces], dtype=np.float32)
+        
+        embeddings = np.zeros((len(texts), piece_embeddings.shape[1]), dtype=np.float32)
+        np.add.at(embeddings, owners, piece_embeddings * weights[:, None])
+        
+        split = np.bincount(owners, minlength=len(texts)) > 1
+        embeddings[split] /= np.linalg.norm(embeddings[split], axis=1, keepdims=True)
+        single = ~split
+        embeddings[single] = piece_embeddings[np.searchsorted(owners, np.flatnonzero(single))]
+        return embeddings
 
 
 class GeminiEmbeddings(EmbeddingProvider):
@@ -97,7 +276,7 @@ class GeminiEmbeddings(EmbeddingProvider):
             raise ImportError("Google Generative AI package not installed. " 
                               "Please install with: pip install google-generativeai")
         
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
         """Generate embeddings using Gemini API."""
         if not texts:
             return []
@@ -108,11 +287,13 @@ class GeminiEmbeddings(EmbeddingProvider):
             batch_texts = texts[i:i+batch_size]
             
             for text in batch_texts:
+                timeout = stage_time_left()
                 try:
                     result = self.genai.embed_content(
                         model=self.model,
                         content=text,
-                        task_type="retrieval_document"
+                        task_type="retrieval_document",
+                        **({"request_options": {"timeout": timeout}} if timeout is not None else {})
                     )
                     all_embeddings.append(result["embedding"])
                 except Exception as e:
@@ -125,6 +306,8 @@ class GeminiEmbeddings(EmbeddingProvider):
 class HuggingFaceEmbeddings(EmbeddingProvider):
     """HuggingFace Sentence Transformers embedding provider."""
     
+    batches_texts = True
+    
     def __init__(self, model_name: str = HUGGINGFACE_MODEL):
         """
         Initialize HuggingFace embeddings provider.
@@ -141,27 +324,101 @@ class HuggingFaceEmbeddings(EmbeddingProvider):
             raise ImportError("Sentence-transformers package not installed. "
                              "Please install with: pip install sentence-transformers")
     
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
         """Generate embeddings using HuggingFace model."""
         if not texts:
             return []
             
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
+        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        return embeddings.astype(np.float32, copy=False)
+    
+    @property
+    def model_id(self) -> str:
+        return self.model_name
+
+
+def _decode_embedding(embedding: Union[str, List[float]]) -> np.ndarray:
+    """Decode an API embedding given either as base64 float32 bytes or as a list of floats."""
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def _create_provider(name: str, model: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create a single embedding provider by name.
+    
+    Args:
+        name: Provider name ('gemini', 'openai', 'huggingface' or 'sidecar'). An
+            OpenAI-compatible endpoint can be selected with 'openai@<base_url>', and
+            a sidecar socket with 'sidecar@<socket_path>'.
+        model: Model to use instead of the provider's configured default
+    """
+    name = name.strip()
+    provider, _, base_url = name.partition("@")
+    provider = provider.lower()
+    
+    if provider == "openai":
+        return OpenAIEmbeddings(model=model or OPENAI_EMBEDDING_MODEL, base_url=base_url or OPENAI_BASE_URL or None)
+    elif provider == "gemini":
+        return GeminiEmbeddings(model=model or "embedding-001")
+    elif provider == "huggingface":
+        return HuggingFaceEmbeddings(model_name=model or HUGGINGFACE_MODEL)
+    elif provider == "sidecar":
+        if model:
+            raise ValueError("The sidecar's model is chosen by SIDECAR_PROVIDER in the sidecar process")
+        from app.processing.sidecar import SidecarEmbeddings
+        return SidecarEmbeddings(socket_path=base_url or SIDECAR_SOCKET_PATH)
+    else:
+        raise ValueError(f"Unknown embedding provider: {name}")
+
+
+def create_embedding_provider(name: str, model: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create an embedding provider without the configured fallbacks.
+    
+    Used for a reindex target, whose vectors must all come from one model.
+    
+    Args:
+        name: Provider name, as in EMBEDDING_PROVIDER
+        model: Model to use instead of the provider's configured default
+    """
+    return _create_provider(name, model)
 
 
 def get_embedding_provider() -> EmbeddingProvider:
     """
     Factory function to get the configured embedding provider.
     
+    When fallback providers or an embedding cache are configured, the primary
+    provider is wrapped in a HedgedEmbeddings composite.
+    
     Returns:
         An instance of EmbeddingProvider based on configuration
+        
+    Raises:
+        ValueError: If a fallback provider serves another model than the primary
     """
-    if EMBEDDING_PROVIDER.lower() == "openai":
-        return OpenAIEmbeddings()
-    elif EMBEDDING_PROVIDER.lower() == "gemini":
-        return GeminiEmbeddings()
-    elif EMBEDDING_PROVIDER.lower() == "huggingface":
-        return HuggingFaceEmbeddings()
-    else:
-        raise ValueError(f"Unknown embedding provider: {EMBEDDING_PROVIDER}")
\ No newline at end of file
+    primary = _create_provider(EMBEDDING_PROVIDER)
+    fallback_names = [name for name in EMBEDDING_FALLBACK_PROVIDERS.split(",") if name.strip()]
+    
+    if not fallback_names and EMBEDDING_CACHE_SIZE <= 0:
+        return primary
+    
+    from app.processing.hedging import HedgedEmbeddings
+    
+    fallbacks = [_create_provider(name) for name in fallback_names]
+    for name, fallback in zip(fallback_names, fallbacks):
+        if fallback.model_id != primary.model_id:
+            raise ValueError(
+                f"EMBEDDING_FALLBACK_PROVIDERS entry '{name.strip()}' serves {fallback.model_id}, "
+                f"but {EMBEDDING_PROVIDER} serves {primary.model_id}; fallbacks must serve the same model"
+            )
+    
+    return HedgedEmbeddings(
+        providers=[primary] + fallbacks,
+        hedge_delay=EMBEDDING_HEDGE_DELAY_MS / 1000,
+        failure_threshold=EMBEDDING_BREAKER_FAILURES,
+        reset_timeout=EMBEDDING_BREAKER_RESET_SECONDS,
+        cache_size=EMBEDDING_CACHE_SIZE
+    )
@@ -0,0 +1,259 @@
+"""
+Main-content extraction from HTML pages.
+
+Strips markup and boilerplate (navigation, scripts, headers, footers, link
+lists, cookie banners) before chunking, and splits the remaining text into
+sections headed by the page's headings. The parser is fed incrementally, so
+large pages can be processed chunk by chunk without building a DOM.
+"""
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.config import EXTRACTION_MIN_WORDS, EXTRACTION_MAX_LINK_DENSITY
+
+# Elements whose whole subtree is never content.
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "nav", "header", "footer", "aside", "form", "button", "select", "textarea", "menu", "dialog"
+}
+
+# Elements that end the current text block.
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd",
+    "table", "tr", "td", "th", "blockquote", "pre", "figure", "figcaption", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "body", "title"
+}
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr"
+}
+
+# class/id/role values marking boilerplate containers, unless they also look like content.
+BOILERPLATE_PATTERN = re.compile(
+    r"nav|menu|footer|header|sidebar|breadcrumb|cookie|consent|banner|share|social|"
+    r"comment|advert|\bads?\b|promo|related|subscribe|newsletter|popup|modal|skip-link",
+    re.IGNORECASE
+)
+CONTENT_PATTERN = re.compile(r"article|content|main|post|entry|body|text", re.IGNORECASE)
+
+_WHITESPACE = re.compile(r"\s+")
+_HTML_START = re.compile(r"^\s*(<!doctype\s+html|<html|<head|<body|<(div|p|article|main|section)[\s>])", re.IGNORECASE)
+
+
+@dataclass
+class Section:
+    """A run of content blocks under one heading."""
+    title: str
+    text: str
+
+
+def looks_like_html(text: str) -> bool:
+    """Check whether scraped page text is raw HTML rather than plain text."""
+    return bool(text) and _HTML_START.match(text[:1024]) is not None
+
+
+class _Block:
+    __slots__ = ("parts", "link_chars")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.link_chars = 0
+
+
+class ContentExtractor(HTMLParser):
+    """
+    Incremental HTML main-content extractor.
+
+    Call feed() with successive pieces of a page and drain completed sections
+    with pop_sections(); close() flushes the last section.
+    """
+
+    def __init__(
+        self,
+        min_words: int = EXTRACTION_MIN_WORDS,
+        max_link_density: float = EXTRACTION_MAX_LINK_DENSITY
+    ):
+        """
+        Initialize the extractor.
+
+        Args:
+            min_words: Minimum words for a text block to count as content
+            max_link_density: Maximum fraction of a block's characters inside links
+        """
+        super().__init__(convert_charrefs=True)
+        self.min_words = min_words
+        self.max_link_density = max_link_density
+        self.page_title = ""
+        self._stack: List[Tuple[str, bool]] = []  # (tag, opened a skipped subtree)
+        self._skip_depth = 0
+        self._link_depth = 0
+        self._in_title = False
+        self._heading: Optional[List[str]] = None
+        self._block = _Block()
+        self._section_title: Optional[str] = None
+        self._section_blocks: List[str] = []
+        self._sections: List[Section] = []
+
+    def _is_boilerplate(self, tag: str, attrs) -> bool:
+        if tag in SKIP_TAGS:
+            return True
+        for name, value in attrs:
+            if value and name in ("class", "id", "role"):
+                if name == "role" and value in ("navigation", "banner", "contentinfo", "complementary", "search"):
+                    return True
+                if BOILERPLATE_PATTERN.search(value) and not CONTENT_PATTERN.search(value):
+                    return True
+            elif name == "hidden" or (name == "aria-hidden" and value == "true"):
+                return True
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if not self._skip_depth:
+                if tag == "br":
+                    self._block.parts.append(" ")
+                elif tag in BLOCK_TAGS:
+                    self._flush_block()
+            return
+        skipped = not self._skip_depth and self._is_boilerplate(tag, attrs)
+        self._stack.append((tag, skipped))
+        if skipped:
+            self._flush_block()
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if tag == "title":
+            self._in_title = True
+        elif tag == "a":
+            self._link_depth += 1
+        elif tag in HEADING_TAGS:
+            self._flush_block()
+            self._heading = []
+        elif tag in BLOCK_TAGS:
+            self._flush_block()
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._skip_depth:
+            if tag == "br":
+                self._block.parts.append(" ")
+            elif tag in BLOCK_TAGS:
+                self._flush_block()
+
+    def handle_endtag(self, tag):
+        # Tolerate unclosed elements by popping up to the matching open tag.
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, skipped = self._stack.pop()
+            if skipped:
+                self._skip_depth -= 1
+            elif not self._skip_depth:
+                self._close(open_tag)
+            if open_tag == tag:
+                break
+
+    def _close(self, tag: str):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "a":
+            self._link_depth = max(0, self._link_depth - 1)
+        elif tag in HEADING_TAGS and self._heading is not None:
+            heading = _WHITESPACE.sub(" ", "".join(self._heading)).strip()
+            self._heading = None
+            if heading:
+                self._start_section(heading)
+        elif tag in BLOCK_TAGS:
+            self._flush_block()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.page_title += data
+        elif self._heading is not None:
+            self._heading.append(data)
+        else:
+            self._block.parts.append(data)
+            if self._link_depth:
+                self._block.link_chars += len(data.strip())
+
+    def _flush_block(self):
+        block = self._block
+        if not block.parts:
+            return
+        self._block = _Block()
+        text = _WHITESPACE.sub(" ", "".join(block.parts)).strip()
+        if not text:
+            return
+        if block.link_chars / len(text) > self.max_link_density:
+            return
+        # Short blocks (list items, captions) only count once the section has real content.
+        if len(text.split()) < self.min_words and not self._section_blocks:
+            return
+        self._section_blocks.append(text)
+
+    def _start_section(self, title: str):
+        self._end_section()
+        self._section_title = title
+
+    def _end_section(self):
+        if self._section_blocks:
+            title = self._section_title
+            if title is None:
+                title = _WHITESPACE.sub(" ", self.page_title).strip()
+            self._sections.append(Section(title=title, text="\n\n".join(self._section_blocks)))
+            self._section_blocks = []
+
+    def close(self):
+        super().close()
+        self._flush_block()
+        self._end_section()
+
+    def pop_sections(self) -> List[Section]:
+        """Take the sections completed so far."""
+        sections, self._sections = self._sections, []
+        return sections
+
+
+def iter_sections(html_chunks: Iterable[str], **options) -> Iterator[Section]:
+    """
+    Extract content sections from a page delivered in pieces.
+
+    Sections are yielded as soon as the next heading closes them, so memory
+    use is bounded by the largest section rather than the whole page.
+
+    Args:
+        html_chunks: Successive pieces of the page's HTML
+        **options: ContentExtractor options
+
+    Yields:
+        Section for each heading with content below it, in page order
+    """
+    extractor = ContentExtractor(**options)
+    for piece in html_chunks:
+        extractor.feed(piece)
+        yield from extractor.pop_sections()
+    extractor.close()
+    yield from extractor.pop_sections()
+
+
+def extract_sections(html: str, piece_size: int = 65536, **options) -> List[Section]:
+    """
+    Extract content sections from a whole HTML page.
+
+    Args:
+        html: Page HTML
+        piece_size: Characters fed to the parser at a time
+        **options: ContentExtractor options
+
+    Returns:
+        List of sections in page order
+    """
+    pieces = (html[i:i + piece_size] for i in range(0, len(html), piece_size))
+    return list(iter_sections(pieces, **options))
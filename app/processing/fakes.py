@@ -0,0 +1,73 @@
+"""
+Local fake embedding provider for tests, benchmarks and load testing.
+"""
+import hashlib
+import random
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.processing.embeddings import EmbeddingProvider
+
+
+class FakeEmbeddings(EmbeddingProvider):
+    """
+    Deterministic embedding provider that never leaves the process.
+
+    Vectors are derived from a hash of each text, so the same text always maps
+    to the same vector. Latency and failures can be injected to exercise
+    timeouts, hedging and failover.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 768,
+        model: str = "fake-embedding",
+        latency: float = 0.0,
+        per_text_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the fake embeddings provider.
+
+        Args:
+            dimension: Size of the generated vectors
+            model: Model name reported as model_id
+            latency: Fixed delay per call in seconds
+            per_text_latency: Additional delay per text in seconds
+            failure_rate: Probability in [0, 1] that a call raises
+            seed: Seed for the failure random generator
+        """
+        self.dimension = dimension
+        self.model = model
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.batch_sizes: List[int] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        """Generate deterministic pseudo-random unit vectors."""
+        with self._lock:
+            self.calls += 1
+            self.batch_sizes.append(len(texts))
+            fail = self._random.random() < self.failure_rate
+
+        delay = self.latency + self.per_text_latency * len(texts)
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"Injected failure from {self.model}")
+
+        return [self.embed_text(text).tolist() for text in texts]
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Get the float32 unit vector for a single text."""
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
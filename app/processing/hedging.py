@@ -0,0 +1,295 @@
+"""
+Composite embedding provider with hedged requests, failover and circuit breakers.
+"""
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.processing.embeddings import EmbeddingProvider
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a single provider and stops calling it while it is failing.
+
+    The breaker opens after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds have passed, a single trial request is let through
+    (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            failure_threshold: Consecutive failures before the breaker opens
+            reset_timeout: Seconds to wait before letting a trial request through
+            clock: Monotonic clock, overridable for tests
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        """Get the current breaker state."""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a request may be sent, reserving the trial slot when half-open.
+
+        Returns:
+            True if the caller should send the request
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._trial_in_flight:
+                return False
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float):
+        """Record a successful call and its latency in seconds."""
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+
+    def record_failure(self, error: Exception):
+        """Record a failed call, opening the breaker if the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def health(self) -> Dict[str, Any]:
+        """Get a snapshot of the tracked health statistics."""
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 2),
+            "last_error": self.last_error
+        }
+
+
+class HedgedEmbeddings(EmbeddingProvider):
+    """
+    Embedding provider that spreads requests over several compatible providers.
+
+    The first healthy provider is called; if it has not answered after
+    `hedge_delay` seconds, a duplicate request goes to the next healthy provider
+    and whichever answers first wins. Failed calls fail over immediately, and
+    providers whose circuit breaker is open are skipped. Successful embeddings
+    can be kept in a bounded cache that serves as a last resort when every
+    provider is down.
+    """
+
+    def __init__(
+        self,
+        providers: List[EmbeddingProvider],
+        hedge_delay: float = 0.25,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        cache_size: int = 0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the hedged embeddings provider.
+
+        Args:
+            providers: Providers in order of preference; all must share a model_id
+            hedge_delay: Seconds to wait before sending a hedged request (0 disables hedging)
+            failure_threshold: Consecutive failures before a provider's breaker opens
+            reset_timeout: Seconds before an open breaker lets a trial request through
+            cache_size: Number of embedded texts kept for fallback (0 disables the cache)
+            clock: Monotonic clock, overridable for tests
+        """
+        if not providers:
+            raise ValueError("At least one embedding provider is required")
+
+        model_ids = {provider.model_id for provider in providers}
+        if len(model_ids) > 1:
+            raise ValueError(
+                f"Embedding providers must share a compatible model, got: {', '.join(sorted(model_ids))}"
+            )
+
+        self.providers = providers
+        self.breakers = [CircuitBreaker(failure_threshold, reset_timeout, clock) for _ in providers]
+        self.hedge_delay = hedge_delay
+        self.cache_size = cache_size
+        self._clock = clock
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return self.providers[0].model_id
+
+    @property
+    def batches_texts(self) -> bool:
+        return self.providers[0].batches_texts
+
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        """Generate embeddings from the fastest healthy provider."""
+        if not texts:
+            return []
+
+        in_flight: Dict[Future, int] = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        def launch_next() -> bool:
+            nonlocal next_index
+            while next_index < len(self.providers):
+                index = next_index
+                next_index += 1
+                if self.breakers[index].allow_request():
+                    in_flight[self._start_call(index, texts, token_counts)] = index
+                    return True
+            return False
+
+        launch_next()
+
+        while in_flight:
+            can_hedge = self.hedge_delay > 0 and next_index < len(self.providers)
+            done, _ = wait(
+                list(in_flight),
+                timeout=self.hedge_delay if can_hedge else None,
+                return_when=FIRST_COMPLETED
+            )
+
+            if not done:
+                launch_next()
+                continue
+
+            for future in done:
+                in_flight.pop(future)
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    last_error = e
+                    if not in_flight:
+                        launch_next()
+                    continue
+                self._cache_store(texts, embeddings)
+                return embeddings
+
+        cached = self._cache_lookup(texts)
+        if cached is not None:
+            return cached
+
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("All embedding providers are unavailable (circuit breakers open)")
+
+    def _start_call(self, index: int, texts: List[str], token_counts: Optional[List[int]]) -> Future:
+        """
+        Start a provider call on a thread of its own.
+
+        A shared pool would queue calls behind each other under load, and the
+        time in the queue would count toward the hedge delay. A thread per call
+        starts executing right away, so hedges only answer slow providers.
+        """
+        future: Future = Future()
+        # In the caller's context, so providers see the time left in a search's deadline stage.
+        context = contextvars.copy_context()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(context.run(self._call_provider, index, texts, token_counts))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="embedding-hedge", daemon=True).start()
+        return future
+
+    def _call_provider(
+        self,
+        index: int,
+        texts: List[str],
+        token_counts: Optional[List[int]] = None
+    ) -> List[List[float]]:
+        """Call a single provider, recording the outcome on its breaker."""
+        breaker = self.breakers[index]
+        start = self._clock()
+        try:
+            embeddings = self.providers[index].get_embeddings(texts, token_counts=token_counts)
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success(self._clock() - start)
+        return embeddings
+
+    def _cache_store(self, texts: List[str], embeddings: List[List[float]]):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            for text, embedding in zip(texts, embeddings):
+                # Copy matrix rows so a cached row does not keep the whole batch alive.
+                self._cache[text] = np.array(embedding, dtype=np.float32)
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_lookup(self, texts: List[str]) -> Optional[np.ndarray]:
+        if self.cache_size <= 0:
+            return None
+        with self._cache_lock:
+            if not all(text in self._cache for text in texts):
+                return None
+            return np.vstack([self._cache[text] for text in texts])
+
+    def health(self) -> List[Dict[str, Any]]:
+        """
+        Get the health of each underlying provider.
+
+        Returns:
+            List of health snapshots, in provider order
+        """
+        return [
+            {"provider": type(provider).__name__, "model": provider.model_id, **breaker.health()}
+            for provider, breaker in zip(self.providers, self.breakers)
+        ]
@@ -0,0 +1,141 @@
+"""
+Parallel text chunking across a pool of worker processes.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import (
+    MAX_CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_STRATEGY,
+    CHUNKING_WORKERS,
+    CHUNKING_BATCH_SIZE
+)
+from app.processing.batch import ChunkBatch
+from app.processing.chunker import TextChunker
+
+Document = Tuple[str, Optional[Dict[str, Any]]]
+
+# Per-worker chunkers, keyed by strategy. Built once in each worker process so
+# that tokenizers are loaded a single time rather than for every batch.
+_worker_chunkers: Dict[str, TextChunker] = {}
+_worker_settings: Dict[str, int] = {}
+
+
+def _init_worker(max_chunk_size: int, chunk_overlap: int, strategy: str):
+    """Initialize chunking state in a freshly started worker process."""
+    _worker_settings["max_chunk_size"] = max_chunk_size
+    _worker_settings["chunk_overlap"] = chunk_overlap
+    _get_worker_chunker(strategy)
+
+
+def _get_worker_chunker(strategy: str) -> TextChunker:
+    chunker = _worker_chunkers.get(strategy)
+    if chunker is None:
+        chunker = TextChunker(
+            max_chunk_size=_worker_settings.get("max_chunk_size", MAX_CHUNK_SIZE),
+            chunk_overlap=_worker_settings.get("chunk_overlap", CHUNK_OVERLAP),
+            strategy=strategy
+        )
+        _worker_chunkers[strategy] = chunker
+    return chunker
+
+
+def _chunk_batch(strategy: str, documents: List[Document]) -> List[ChunkBatch]:
+    """Chunk a batch of documents inside a worker process."""
+    chunker = _get_worker_chunker(strategy)
+    return [chunker.chunk_batch(text, metadata) for text, metadata in documents]
+
+
+class ParallelChunker:
+    """
+    Fans documents out to a process pool and streams chunks back in order.
+    """
+
+    def __init__(self,
+                 workers: int = CHUNKING_WORKERS,
+                 batch_size: int = CHUNKING_BATCH_SIZE,
+                 max_chunk_size: int = MAX_CHUNK_SIZE,
+                 chunk_overlap: int = CHUNK_OVERLAP,
+                 strategy: str = CHUNKING_STRATEGY):
+        """
+        Initialize the parallel chunker.
+
+        Args:
+            workers: Number of worker processes (0 means one per CPU core)
+            batch_size: Number of documents sent to a worker per task
+            max_chunk_size: Maximum size of each chunk in tokens or characters
+            chunk_overlap: Number of tokens or characters to overlap between chunks
+            strategy: Default chunking strategy ('paragraph', 'sentence', or 'token')
+        """
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.batch_size = max(1, batch_size)
+        self.max_chunk_size = max_chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.strategy = strategy
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Get the process pool, starting it on first use."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.max_chunk_size, self.chunk_overlap, self.strategy)
+            )
+        return self._executor
+
+    def chunk_documents(
+        self,
+        documents: Iterable[Document],
+        strategy: Optional[str] = None
+    ) -> Iterator[ChunkBatch]:
+        """
+        Chunk documents in parallel, yielding the chunks of each document in input order.
+
+        Documents are grouped into batches to amortize inter-process overhead, and
+        only a bounded number of batches is in flight at once, so arbitrarily large
+        corpora can be streamed through without being held in memory.
+
+        Args:
+            documents: Iterable of (text, metadata) pairs
+            strategy: Override the default chunking strategy if provided
+
+        Yields:
+            ChunkBatch for each document, as produced by TextChunker.chunk_batch
+        """
+        strategy = str(strategy or self.strategy).lower().strip()
+        documents = iter(documents)
+        max_in_flight = self.workers * 2
+        pending = deque()
+
+        def submit_next() -> bool:
+            batch = list(islice(documents, self.batch_size))
+            if not batch:
+                return False
+            pending.append(self.executor.submit(_chunk_batch, strategy, batch))
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            results = pending.popleft().result()
+            submit_next()
+            yield from results
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,68 @@
+"""
+Thread-safe token bucket rate limiter.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate at which some quantity (requests, API tokens) is spent.
+
+    Callers reserve capacity with acquire(), which blocks until the reservation
+    fits within the configured rate. Reservations larger than the bucket are
+    allowed and simply push later callers back.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Initialize the token bucket.
+
+        Args:
+            rate_per_minute: Amount replenished per minute (0 or less disables limiting)
+            capacity: Maximum burst size, defaults to one minute worth of tokens
+            clock: Monotonic clock, overridable for tests
+            sleep: Sleep function, overridable for tests
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Reserve `amount` tokens, blocking until they are available.
+
+        Args:
+            amount: Number of tokens to spend
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            self._sleep(wait)
+        return wait
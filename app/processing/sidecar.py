@@ -0,0 +1,261 @@
+"""
+Embedding sidecar: one process owns the embedding model and serves every
+uvicorn worker on the node over a Unix socket.
+
+Run the sidecar with:
+    python -m app.processing.sidecar --socket /tmp/kb-embeddings.sock --provider huggingface
+
+and start the API workers with EMBEDDING_PROVIDER=sidecar.
+
+Wire protocol (all integers big-endian):
+    request   uint32 length, then a UTF-8 JSON object:
+              {"op": "embed", "texts": [...]} or {"op": "info"}
+    response  uint8 status, uint32 a, uint32 b, then a body:
+              STATUS_EMBEDDINGS  a = rows, b = dimension, body = rows * b little-endian float32
+              STATUS_INFO        a = body length, body = UTF-8 JSON object
+              STATUS_ERROR       a = body length, body = UTF-8 error message
+
+The client reads embedding bodies straight into a preallocated float32
+matrix with recv_into, so vectors are never copied through Python lists or
+intermediate byte strings.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import (
+    SIDECAR_SOCKET_PATH,
+    SIDECAR_PROVIDER,
+    SIDECAR_TIMEOUT_SECONDS,
+    QUERY_BATCH_MAX_SIZE,
+    QUERY_BATCH_MAX_WAIT_MS
+)
+from app.deadline import stage_time_left
+from app.processing.embeddings import EmbeddingProvider
+
+REQUEST_HEADER = struct.Struct("!I")
+RESPONSE_HEADER = struct.Struct("!BII")
+STATUS_EMBEDDINGS = 0
+STATUS_INFO = 1
+STATUS_ERROR = 2
+MAX_REQUEST_BYTES = 64 * 2**20
+WIRE_DTYPE = np.dtype("<f4")
+
+
+def _recv_into(sock: socket.socket, view: memoryview):
+    """Fill `view` from the socket, raising ConnectionError on EOF."""
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("Embedding sidecar closed the connection")
+        view = view[received:]
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    _recv_into(sock, memoryview(buffer))
+    return bytes(buffer)
+
+
+class _SidecarHandler(socketserver.BaseRequestHandler):
+    """Serves requests from one worker connection until it disconnects."""
+
+    def handle(self):
+        sock: socket.socket = self.request
+        while True:
+            try:
+                (length,) = REQUEST_HEADER.unpack(_recv_exact(sock, REQUEST_HEADER.size))
+            except ConnectionError:
+                return
+            if length > MAX_REQUEST_BYTES:
+                sock.sendall(self._message(STATUS_ERROR, f"Request of {length} bytes exceeds the limit")[0])
+                return
+            try:
+                body = _recv_exact(sock, length)
+            except ConnectionError:
+                return
+            try:
+                response = self._dispatch(json.loads(body))
+            except Exception as e:
+                response = self._message(STATUS_ERROR, f"{type(e).__name__}: {e}")
+            try:
+                for part in response:
+                    sock.sendall(part)
+            except OSError:
+                return
+
+    def _dispatch(self, request: Dict[str, Any]) -> List[Any]:
+        """Handle one request, returning the buffers that make up the response."""
+        provider: EmbeddingProvider = self.server.provider
+        op = request.get("op")
+        if op == "info":
+            return self._message(STATUS_INFO, json.dumps({"model_id": provider.model_id, "pid": os.getpid()}))
+        if op == "embed":
+            texts = request.get("texts") or []
+            matrix = np.ascontiguousarray(provider.get_embeddings(texts), dtype=WIRE_DTYPE)
+            if matrix.size == 0:
+                matrix = matrix.reshape(0, 0)
+            rows, dimension = matrix.shape
+            return [RESPONSE_HEADER.pack(STATUS_EMBEDDINGS, rows, dimension), memoryview(matrix).cast("B")]
+        raise ValueError(f"Unknown sidecar operation: {op}")
+
+    @staticmethod
+    def _message(status: int, message: str) -> List[bytes]:
+        body = message.encode("utf-8")
+        return [RESPONSE_HEADER.pack(status, len(body), 0) + body]
+
+
+class SidecarServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix socket server sharing one embedding provider."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, provider: EmbeddingProvider):
+        """
+        Initialize the server, replacing a stale socket file if present.
+
+        Args:
+            socket_path: Filesystem path of the Unix socket
+            provider: Provider that embeds the texts of every connected worker
+        """
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.provider = provider
+        super().__init__(socket_path, _SidecarHandler)
+
+
+def serve(socket_path: str, provider: EmbeddingProvider):
+    """
+    Serve embeddings on `socket_path` until interrupted.
+
+    Concurrent small requests from different workers are micro-batched when
+    the provider batches texts, so searches arriving on several workers share
+    forward passes.
+    """
+    if QUERY_BATCH_MAX_SIZE > 1 and provider.batches_texts:
+        from app.processing.batching import MicroBatchingEmbeddings
+        provider = MicroBatchingEmbeddings(provider, QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS / 1000)
+    with SidecarServer(socket_path, provider) as server:
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+class SidecarEmbeddings(EmbeddingProvider):
+    """
+    Embedding provider that delegates to an embedding sidecar process.
+
+    Each thread keeps its own connection, and a broken connection is
+    re-established once before the call fails.
+    """
+
+    batches_texts = True
+
+    def __init__(self, socket_path: str = SIDECAR_SOCKET_PATH, timeout: float = SIDECAR_TIMEOUT_SECONDS):
+        """
+        Initialize the sidecar client.
+
+        Args:
+            socket_path: Unix socket the sidecar listens on
+            timeout: Socket timeout in seconds for each request
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._model_id: Optional[str] = None
+
+    @property
+    def model_id(self) -> str:
+        if self._model_id is None:
+            self._model_id = self.info()["model_id"]
+        return self._model_id
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"Cannot reach embedding sidecar at {self.socket_path}: {e}")
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request_timeout(self) -> float:
+        """Socket timeout of the next request, shortened to what is left of a search's deadline stage."""
+        left = stage_time_left()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise TimeoutError("No time left in the deadline stage for an embedding sidecar request")
+        return min(self.timeout, left)
+
+    def _request(self, request: Dict[str, Any]):
+        body = json.dumps(request).encode("utf-8")
+        for attempt in range(2):
+            sock = self._connection()
+            sock.settimeout(self._request_timeout())
+            try:
+                sock.sendall(REQUEST_HEADER.pack(len(body)) + body)
+                return self._read_response(sock)
+            except (ConnectionError, OSError) as e:
+                self._disconnect()
+                if attempt == 1:
+                    raise ConnectionError(f"Embedding sidecar request failed: {e}")
+
+    def _read_response(self, sock: socket.socket):
+        status, a, b = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+        if status == STATUS_EMBEDDINGS:
+            matrix = np.empty((a, b), dtype=WIRE_DTYPE)
+            _recv_into(sock, memoryview(matrix).cast("B"))
+            return matrix
+        message = _recv_exact(sock, a).decode("utf-8")
+        if status == STATUS_INFO:
+            return json.loads(message)
+        raise ValueError(f"Embedding sidecar error: {message}")
+
+    def info(self) -> Dict[str, Any]:
+        """Get the model_id and process ID of the sidecar."""
+        return self._request({"op": "info"})
+
+    def get_embeddings(self, texts: List[str], token_counts: Optional[List[int]] = None) -> np.ndarray:
+        """Generate embeddings in the sidecar process."""
+        if not texts:
+            return []
+        return self._request({"op": "embed", "texts": list(texts)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embeddings to API workers over a Unix socket")
+    parser.add_argument("--socket", default=SIDECAR_SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--provider", default=SIDECAR_PROVIDER, help="Embedding provider to load")
+    args = parser.parse_args()
+
+    from app.processing.embeddings import _create_provider
+
+    if args.provider.partition("@")[0].strip().lower() == "sidecar":
+        parser.error("The sidecar cannot serve another sidecar; pick the provider that loads the model")
+    provider = _create_provider(args.provider)
+    print(f"Serving {provider.model_id} embeddings on {args.socket}")
+    serve(args.socket, provider)
+
+
+if __name__ == "__main__":
+    main()
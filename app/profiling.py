@@ -0,0 +1,138 @@
+"""
+On-demand sampling profiler producing flame-graph-ready (folded) stacks.
+
+The profiler is armed for the next N requests from an admin endpoint. While
+disarmed, no sampling thread runs and the only cost per request is reading
+the `active` flag.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.config import PROFILER_INTERVAL_MS
+
+# Leaf frames of threads that are parked waiting for work rather than running code.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of all threads at a fixed interval."""
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Initialize the profiler.
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.active = False
+        self.remaining_requests = 0
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, requests: int):
+        """
+        Start sampling until `requests` more requests have finished.
+
+        Any previously collected samples are discarded.
+
+        Args:
+            requests: Number of requests to profile
+        """
+        self.stop()
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.remaining_requests = max(1, requests)
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.active = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def request_finished(self):
+        """Count a finished request, stopping the profiler after the last one."""
+        with self._lock:
+            if not self.active:
+                return
+            self.remaining_requests -= 1
+            done = self.remaining_requests <= 0
+        if done:
+            self.stop()
+
+    def stop(self):
+        """Stop sampling, keeping the collected samples."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+        with self._lock:
+            if self.active:
+                self.active = False
+                self.stopped_at = time.time()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = self._fold(frame)
+                    if stack:
+                        self._stacks[stack] += 1
+                self.samples += 1
+
+    @staticmethod
+    def _fold(frame) -> Optional[str]:
+        leaf = frame.f_code
+        if (leaf.co_filename.rsplit("/", 1)[-1], leaf.co_name) in IDLE_FRAMES:
+            return None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            # No line numbers, so samples anywhere in a function fold into one frame.
+            names.append(f"{code.co_name} ({code.co_filename})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        """
+        Get the collected samples in folded-stack format.
+
+        Each line is 'frame;frame;...;leaf count', as consumed by flamegraph.pl
+        and speedscope.
+        """
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def status(self) -> Dict[str, Any]:
+        """Get the profiler state."""
+        with self._lock:
+            return {
+                "active": self.active,
+                "remaining_requests": self.remaining_requests,
+                "samples": self.samples,
+                "distinct_stacks": len(self._stacks),
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at
+            }
+
+
+profiler = SamplingProfiler(interval=PROFILER_INTERVAL_MS / 1000)
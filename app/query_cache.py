@@ -0,0 +1,241 @@
+"""
+Semantic cache of search results, keyed by query embedding similarity.
+
+Differently phrased versions of the same question embed to nearly the same
+vector, so after a query is embedded its vector is compared with those of
+recent queries. A cached result is reused when the cosine similarity is at or
+above the threshold and the query had the same scope (tenant, URL filter,
+structured filters and search parameters).
+
+Entries expire after a TTL, the least recently used entry is evicted when the
+cache is full, and ingesting or deleting a URL drops the entries it may have
+changed. The cache is per process and only sees its own worker's writes: with
+several workers, a search can return results that miss pages another worker
+ingested, or include pages it deleted, for up to the TTL. Reusing a similar
+query's results also changes what a search returns, so the cache is off unless
+QUERY_CACHE_SIZE is set.
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.metrics import metrics
+
+
+@dataclass
+class _Entry:
+    scope: str
+    tenant_id: Optional[str]
+    url_filter: Optional[str]
+    limit: int
+    results: List[Dict[str, Any]]
+    urls: frozenset
+
+
+def cache_scope(operation: str, tenant_id: Optional[str], url_filter: Optional[str], **params) -> str:
+    """
+    Build the key that cached queries must share to be interchangeable.
+
+    Args:
+        operation: Name of the search operation
+        tenant_id: Tenant the search is restricted to
+        url_filter: URL the search is restricted to
+        **params: Filters and other parameters that change the results
+
+    Returns:
+        Canonical JSON string
+    """
+    return json.dumps(
+        {"operation": operation, "tenant_id": tenant_id, "url_filter": url_filter, **params},
+        sort_keys=True,
+        default=str
+    )
+
+
+class SemanticQueryCache:
+    """Bounded, thread-safe cache of search results with a small in-memory vector index."""
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        threshold: float = 0.95,
+        ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            capacity: Maximum number of cached queries
+            threshold: Minimum cosine similarity for a cached query to match
+            ttl: Seconds a cached result stays valid
+            clock: Monotonic clock, overridable for tests
+        """
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._scope_ids = np.full(capacity, -1, dtype=np.int64)
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._entries: List[Optional[_Entry]] = [None] * capacity
+        self._scopes: Dict[str, int] = {}
+        self.generation = 0
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def get(self, vector, scope: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find the results of a similar cached query.
+
+        Args:
+            vector: Query embedding
+            scope: Key from cache_scope
+            limit: Number of results needed; entries cached with fewer do not match
+
+        Returns:
+            Cached results, trimmed to `limit`, or None on a miss
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            scope_id = self._scopes.get(scope)
+            if query is None or scope_id is None or self._vectors is None or query.shape[0] != self._vectors.shape[1]:
+                metrics.increment("query_cache.misses")
+                return None
+            now = self._clock()
+            candidates = np.flatnonzero((self._scope_ids == scope_id) & (self._expires > now))
+            if candidates.size:
+                similarities = self._vectors[candidates] @ query
+                order = np.argsort(-similarities)
+                for position in order:
+                    if similarities[position] < self.threshold:
+                        break
+                    slot = int(candidates[position])
+                    entry = self._entries[slot]
+                    if entry.limit >= limit:
+                        self._last_used[slot] = now
+                        metrics.increment("query_cache.hits")
+                        return entry.results[:limit]
+            metrics.increment("query_cache.misses")
+            return None
+
+    def put(
+        self,
+        vector,
+        scope: str,
+        limit: int,
+        results: List[Dict[str, Any]],
+        tenant_id: Optional[str] = None,
+        url_filter: Optional[str] = None,
+        generation: Optional[int] = None
+    ):
+        """
+        Cache the results of a query.
+
+        Args:
+            vector: Query embedding
+            scope: Key from cache_scope
+            limit: Number of results that were requested
+            results: Results, each with a 'url'
+            tenant_id: Tenant the search was restricted to, for invalidation
+            url_filter: URL the search was restricted to, for invalidation
+            generation: Value of `generation` read before the search ran; the
+                results are not cached if an invalidation happened since
+        """
+        query = self._normalize(vector)
+        if query is None:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                # First entry, or the embedding model changed: start over.
+                self._vectors = np.zeros((self.capacity, query.shape[0]), dtype=np.float32)
+                self._clear()
+            now = self._clock()
+            free = np.flatnonzero((self._scope_ids < 0) | (self._expires <= now))
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            if not free.size:
+                metrics.increment("query_cache.evictions")
+            scope_id = self._scopes.setdefault(scope, len(self._scopes))
+            self._vectors[slot] = query
+            self._scope_ids[slot] = scope_id
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._entries[slot] = _Entry(
+                scope, tenant_id, url_filter, limit, results,
+                frozenset(result.get("url") for result in results)
+            )
+            if len(self._scopes) > 4 * self.capacity:
+                self._compact_scopes()
+
+    def invalidate(self, urls: Iterable[str], tenant_id: Optional[str] = None, added: bool = True) -> int:
+        """
+        Drop entries whose results may change because `urls` were written or deleted.
+
+        New content can outrank cached results of any query that could reach
+        it, so ingestion drops every entry of the tenant unless its URL filter
+        rules the URLs out. Deletion only affects entries that returned one of
+        the deleted URLs.
+
+        Args:
+            urls: URLs that were ingested or deleted
+            tenant_id: Tenant the URLs belong to
+            added: True for ingestion, False for deletion
+
+        Returns:
+            Number of entries dropped
+        """
+        urls = set(urls)
+        if not urls:
+            return 0
+        dropped = 0
+        with self._lock:
+            self.generation += 1
+            for slot, entry in enumerate(self._entries):
+                if entry is None or self._scope_ids[slot] < 0:
+                    continue
+                if entry.tenant_id is not None and tenant_id is not None and entry.tenant_id != tenant_id:
+                    continue
+                if entry.urls & urls or (entry.url_filter in urls if entry.url_filter else added):
+                    self._drop(slot)
+                    dropped += 1
+        if dropped:
+            metrics.increment("query_cache.invalidations", dropped)
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero((self._scope_ids >= 0) & (self._expires > self._clock())))
+
+    def _drop(self, slot: int):
+        self._scope_ids[slot] = -1
+        self._entries[slot] = None
+
+    def _clear(self):
+        self._scope_ids.fill(-1)
+        self._entries = [None] * self.capacity
+        self._scopes = {}
+
+    def _compact_scopes(self):
+        """Forget scope IDs no longer used by any entry."""
+        live = {}
+        for slot, entry in enumerate(self._entries):
+            if entry is None or self._scope_ids[slot] < 0:
+                continue
+            self._scope_ids[slot] = live.setdefault(entry.scope, len(live))
+        self._scopes = live
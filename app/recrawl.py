@@ -0,0 +1,486 @@
+"""
+Re-crawl scheduling driven by how often each page actually changes.
+
+Every page the knowledge base ingests is tracked with a fingerprint of its
+extracted content. Each later crawl of the page is a check that either found
+a change or did not. Modelling a page's changes as a Poisson process with
+rate λ, the rate is estimated from n checks spanning T seconds, X of which
+found a change, with the bias-reduced estimator of Cho and Garcia-Molina:
+
+    λ = -ln((n - X + 0.5) / (n + 0.5)) / (T / n)
+
+which stays finite when every check found a change. Pages with few checks
+are pulled towards a prior of one change per RECRAWL_DEFAULT_CHANGE_DAYS.
+
+A page last crawled `age` seconds ago is stale with probability
+1 - exp(-λ · age). Each pass refills an hourly page budget (fetches) and
+chunk budget (embeddings), then re-crawls due pages, most stale per unit of
+budget first. Unchanged pages only cost a fetch; changed pages are re-chunked,
+re-embedded and stored. State lives in one SQLite database shared by the
+workers of a node, and a lease lets only one of them run a pass at a time.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (
+    RECRAWL_INTERVAL_SECONDS,
+    RECRAWL_PAGES_PER_HOUR,
+    RECRAWL_CHUNKS_PER_HOUR,
+    RECRAWL_MIN_STALENESS,
+    RECRAWL_MIN_INTERVAL_MINUTES,
+    RECRAWL_DEFAULT_CHANGE_DAYS
+)
+from app.metrics import metrics
+
+# Checks the prior change rate is worth when blending it with the estimate.
+PRIOR_CHECKS = 2
+# Passes kept for the freshness report.
+PASS_HISTORY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    tenant_id TEXT NOT NULL DEFAULT '',
+    parse_js INTEGER NOT NULL DEFAULT 0,
+    fingerprint TEXT NOT NULL,
+    chunks INTEGER NOT NULL DEFAULT 1,
+    first_seen REAL NOT NULL,
+    last_checked REAL NOT NULL,
+    last_changed REAL NOT NULL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    observed_seconds REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (url, tenant_id)
+);
+CREATE TABLE IF NOT EXISTS budgets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS passes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    due_pages INTEGER NOT NULL,
+    pages_checked INTEGER NOT NULL,
+    pages_changed INTEGER NOT NULL,
+    chunks_embedded INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    freshness REAL
+);
+CREATE TABLE IF NOT EXISTS lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def page_fingerprint(documents: Iterable[Tuple[str, Dict[str, Any]]]) -> str:
+    """
+    Fingerprint a page's extracted documents, ignoring whitespace and the ingestion timestamp.
+
+    Args:
+        documents: (text, metadata) pairs of one page
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for text, metadata in documents:
+        digest.update(" ".join(str(metadata.get("title", "")).split()).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(" ".join(text.split()).encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def estimate_change_rates(checks, changes, observed_seconds, prior_rate: float) -> np.ndarray:
+    """
+    Estimate Poisson change rates per second from the check history of pages.
+
+    Args:
+        checks: Number of checks per page
+        changes: Number of those checks that found a change
+        observed_seconds: Total time the checks span
+        prior_rate: Rate assumed for pages that were never checked
+
+    Returns:
+        Change rate of each page, in changes per second
+    """
+    n = np.asarray(checks, dtype=np.float64)
+    x = np.minimum(np.asarray(changes, dtype=np.float64), n)
+    observed = np.asarray(observed_seconds, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interval = observed / n
+        estimate = -np.log((n - x + 0.5) / (n + 0.5)) / interval
+    estimate = np.where((n > 0) & (observed > 0), estimate, prior_rate)
+    return (n * estimate + PRIOR_CHECKS * prior_rate) / (n + PRIOR_CHECKS)
+
+
+@dataclass
+class TrackedPage:
+    """A page the scheduler may re-crawl."""
+
+    url: str
+    tenant_id: Optional[str]
+    parse_js: bool
+    fingerprint: str
+    chunks: int
+    last_checked: float
+    change_rate: float
+    staleness: float
+    priority: float
+
+
+class RecrawlScheduler:
+    """Learns how often pages change and re-crawls the stalest ones within a budget."""
+
+    def __init__(
+        self,
+        kb,
+        path: str,
+        pages_per_hour: float = RECRAWL_PAGES_PER_HOUR,
+        chunks_per_hour: float = RECRAWL_CHUNKS_PER_HOUR,
+        interval: float = RECRAWL_INTERVAL_SECONDS,
+        min_staleness: float = RECRAWL_MIN_STALENESS,
+        min_interval: float = RECRAWL_MIN_INTERVAL_MINUTES * 60,
+        default_change_days: float = RECRAWL_DEFAULT_CHANGE_DAYS,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize the scheduler, creating its database if needed.
+
+        Args:
+            kb: KnowledgeBase whose pages are re-crawled
+            path: SQLite database file, shared by the workers of a node
+            pages_per_hour: Page fetches the re-crawls may spend per hour
+            chunks_per_hour: Chunk embeddings the re-crawls may spend per hour
+            interval: Seconds between two passes; budgets can save up two passes' worth
+            min_staleness: Probability of having changed at which a page becomes due
+            min_interval: Seconds a page is left alone after it was crawled
+            default_change_days: Assumed mean days between changes of a new page
+            clock: Wall clock, overridable for tests (state is shared across processes)
+        """
+        self.kb = kb
+        self.path = path
+        self.pages_per_hour = pages_per_hour
+        self.chunks_per_hour = chunks_per_hour
+        self.interval = interval
+        self.min_staleness = min_staleness
+        self.min_interval = min_interval
+        self.prior_rate = 1 / (default_change_days * 86400)
+        self._clock = clock
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def observe(
+        self,
+        url: str,
+        fingerprint: str,
+        chunks: int,
+        tenant_id: Optional[str] = None,
+        parse_js: bool = False
+    ) -> bool:
+        """
+        Record a crawl of a page, from a re-crawl or any other ingestion.
+
+        Args:
+            url: Page URL
+            fingerprint: page_fingerprint of its content
+            chunks: Number of chunks the page has (or an estimate)
+            tenant_id: Tenant that owns the page
+            parse_js: Whether the page needs JavaScript rendering
+
+        Returns:
+            True if the page is new or its content changed since the last crawl
+        """
+        now = self._clock()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT fingerprint, last_checked FROM pages WHERE url = ? AND tenant_id = ?",
+                (url, tenant_id or "")
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO pages (url, tenant_id, parse_js, fingerprint, chunks, first_seen, last_checked, last_changed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, tenant_id or "", int(parse_js), fingerprint, max(1, chunks), now, now, now)
+                )
+                return True
+            changed = row[0] != fingerprint
+            conn.execute(
+                "UPDATE pages SET fingerprint = ?, chunks = ?, parse_js = ?, last_checked = ?, "
+                "last_changed = CASE WHEN ? THEN ? ELSE last_changed END, checks = checks + 1, "
+                "changes = changes + ?, observed_seconds = observed_seconds + ?, failures = 0 "
+                "WHERE url = ? AND tenant_id = ?",
+                (fingerprint, max(1, chunks), int(parse_js), now, changed, now, int(changed),
+                 max(0.0, now - row[1]), url, tenant_id or "")
+            )
+        return changed
+
+    def record_failure(self, page: TrackedPage):
+        """Push a page that could not be fetched back by one interval, without counting a check."""
+        self._conn().execute(
+            "UPDATE pages SET failures = failures + 1, last_checked = last_checked + ? WHERE url = ? AND tenant_id = ?",
+            (self.interval, page.url, page.tenant_id or "")
+        )
+
+    def forget(self, url: str, tenant_id: Optional[str] = None) -> int:
+        """Stop tracking a deleted page."""
+        return self._conn().execute(
+            "DELETE FROM pages WHERE url = ? AND tenant_id = ?", (url, tenant_id or "")
+        ).rowcount
+
+    def tracked(self, now: Optional[float] = None) -> List[TrackedPage]:
+        """
+        Get every tracked page with its estimated change rate and staleness.
+
+        Returns:
+            Pages in order of re-crawl priority, highest first
+        """
+        now = self._clock() if now is None else now
+        rows = self._conn().execute(
+            "SELECT url, tenant_id, parse_js, fingerprint, chunks, last_checked, checks, changes, observed_seconds FROM pages"
+        ).fetchall()
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        chunks = np.asarray(columns[4], dtype=np.float64)
+        last_checked = np.asarray(columns[5], dtype=np.float64)
+        rates = estimate_change_rates(columns[6], columns[7], columns[8], self.prior_rate)
+        staleness = -np.expm1(-rates * np.maximum(0.0, now - last_checked))
+        # Share of the hourly budgets a re-crawl is expected to use: a fetch, plus
+        # the embeddings of its chunks if it changed.
+        cost = self._budget_share(1, self.pages_per_hour) + self._budget_share(staleness * chunks, self.chunks_per_hour)
+        priority = staleness / np.maximum(cost, 1e-12)
+        order = np.argsort(-priority, kind="stable")
+        return [
+            TrackedPage(
+                url=rows[i][0],
+                tenant_id=rows[i][1] or None,
+                parse_js=bool(rows[i][2]),
+                fingerprint=rows[i][3],
+                chunks=int(rows[i][4]),
+                last_checked=float(last_checked[i]),
+                change_rate=float(rates[i]),
+                staleness=float(staleness[i]),
+                priority=float(priority[i])
+            )
+            for i in order
+        ]
+
+    @staticmethod
+    def _budget_share(amount, per_hour: float):
+        return amount / per_hour if per_hour > 0 else amount * 0.0
+
+    def _is_due(self, page: TrackedPage, now: float) -> bool:
+        return page.staleness >= self.min_staleness and now - page.last_checked >= self.min_interval
+
+    def _claim(self, now: float) -> bool:
+        """Take the pass lease unless another worker holds it."""
+        cursor = self._conn().execute(
+            "INSERT INTO lease (id, owner, expires_at) VALUES (1, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE lease.expires_at <= ? OR lease.owner = excluded.owner",
+            (self._owner, now + max(self.interval, 60), now)
+        )
+        return cursor.rowcount > 0
+
+    def _release(self):
+        self._conn().execute("DELETE FROM lease WHERE owner = ?", (self._owner,))
+
+    def _refill(self, now: float) -> Dict[str, float]:
+        """Add the budget accrued since the last pass, up to two passes' worth."""
+        budgets = {}
+        for name, per_hour in (("pages", self.pages_per_hour), ("chunks", self.chunks_per_hour)):
+            if per_hour <= 0:
+                budgets[name] = math.inf
+                continue
+            capacity = per_hour * 2 * self.interval / 3600
+            row = self._conn().execute("SELECT tokens, updated_at FROM budgets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * per_hour / 3600)
+            budgets[name] = tokens
+        return budgets
+
+    def _save_budgets(self, budgets: Dict[str, float], now: float):
+        self._conn().executemany(
+            "INSERT INTO budgets (name, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            [(name, tokens, now) for name, tokens in budgets.items() if math.isfinite(tokens)]
+        )
+
+    def run_pass(self) -> Dict[str, Any]:
+        """
+        Re-crawl the due pages that fit in the budget, most stale per unit of budget first.
+
+        Returns:
+            Summary of the pass, or {"skipped": True} if another worker is running one
+        """
+        started = self._clock()
+        if not self._claim(started):
+            return {"skipped": True}
+        try:
+            budgets = self._refill(started)
+            due = [page for page in self.tracked(started) if self._is_due(page, started)]
+            summary = {"due_pages": len(due), "pages_checked": 0, "pages_changed": 0, "chunks_embedded": 0, "failures": 0}
+            for page in due:
+                if self._stop.is_set() or budgets["pages"] < 1:
+                    break
+                # Only start pages whose expected embeddings still fit; cheaper ones may.
+                if budgets["chunks"] < page.staleness * page.chunks:
+                    continue
+                budgets["pages"] -= 1
+                try:
+                    result = self.kb.refresh_page(page.url, page.fingerprint, page.tenant_id, page.parse_js)
+                except Exception as e:
+                    print(f"Error re-crawling {page.url}: {type(e).__name__}: {e}")
+                    self.record_failure(page)
+                    summary["failures"] += 1
+                    metrics.increment("recrawl.failures")
+                    continue
+                chunks = result["chunks"] if result["changed"] else page.chunks
+                self.observe(page.url, result["fingerprint"], chunks, page.tenant_id, page.parse_js)
+                summary["pages_checked"] += 1
+                if result["changed"]:
+                    summary["pages_changed"] += 1
+                    summary["chunks_embedded"] += result["chunks"]
+                    budgets["chunks"] -= result["chunks"]
+            finished = self._clock()
+            self._save_budgets(budgets, finished)
+            summary["freshness"] = self._freshness(finished)
+            self._record_pass(started, finished, summary)
+            metrics.increment("recrawl.pages_checked", summary["pages_checked"])
+            metrics.increment("recrawl.pages_changed", summary["pages_changed"])
+            metrics.increment("recrawl.chunks_embedded", summary["chunks_embedded"])
+            return summary
+        finally:
+            self._release()
+
+    def _freshness(self, now: float) -> Optional[float]:
+        pages = self.tracked(now)
+        if not pages:
+            return None
+        return 1 - float(np.mean([page.staleness for page in pages]))
+
+    def _record_pass(self, started: float, finished: float, summary: Dict[str, Any]):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO passes (started_at, finished_at, due_pages, pages_checked, pages_changed, chunks_embedded, failures, freshness) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (started, finished, summary["due_pages"], summary["pages_checked"], summary["pages_changed"],
+             summary["chunks_embedded"], summary["failures"], summary["freshness"])
+        )
+        conn.execute("DELETE FROM passes WHERE id <= (SELECT MAX(id) FROM passes) - ?", (PASS_HISTORY,))
+
+    def report(self, window_hours: float = 24) -> Dict[str, Any]:
+        """
+        Report how fresh the index is expected to be against the budget spent keeping it so.
+
+        Freshness is the expected share of tracked pages whose indexed content
+        still matches the live page, from each page's estimated change rate.
+
+        Args:
+            window_hours: Period the spending is summed over
+
+        Returns:
+            Freshness, spending and budget figures
+        """
+        now = self._clock()
+        pages = self.tracked(now)
+        staleness = np.asarray([page.staleness for page in pages], dtype=np.float64)
+        rates_per_day = np.asarray([page.change_rate * 86400 for page in pages], dtype=np.float64)
+        checked, changed, chunks, failures, passes = self._conn().execute(
+            "SELECT COALESCE(SUM(pages_checked), 0), COALESCE(SUM(pages_changed), 0), "
+            "COALESCE(SUM(chunks_embedded), 0), COALESCE(SUM(failures), 0), COUNT(*) "
+            "FROM passes WHERE started_at >= ?",
+            (now - window_hours * 3600,)
+        ).fetchone()
+        history = self._conn().execute(
+            "SELECT started_at, pages_checked, pages_changed, chunks_embedded, freshness FROM passes "
+            "ORDER BY id DESC LIMIT 24"
+        ).fetchall()
+        budgets = self._refill(now)
+        return {
+            "pages": len(pages),
+            "freshness": 1 - float(staleness.mean()) if pages else None,
+            "expected_stale_pages": float(staleness.sum()),
+            "due_pages": sum(self._is_due(page, now) for page in pages),
+            "median_changes_per_day": float(np.median(rates_per_day)) if pages else None,
+            "spent": {
+                "window_hours": window_hours,
+                "passes": passes,
+                "pages_checked": checked,
+                "pages_changed": changed,
+                "chunks_embedded": chunks,
+                "failures": failures,
+                # Share of re-crawls that found new content, i.e. were not wasted.
+                "change_yield": changed / checked if checked else None,
+                "page_budget_used": checked / (self.pages_per_hour * window_hours) if self.pages_per_hour > 0 else None,
+                "chunk_budget_used": chunks / (self.chunks_per_hour * window_hours) if self.chunks_per_hour > 0 else None
+            },
+            "budget": {
+                "pages_per_hour": self.pages_per_hour,
+                "chunks_per_hour": self.chunks_per_hour,
+                "pages_available": budgets["pages"] if math.isfinite(budgets["pages"]) else None,
+                "chunks_available": budgets["chunks"] if math.isfinite(budgets["chunks"]) else None
+            },
+            "recent_passes": [
+                {
+                    "started_at": started_at,
+                    "pages_checked": pages_checked,
+                    "pages_changed": pages_changed,
+                    "chunks_embedded": chunks_embedded,
+                    "freshness": freshness
+                }
+                for started_at, pages_checked, pages_changed, chunks_embedded, freshness in history
+            ]
+        }
+
+    def start(self):
+        """Start a background thread that runs a pass every interval."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.run_pass()
+                except Exception as e:
+                    print(f"Error in re-crawl pass: {e}")
+
+        self._thread = threading.Thread(target=run, name="recrawl-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by start."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,474 @@
+"""
+Zero-downtime re-embedding into a new collection generation.
+
+Changing the embedding provider, the model or the chunking settings makes
+every stored vector obsolete. Rather than recreating the collection, a
+reindex builds the next generation ('<alias>__v<n>') beside the live one:
+
+1. The target collection is created with the new model's dimension.
+2. Every page is read back from the live collection, re-chunked if the
+   chunking settings change, re-embedded at REINDEX_CHUNKS_PER_MINUTE and
+   stored in the target. Meanwhile every worker dual-writes new ingests and
+   deletions to the target as well.
+3. Catch-up sweeps copy again the pages whose ingestion timestamp differs
+   between the generations and remove pages deleted in the meantime.
+4. The alias is swapped to the target and the state marked active. Each
+   worker then switches collection, embedder and chunking settings together,
+   within REINDEX_SYNC_SECONDS.
+
+The state and progress are kept in Qdrant next to the collections, so every
+worker can report them and cancel the reindex.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.config import (
+    EMBEDDING_PROVIDER,
+    REINDEX_CHUNKS_PER_MINUTE,
+    REINDEX_SYNC_SECONDS,
+    REINDEX_KEEP_PREVIOUS
+)
+from app.metrics import metrics
+from app.processing.batch import ChunkBatch, as_embedding_matrix
+from app.processing.chunker import TextChunker
+from app.processing.embeddings import EmbeddingProvider, create_embedding_provider
+from app.processing.ratelimit import TokenBucket
+from app.retry import call_with_retry
+from app.storage.qdrant_client import QdrantStorage, build_context_windows
+
+BUILDING = "building"
+ACTIVE = "active"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+CHUNKING_STRATEGIES = ("paragraph", "sentence", "token")
+# A building reindex whose state was not updated for this long is assumed dead.
+STALE_AFTER_SECONDS = 300
+# Minimum time between two saves of the progress.
+PROGRESS_INTERVAL_SECONDS = 2.0
+# Catch-up sweeps run until one finds nothing to copy, at most this many times.
+MAX_SWEEPS = 3
+
+
+class ReindexCancelled(Exception):
+    """Raised inside the reindex thread when the reindex was cancelled."""
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def page_batch(chunks: List[Dict[str, Any]]) -> ChunkBatch:
+    """Rebuild the ChunkBatch of a stored page from its chunk payloads, keeping the chunk indices."""
+    return ChunkBatch.from_dicts(
+        {
+            "text": chunk.get("text", ""),
+            "chunk_index": chunk.get("chunk_index", 0),
+            "url": chunk.get("url", ""),
+            "source": chunk.get("source", "web"),
+            "title": chunk.get("title", ""),
+            "timestamp": chunk.get("timestamp", "")
+        }
+        for chunk in chunks
+    )
+
+
+def page_sections(chunks: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Reassemble the sections of a stored page from its chunks, for re-chunking.
+
+    Consecutive chunks with the same title are stitched back together,
+    dropping the text repeated by the chunk overlap.
+
+    Args:
+        chunks: Chunk payloads ordered by chunk index
+
+    Returns:
+        Sections in page order, each with 'title' and 'text'
+    """
+    groups = []
+    for chunk in chunks:
+        title = chunk.get("title", "")
+        if not groups or groups[-1][0] != title:
+            groups.append((title, {}))
+        groups[-1][1][chunk.get("chunk_index", 0)] = chunk.get("text", "")
+    return [
+        {"title": title, "text": "\n\n".join(window["text"] for window in build_context_windows(texts, {}))}
+        for title, texts in groups
+    ]
+
+
+class Reindexer:
+    """Builds a new generation of the knowledge base's collection in a background thread."""
+
+    def __init__(
+        self,
+        kb,
+        chunks_per_minute: float = REINDEX_CHUNKS_PER_MINUTE,
+        keep_previous: bool = REINDEX_KEEP_PREVIOUS,
+        rate_limiter: Optional[TokenBucket] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Initialize the reindexer.
+
+        Args:
+            kb: KnowledgeBase whose storage is reindexed
+            chunks_per_minute: Re-embedding rate (0 disables throttling)
+            keep_previous: Keep the replaced generation, instead of deleting it
+                once every worker has switched
+            rate_limiter: Token bucket to use instead of one built from chunks_per_minute
+            sleep: Sleep function, overridable for tests
+        """
+        self.kb = kb
+        self.keep_previous = keep_previous
+        # A burst of at most ten seconds' worth keeps live embedding traffic unaffected.
+        self.rate_limiter = rate_limiter or TokenBucket(chunks_per_minute, capacity=chunks_per_minute / 6)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._embedder: Optional[EmbeddingProvider] = None
+        self._state: Optional[Dict[str, Any]] = None
+        self._saved_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(
+        self,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        chunking_strategy: Optional[str] = None,
+        max_chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        embedder: Optional[EmbeddingProvider] = None,
+        background: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Start building a new generation with another embedding model or chunking.
+
+        Args:
+            provider: Embedding provider, as in EMBEDDING_PROVIDER; defaults to the configured one
+            model: Embedding model, defaults to the provider's configured model
+            chunking_strategy: New chunking strategy, or None to keep the current one
+            max_chunk_size: New maximum chunk size, or None to keep the current one
+            chunk_overlap: New chunk overlap, or None to keep the current one
+            embedder: Embedding provider instance to use instead of provider and model
+            background: Run in a background thread; False runs to completion before returning
+
+        Returns:
+            The reindex state
+
+        Raises:
+            ValueError: If the settings are invalid, a reindex is already running or
+                the collection predates aliases
+        """
+        kb = self.kb
+        chunking = {
+            "strategy": str(chunking_strategy or kb.chunker.strategy).lower().strip(),
+            "max_chunk_size": max_chunk_size or kb.chunker.max_chunk_size,
+            "chunk_overlap": kb.chunker.chunk_overlap if chunk_overlap is None else chunk_overlap
+        }
+        if chunking["strategy"] not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Invalid chunking strategy: '{chunking_strategy}'. Must be one of: {', '.join(CHUNKING_STRATEGIES)}")
+        if chunking["max_chunk_size"] <= 0 or not 0 <= chunking["chunk_overlap"] < chunking["max_chunk_size"]:
+            raise ValueError("Chunk overlap must be smaller than the maximum chunk size")
+        rechunk = (
+            chunking["max_chunk_size"] != kb.chunker.max_chunk_size
+            or chunking["chunk_overlap"] != kb.chunker.chunk_overlap
+            or (chunking_strategy is not None and chunking["strategy"] != kb.chunker.strategy)
+        )
+
+        with self._lock:
+            source: QdrantStorage = kb.storage
+            if self.running:
+                raise ValueError("A reindex is already running")
+            if source.alias_target() is None:
+                raise ValueError(
+                    f"Collection {source.alias} predates collection aliases; "
+                    f"migrate it with POST /api/admin/reindex/migrate first"
+                )
+            previous = source.reindex_state()
+            if previous and previous["state"] == BUILDING:
+                if time.time() - previous["updated_at"] < STALE_AFTER_SECONDS:
+                    raise ValueError(f"A reindex into {previous['target']} is already running")
+                if previous["target"] not in (source.collection_name, source.alias_target()):
+                    source.drop_generation(previous["target"])
+
+            if embedder is None:
+                embedder = create_embedding_provider(provider or EMBEDDING_PROVIDER, model)
+                spec = {"provider": provider or EMBEDDING_PROVIDER, "model": model}
+            else:
+                spec = {"provider": None, "model": None}
+            dimension = len(as_embedding_matrix(embedder.get_embeddings(["dimension probe"]))[0])
+
+            generation = max(source.generations() + [0]) + 1
+            target = source.create_generation(generation, dimension)
+            now = time.time()
+            state = {
+                "source": source.collection_name,
+                "target": target.collection_name,
+                "state": BUILDING,
+                "phase": "copying",
+                "embedding": {**spec, "model_id": embedder.model_id, "dimension": dimension},
+                "chunking": chunking,
+                "rechunk": rechunk,
+                "pages_total": sum(source.count_pages(name) for name in source.page_collections()),
+                "pages_done": 0,
+                "chunks_done": 0,
+                "pages_swept": 0,
+                "started_at": now,
+                "updated_at": now,
+                "finished_at": None,
+                "error": None
+            }
+            source.save_reindex_state(state)
+            self._cancel.clear()
+            self._embedder = embedder
+            self._state = state
+            chunker = self.chunker_for(state)
+            print(f"Reindexing {state['pages_total']} pages from {source.collection_name} into {target.collection_name}")
+            # Dual-writing starts right away in this worker.
+            kb._sync_generation(force=True)
+
+            if not background:
+                self._run(source, target, embedder, chunker, state)
+                return self.status()
+            self._thread = threading.Thread(
+                target=self._run, args=(source, target, embedder, chunker, state), name="reindex", daemon=True
+            )
+            self._thread.start()
+        return self.status()
+
+    def cancel(self) -> Dict[str, Any]:
+        """
+        Cancel the running reindex; its collections are deleted and the live generation is kept.
+
+        Raises:
+            ValueError: If no reindex is running
+        """
+        storage = self.kb.storage
+        state = storage.reindex_state()
+        if not state or state["state"] != BUILDING:
+            raise ValueError("No reindex is running")
+        self._cancel.set()
+        state.update(state=CANCELLED, updated_at=time.time(), finished_at=time.time())
+        # The reindexing worker, this one or another, stops at its next progress check.
+        storage.save_reindex_state(state)
+        self.kb._sync_generation(force=True)
+        return self.status()
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the state and progress of the last reindex, with its rate and estimated time left.
+
+        Returns:
+            Reindex state, or None if the collection was never reindexed
+        """
+        state = self.kb.storage.reindex_state()
+        if not state:
+            return None
+        status = dict(state)
+        end = state["finished_at"] or state["updated_at"]
+        elapsed = max(end - state["started_at"], 1e-6)
+        status["pages_per_minute"] = state["pages_done"] / elapsed * 60
+        status["chunks_per_minute"] = state["chunks_done"] / elapsed * 60
+        status["progress"] = state["pages_done"] / state["pages_total"] if state["pages_total"] else 1.0
+        status["eta_seconds"] = None
+        if state["state"] == BUILDING and state["phase"] == "copying" and state["pages_done"]:
+            status["eta_seconds"] = max(0, state["pages_total"] - state["pages_done"]) / state["pages_done"] * elapsed
+        return status
+
+    def embedder_for(self, state: Dict[str, Any]) -> EmbeddingProvider:
+        """Get an embedder for the model of a reindex state, reusing this worker's instances."""
+        model_id = state["embedding"]["model_id"]
+        for embedder in (self._embedder, self.kb.embedder):
+            if embedder is not None and embedder.model_id == model_id:
+                return embedder
+        spec = state["embedding"]
+        if not spec["provider"]:
+            raise ValueError(f"No embedding provider is known for model {model_id}")
+        self._embedder = create_embedding_provider(spec["provider"], spec["model"])
+        return self._embedder
+
+    def chunker_for(self, state: Dict[str, Any]) -> Optional[TextChunker]:
+        """Get a chunker for the settings of a reindex state, or None if it keeps the chunks."""
+        if not state["rechunk"]:
+            return None
+        chunking = state["chunking"]
+        return TextChunker(chunking["max_chunk_size"], chunking["chunk_overlap"], chunking["strategy"])
+
+    def rechunk(self, batch: ChunkBatch, chunker: TextChunker) -> Optional[ChunkBatch]:
+        """
+        Chunk the chunks of one page again with other settings.
+
+        Args:
+            batch: All chunks of a page, in order
+            chunker: Chunker with the new settings
+
+        Returns:
+            The page's new chunks, or None if nothing is left
+        """
+        chunks = batch.to_dicts()
+        batches = (
+            chunker.chunk_batch(section["text"], metadata={
+                "url": chunks[0].get("url", ""),
+                "source": chunks[0].get("source", "web"),
+                "title": section["title"],
+                "timestamp": chunks[0].get("timestamp", "")
+            })
+            for section in page_sections(chunks)
+        )
+        return next(self.kb._merge_pages(batches), None)
+
+    def _run(
+        self,
+        source: QdrantStorage,
+        target: QdrantStorage,
+        embedder: EmbeddingProvider,
+        chunker: Optional[TextChunker],
+        state: Dict[str, Any]
+    ):
+        try:
+            for collection in source.page_collections():
+                for pages in _batched(source.iter_pages(collection), 64):
+                    for page in pages:
+                        state["chunks_done"] += self._copy_page(source, target, embedder, chunker, page)
+                        state["pages_done"] += 1
+                    self._save_progress(source, state)
+
+            state["phase"] = "sweeping"
+            for _ in range(MAX_SWEEPS):
+                changed = self._sweep(source, target, embedder, chunker, state)
+                state["pages_swept"] += changed
+                if changed == 0:
+                    break
+
+            self._check_cancelled(source)
+            state["phase"] = "swapping"
+            source.swap_alias(target.collection_name)
+            now = time.time()
+            state.update(state=ACTIVE, phase="done", updated_at=now, finished_at=now)
+            source.save_reindex_state(state)
+            self.kb._switch_generation(state, storage=target, embedder=embedder)
+            metrics.increment("reindex.completed")
+            print(f"Reindex complete: {target.alias} now points to {target.collection_name}")
+
+            if not self.keep_previous:
+                # Let the other workers switch before their collection goes away.
+                self._sleep(2 * REINDEX_SYNC_SECONDS)
+                target.drop_generation(source.collection_name)
+        except ReindexCancelled:
+            print(f"Reindex into {target.collection_name} cancelled")
+            source.drop_generation(target.collection_name)
+        except Exception as e:
+            print(f"Reindex into {target.collection_name} failed: {e}")
+            if state["state"] == BUILDING:
+                now = time.time()
+                state.update(state=FAILED, updated_at=now, finished_at=now, error=f"{type(e).__name__}: {e}")
+                try:
+                    source.save_reindex_state(state)
+                    source.drop_generation(target.collection_name)
+                except Exception as cleanup_error:
+                    print(f"Error cleaning up the failed reindex: {cleanup_error}")
+            self.kb._sync_generation(force=True)
+
+    def _copy_page(
+        self,
+        source: QdrantStorage,
+        target: QdrantStorage,
+        embedder: EmbeddingProvider,
+        chunker: Optional[TextChunker],
+        page: Dict[str, Any]
+    ) -> int:
+        """Re-embed one page into the target, replacing any copy already there; returns its chunk count."""
+        url, tenant_id = page["url"], page["tenant_id"]
+        chunks = source.page_chunks(url, tenant_id)
+        target.delete_by_url(url, tenant_id=tenant_id)
+        if not chunks:
+            return 0
+
+        batch = page_batch(chunks)
+        if chunker is not None:
+            batch = self.rechunk(batch, chunker)
+            if not batch:
+                return 0
+
+        self.rate_limiter.acquire(len(batch))
+        policy = self.kb.retry_policy
+        vectors = call_with_retry(lambda: embedder.get_embeddings(batch.texts), policy, "reindex_embed")
+        call_with_retry(
+            lambda: target.store_embeddings(batch, as_embedding_matrix(vectors), tenant_id=tenant_id),
+            policy,
+            "reindex_store"
+        )
+        metrics.increment("reindex.pages")
+        metrics.increment("reindex.chunks", len(batch))
+        return len(batch)
+
+    def _sweep(
+        self,
+        source: QdrantStorage,
+        target: QdrantStorage,
+        embedder: EmbeddingProvider,
+        chunker: Optional[TextChunker],
+        state: Dict[str, Any]
+    ) -> int:
+        """
+        Bring the target up to date with writes the copy may have missed.
+
+        Pages whose timestamp differs between the generations are copied again,
+        and pages missing from the source are deleted from the target.
+
+        Returns:
+            Number of pages copied or deleted
+        """
+        changed = 0
+        seen = set()
+        for collection in source.page_collections():
+            for pages in _batched(source.iter_pages(collection), 256):
+                copied = target.page_timestamps(pages)
+                for page in pages:
+                    key = (page["tenant_id"], page["url"])
+                    seen.add(key)
+                    if copied.get(key) != page["timestamp"]:
+                        self._copy_page(source, target, embedder, chunker, page)
+                        changed += 1
+                self._save_progress(source, state)
+
+        for collection in target.page_collections():
+            for page in list(target.iter_pages(collection)):
+                if (page["tenant_id"], page["url"]) not in seen:
+                    target.delete_by_url(page["url"], tenant_id=page["tenant_id"])
+                    changed += 1
+        return changed
+
+    def _check_cancelled(self, source: QdrantStorage):
+        """Raise ReindexCancelled if this or another worker cancelled the reindex."""
+        if self._cancel.is_set():
+            raise ReindexCancelled()
+        saved = source.reindex_state()
+        if not saved or saved["state"] != BUILDING or saved["target"] != self._state["target"]:
+            raise ReindexCancelled()
+
+    def _save_progress(self, source: QdrantStorage, state: Dict[str, Any]):
+        """Save the progress, at most every PROGRESS_INTERVAL_SECONDS, after checking for cancellation."""
+        if self._cancel.is_set():
+            raise ReindexCancelled()
+        now = time.monotonic()
+        if now - self._saved_at < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._check_cancelled(source)
+        state["updated_at"] = time.time()
+        source.save_reindex_state(state)
+        self._saved_at = now
@@ -0,0 +1,127 @@
+"""
+Retries with capped exponential backoff and full jitter.
+"""
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, Type, TypeVar
+
+import httpx
+import requests
+
+from app.metrics import metrics
+
+T = TypeVar("T")
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors.
+TRANSIENT_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Network failures as raised by the HTTP clients themselves, before any wrapping.
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    httpx.TransportError,
+    requests.ConnectionError,
+    requests.Timeout
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether an error is likely to go away when the call is retried.
+
+    Network errors and timeouts are transient, as are errors carrying an HTTP
+    status in TRANSIENT_STATUSES (as status_code, status, code or the status
+    of their response, as for requests' HTTPError) and errors
+    flagged with retry=True. Client libraries that wrap a network error (the
+    OpenAI and Qdrant clients) are seen through via the wrapped error.
+
+    Args:
+        error: Error raised by the call
+
+    Returns:
+        True if the call should be retried
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        retry = getattr(error, "retry", None)
+        if isinstance(retry, bool):
+            return retry
+        statuses = [getattr(error, attribute, None) for attribute in ("status_code", "status", "code")]
+        statuses.append(getattr(getattr(error, "response", None), "status_code", None))
+        for status in statuses:
+            if isinstance(status, int) and not isinstance(status, bool):
+                return status in TRANSIENT_STATUSES
+        # Qdrant's ResponseHandlingException keeps the network error as `source`.
+        error = getattr(error, "source", None) or error.__cause__
+    return False
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how patiently a failing call is retried."""
+
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def delay(self, retry: int, rng: Callable[[], float] = random.random) -> float:
+        """
+        Backoff before the given retry, drawn uniformly from [0, cap).
+
+        Args:
+            retry: 1 for the first retry, 2 for the second, ...
+            rng: Source of uniform [0, 1) values, overridable for tests
+
+        Returns:
+            Seconds to wait
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return rng() * cap
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    policy: RetryPolicy,
+    name: str = "call",
+    retry_on: Tuple[Type[BaseException], ...] = (),
+    sleep: Callable[[float], None] = time.sleep,
+    on_retry: Optional[Callable[[int, BaseException, float], None]] = None
+) -> T:
+    """
+    Call `fn`, retrying failures with backoff until the policy's attempts run out.
+
+    Args:
+        fn: Function to call without arguments
+        policy: Retry policy
+        name: Label for logs and the `retry.{name}` counter
+        retry_on: Exception types retried besides transient errors (see
+            is_transient); anything else propagates at once
+        sleep: Sleep function, overridable for tests
+        on_retry: Called with (retry, error, delay) before each backoff
+
+    Returns:
+        Result of the first successful call
+
+    Raises:
+        The last error once all attempts have failed
+    """
+    retry = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if not (is_transient(e) or isinstance(e, retry_on)):
+                raise
+            retry += 1
+            if retry >= policy.attempts:
+                raise
+            delay = policy.delay(retry)
+            metrics.increment(f"retry.{name}")
+            print(f"Retrying {name} in {delay:.2f}s after attempt {retry} failed: {e}")
+            if on_retry is not None:
+                on_retry(retry, e, delay)
+            sleep(delay)
@@ -1,5 +1,8 @@
 from pydantic import BaseModel, HttpUrl, Field, validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+from datetime import datetime
+
+TENANT_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
 
 class ScrapeRequest(BaseModel):
     url: HttpUrl
@@ -20,6 +23,7 @@ class ProcessWebsiteRequest(BaseModel):
     depth: int = 1
     parseJs: bool = False
     chunkingStrategy: Optional[str] = None
+    tenantId: Optional[str] = Field(None, pattern=TENANT_ID_PATTERN)
     
     @validator('chunkingStrategy')
     def validate_chunking_strategy(cls, v):
@@ -35,10 +39,32 @@ class ProcessWebsiteResponse(BaseModel):
     status: str
     data: Dict[str, Any]
 
+class SearchFilter(BaseModel):
+    domain: Optional[Union[str, List[str]]] = Field(None, description="Host name(s), e.g. docs.example.com")
+    pathPrefix: Optional[str] = Field(None, description="URL path the page must be under, e.g. /guides")
+    source: Optional[Union[str, List[str]]] = None
+    crawledAfter: Optional[datetime] = None
+    crawledBefore: Optional[datetime] = None
+    title: Optional[str] = Field(None, description="Words that must appear in the section title")
+    
+    def to_filters(self) -> Dict[str, Any]:
+        """Convert to the keyword arguments of the storage filter builder."""
+        return {
+            "domain": self.domain,
+            "path_prefix": self.pathPrefix,
+            "source": self.source,
+            "crawled_after": int(self.crawledAfter.timestamp()) if self.crawledAfter else None,
+            "crawled_before": int(self.crawledBefore.timestamp()) if self.crawledBefore else None,
+            "title": self.title
+        }
+
 class SearchRequest(BaseModel):
     query: str
     limit: int = 5
     urlFilter: Optional[str] = None
+    tenantId: Optional[str] = Field(None, pattern=TENANT_ID_PATTERN)
+    filter: Optional[SearchFilter] = None
+    deadlineMs: Optional[int] = Field(None, ge=1, description="Time budget of the search; defaults to SEARCH_DEADLINE_MS")
     
 class SearchResult(BaseModel):
     id: str
@@ -48,7 +74,38 @@ class SearchResult(BaseModel):
     chunk_index: int = 0
     title: Optional[str] = None
     source: str = "web"
+    timestamp: Optional[str] = None
     
 class SearchResponse(BaseModel):
     status: str
     data: List[SearchResult]
+
+class GroupedSearchRequest(SearchRequest):
+    groups: int = Field(5, ge=1, le=100, description="Number of pages to return")
+    groupSize: int = Field(3, ge=1, le=20, description="Best chunks returned per page")
+    stitch: bool = Field(True, description="Merge consecutive chunks into context windows")
+    contextChunks: int = Field(0, ge=0, le=5, description="Neighbouring chunks added around each hit")
+
+class ContextWindow(BaseModel):
+    start_chunk: int
+    end_chunk: int
+    text: str
+    score: Optional[float] = None
+
+class PageGroup(BaseModel):
+    url: str
+    score: float
+    title: Optional[str] = None
+    chunks: List[SearchResult]
+    windows: List[ContextWindow]
+
+class GroupedSearchResponse(BaseModel):
+    status: str
+    data: List[PageGroup]
+
+class ReindexRequest(BaseModel):
+    embeddingProvider: Optional[str] = Field(None, description="Provider as in EMBEDDING_PROVIDER, e.g. 'openai@http://tei:8080/v1'; defaults to the configured one")
+    embeddingModel: Optional[str] = Field(None, description="Model of the provider, defaults to its configured model")
+    chunkingStrategy: Optional[str] = Field(None, description="New default chunking strategy; pages are re-chunked when the chunking changes")
+    maxChunkSize: Optional[int] = Field(None, ge=1)
+    chunkOverlap: Optional[int] = Field(None, ge=0)
@@ -1,3 +1,16 @@
 class ScraperProvider:
+    # Resumable providers take a run_id in scrape_iter, and continue an
+    # interrupted scrape when called again with the same one.
+    resumable = False
+
     def scrape(self, url, depth=1, parse_js=False):
         raise NotImplementedError
+
+    def scrape_iter(self, url, depth=1, parse_js=False):
+        """
+        Yield scraped pages one at a time.
+
+        Providers that can fetch incrementally should override this so that
+        callers can start consuming pages before the whole crawl is finished.
+        """
+        yield from self.scrape(url, depth, parse_js)
@@ -0,0 +1,392 @@
+"""
+Multi-process crawler pulling from a shared CrawlFrontier.
+
+Each worker process leases URLs from the frontier, fetches them, queues the
+links it finds and hands the page to the parent. Because all coordination
+goes through the frontier files, workers can also be started independently
+on the same machine, for example to add capacity to a running crawl:
+
+    python -m app.scraper.crawler --frontier /var/lib/kb/site.db --seed https://docs.example.com/ --depth 4 --workers 8 --output pages.jsonl
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+import uuid
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from app.config import (
+    CRAWL_WORKERS,
+    CRAWL_FRONTIER_DIR,
+    CRAWL_HOST_CONCURRENCY,
+    CRAWL_DELAY_MS,
+    CRAWL_LEASE_SECONDS,
+    CRAWL_MAX_PAGES,
+    CRAWL_MAX_ATTEMPTS,
+    CRAWL_BLOOM_CAPACITY,
+    CRAWL_BLOOM_ERROR_RATE,
+    CRAWL_TIMEOUT_SECONDS,
+    CRAWL_USER_AGENT
+)
+from app.scraper.frontier import CrawlFrontier, normalize_url
+
+# Fetch results that are not worth retrying.
+PERMANENT_STATUSES = {400, 401, 403, 404, 405, 410, 414, 451}
+
+
+class FetchError(Exception):
+    """A fetch failed; `retry` tells whether trying again later may help."""
+
+    def __init__(self, message: str, retry: bool = True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class LinkExtractor(HTMLParser):
+    """Collects the title, the <base> URL and the href of every link of a page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.base: Optional[str] = None
+        self.links: List[str] = []
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            attributes = dict(attrs)
+            href = attributes.get("href")
+            if href and "nofollow" not in (attributes.get("rel") or "").lower():
+                self.links.append(href)
+        elif tag == "base" and self.base is None:
+            self.base = dict(attrs).get("href")
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def extract_links(html: str, page_url: str) -> Tuple[str, List[str]]:
+    """
+    Find the title and the absolute http(s) links of a page.
+
+    Args:
+        html: Page HTML
+        page_url: URL the page was fetched from, for resolving relative links
+
+    Returns:
+        (title, links) with fragments removed and duplicates dropped, in page order
+    """
+    parser = LinkExtractor()
+    parser.feed(html)
+    parser.close()
+    base = urljoin(page_url, parser.base) if parser.base else page_url
+    links = []
+    seen = set()
+    for href in parser.links:
+        link = normalize_url(urljoin(base, href.strip()))
+        if urlsplit(link).scheme in ("http", "https") and link not in seen:
+            seen.add(link)
+            links.append(link)
+    return parser.title.strip(), links
+
+
+def fetch_page(session: requests.Session, url: str, timeout: float = CRAWL_TIMEOUT_SECONDS) -> Tuple[str, Optional[str]]:
+    """
+    Fetch a URL.
+
+    Returns:
+        (final URL after redirects, HTML body or None if the response is not HTML)
+
+    Raises:
+        FetchError: If the request fails or returns an error status
+    """
+    try:
+        response = session.get(url, timeout=timeout)
+    except requests.RequestException as e:
+        raise FetchError(f"{type(e).__name__}: {e}")
+    if response.status_code >= 400:
+        raise FetchError(f"HTTP {response.status_code}", retry=response.status_code not in PERMANENT_STATUSES)
+    if "html" not in response.headers.get("Content-Type", "text/html"):
+        return response.url, None
+    return response.url, response.text
+
+
+def crawl_worker(
+    frontier: CrawlFrontier,
+    emit: Callable[[Dict[str, Any]], None],
+    max_depth: int,
+    allowed_hosts: Set[str],
+    owner: str,
+    fetch: Optional[Callable[[str], Tuple[str, Optional[str]]]] = None,
+    sleep: Callable[[float], None] = time.sleep
+) -> int:
+    """
+    Crawl from the frontier until it is exhausted.
+
+    Args:
+        frontier: Shared frontier
+        emit: Called with each fetched HTML page ({"url", "title", "text"})
+        max_depth: Pages at depth max_depth - 1 are fetched but their links are not followed
+        allowed_hosts: Hosts whose links are queued
+        owner: Worker identifier for leases
+        fetch: Function returning (final URL, HTML or None), defaults to fetch_page with a new session
+        sleep: Sleep function, overridable for tests
+
+    Returns:
+        Number of pages emitted
+    """
+    if fetch is None:
+        session = requests.Session()
+        session.headers["User-Agent"] = CRAWL_USER_AGENT
+        fetch = lambda url: fetch_page(session, url)
+
+    emitted = 0
+    while True:
+        lease = frontier.pop(owner)
+        if lease is None:
+            wait = frontier.wait_time()
+            if wait is None:
+                return emitted
+            sleep(wait)
+            continue
+
+        try:
+            final_url, html = fetch(lease.url)
+        except FetchError as e:
+            print(f"Failed to fetch {lease.url}: {e}")
+            frontier.fail(lease, retry=e.retry)
+            continue
+
+        links = []
+        if html is not None:
+            title, found = extract_links(html, final_url)
+            if lease.depth + 1 < max_depth:
+                links = [link for link in found if urlsplit(link).netloc.lower() in allowed_hosts]
+            emit({"url": final_url, "title": title, "text": html})
+            emitted += 1
+        frontier.complete(lease, links)
+
+
+def _frontier_options() -> Dict[str, Any]:
+    return {
+        "host_concurrency": CRAWL_HOST_CONCURRENCY,
+        "delay": CRAWL_DELAY_MS / 1000,
+        "lease_seconds": CRAWL_LEASE_SECONDS,
+        "max_pages": CRAWL_MAX_PAGES,
+        "max_attempts": CRAWL_MAX_ATTEMPTS,
+        "bloom_capacity": CRAWL_BLOOM_CAPACITY,
+        "bloom_error_rate": CRAWL_BLOOM_ERROR_RATE
+    }
+
+
+def _worker_main(path: str, options: Dict[str, Any], max_depth: int, allowed_hosts: Set[str], pages: "multiprocessing.Queue"):
+    """Entry point of a crawler process; puts pages on `pages`, then None when done."""
+    frontier = CrawlFrontier(path, **options)
+    try:
+        crawl_worker(frontier, pages.put, max_depth, allowed_hosts, owner=f"{os.getpid()}")
+    except Exception as e:
+        print(f"Crawler worker {os.getpid()} stopped: {e}")
+    finally:
+        frontier.close()
+        pages.put(None)
+
+
+def start_workers(
+    path: str,
+    options: Dict[str, Any],
+    max_depth: int,
+    allowed_hosts: Set[str],
+    workers: int
+) -> Tuple[List[multiprocessing.Process], "multiprocessing.Queue"]:
+    """
+    Start crawler processes on the frontier at `path`.
+
+    Returns:
+        The processes, and the queue they put pages on, followed by one None per process
+    """
+    context = multiprocessing.get_context("spawn")
+    pages = context.Queue(maxsize=256)
+    processes = [
+        context.Process(target=_worker_main, args=(path, options, max_depth, allowed_hosts, pages), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    return processes, pages
+
+
+def _lock_run(path: str):
+    """
+    Take an exclusive lock on a crawl run, released when the returned file is closed
+    or the process exits.
+
+    Returns:
+        The open lock file, or None if another crawl holds the lock
+    """
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class FrontierCrawler:
+    """Runs crawler worker processes over a frontier and collects their pages."""
+
+    def __init__(
+        self,
+        workers: int = CRAWL_WORKERS,
+        frontier_dir: str = CRAWL_FRONTIER_DIR,
+        frontier_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize the crawler.
+
+        Args:
+            workers: Number of worker processes
+            frontier_dir: Directory keeping the frontiers of interrupted crawl runs,
+                so they can be resumed; empty to crawl from a temporary frontier
+            frontier_options: CrawlFrontier keyword arguments, defaults to the CRAWL_* settings
+        """
+        self.workers = max(1, workers)
+        self.frontier_dir = frontier_dir
+        self.frontier_options = frontier_options if frontier_options is not None else _frontier_options()
+
+    def frontier_path(self, directory: str, seed: str, depth: int, run_id: str) -> str:
+        key = f"{seed}|{depth}|{run_id}"
+        return os.path.join(directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".db")
+
+    def crawl(self, seed: str, depth: int = 1, run_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Crawl the seed's host, yielding pages as the workers fetch them.
+
+        Each run has its own frontier, so concurrent crawls of the same seed do
+        not share a queue. With a frontier directory and a `run_id`, the
+        frontier of an interrupted run is kept, and crawling again with the
+        same seed, depth and `run_id` continues where it stopped; it is removed
+        once the run completes. Without a `run_id` a crawl always starts
+        afresh. Closing the generator stops the workers.
+
+        Args:
+            seed: URL to start from
+            depth: 1 fetches only the seed, 2 also the pages it links to, ...
+            run_id: Identifies the run to resume, e.g. the ingestion job ID
+
+        Yields:
+            Page dictionaries with 'url', 'title' and 'text' (the page HTML)
+
+        Raises:
+            ValueError: If the run is already being crawled
+        """
+        seed = normalize_url(seed)
+        resumable = bool(self.frontier_dir and run_id)
+        directory = self.frontier_dir or tempfile.mkdtemp(prefix="crawl-")
+        os.makedirs(directory, exist_ok=True)
+        path = self.frontier_path(directory, seed, depth, run_id or uuid.uuid4().hex)
+
+        lock = _lock_run(path + ".lock")
+        if lock is None:
+            raise ValueError(f"Crawl run {run_id} of {seed} is already in progress")
+
+        completed = False
+        processes = []
+        try:
+            frontier = CrawlFrontier(path, **self.frontier_options)
+            frontier.add([seed])
+            frontier.close()
+
+            processes, pages = start_workers(
+                path, self.frontier_options, depth, {urlsplit(seed).netloc.lower()}, self.workers
+            )
+
+            running = len(processes)
+            while running:
+                try:
+                    page = pages.get(timeout=1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break
+                    continue
+                if page is None:
+                    running -= 1
+                else:
+                    yield page
+            completed = True
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            lock.close()
+            if completed or not resumable:
+                for suffix in ("", ".bloom", "-wal", "-shm", ".lock"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            if not self.frontier_dir:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a site with several worker processes sharing one frontier")
+    parser.add_argument("--frontier", required=True, help="Frontier database file, reused to resume the crawl")
+    parser.add_argument("--seed", action="append", required=True, help="Seed URL (repeatable); seen seeds are skipped on resume")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--output", required=True, help="JSONL file the pages are appended to")
+    args = parser.parse_args()
+
+    options = _frontier_options()
+    frontier = CrawlFrontier(args.frontier, **options)
+    frontier.add(args.seed)
+    allowed_hosts = {urlsplit(seed).netloc.lower() for seed in args.seed}
+    frontier.close()
+
+    processes, pages = start_workers(args.frontier, options, args.depth, allowed_hosts, args.workers)
+    running = len(processes)
+    started = time.monotonic()
+    count = 0
+    with open(args.output, "a", encoding="utf-8") as output:
+        while running:
+            page = pages.get()
+            if page is None:
+                running -= 1
+                continue
+            output.write(json.dumps(page) + "\n")
+            count += 1
+    for process in processes:
+        process.join()
+
+    frontier = CrawlFrontier(args.frontier, **options)
+    print(f"Wrote {count} pages in {time.monotonic() - started:.1f}s: {frontier.stats()}")
+    frontier.close()
+
+
+if __name__ == "__main__":
+    main()
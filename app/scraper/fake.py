@@ -0,0 +1,54 @@
+import hashlib
+import random
+import time
+
+from app.scraper.base import ScraperProvider
+
+WORDS = (
+    "search index vector crawl page content model query result token chunk embedding "
+    "storage latency request server client network cache batch tenant filter score"
+).split()
+
+
+class FakeScraperProvider(ScraperProvider):
+    """
+    Scraper that generates deterministic pages locally, for tests and load testing.
+
+    The same URL always yields the same pages, so re-ingesting a site
+    overwrites its points instead of adding new ones.
+    """
+
+    def __init__(self, pages: int = 3, paragraphs: int = 8, latency: float = 0.0):
+        """
+        Initialize the fake scraper.
+
+        Args:
+            pages: Pages returned per crawl
+            paragraphs: Paragraphs of text per page
+            latency: Simulated fetch time per page in seconds
+        """
+        self.pages = pages
+        self.paragraphs = paragraphs
+        self.latency = latency
+
+    def _page(self, url, index):
+        seed = int.from_bytes(hashlib.blake2b(f"{url}#{index}".encode("utf-8"), digest_size=8).digest(), "little")
+        rng = random.Random(seed)
+        paragraphs = []
+        for _ in range(self.paragraphs):
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))).capitalize() + "."
+                for _ in range(rng.randint(2, 5))
+            ]
+            paragraphs.append(" ".join(sentences))
+        page_url = url if index == 0 else f"{url.rstrip('/')}/page-{index}"
+        return {"url": page_url, "text": "\n\n".join(paragraphs)}
+
+    def scrape_iter(self, url, depth=1, parse_js=False):
+        for index in range(self.pages if depth > 1 else 1):
+            if self.latency > 0:
+                time.sleep(self.latency)
+            yield self._page(url, index)
+
+    def scrape(self, url, depth=1, parse_js=False):
+        return list(self.scrape_iter(url, depth, parse_js))
@@ -1,39 +1,270 @@
+"""
+Client for the Firecrawl API.
+
+A single page (depth 1) is fetched with /v1/scrape. Deeper crawls start an
+asynchronous /v1/crawl job and poll its status, yielding pages as soon as
+Firecrawl has them, so ingestion starts long before the crawl is finished.
+Polling starts at FIRECRAWL_POLL_MIN_SECONDS and backs off towards
+FIRECRAWL_POLL_MAX_SECONDS while no new pages arrive.
+
+All requests share one pooled keep-alive session. Rate limiting (429, with
+its Retry-After) and transient server errors are retried with backoff.
+"""
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
 import requests
-import logging
+from requests.adapters import HTTPAdapter
+
+from app.config import (
+    FIRECRAWL_API_KEY,
+    FIRECRAWL_API_URL,
+    FIRECRAWL_TIMEOUT_SECONDS,
+    FIRECRAWL_POOL_SIZE,
+    FIRECRAWL_MAX_PAGES,
+    FIRECRAWL_POLL_MIN_SECONDS,
+    FIRECRAWL_POLL_MAX_SECONDS,
+    FIRECRAWL_CRAWL_TIMEOUT_SECONDS,
+    FIRECRAWL_MAX_RETRY_AFTER_SECONDS,
+    INGEST_RETRY_ATTEMPTS,
+    INGEST_RETRY_BASE_DELAY_MS,
+    INGEST_RETRY_MAX_DELAY_MS
+)
+from app.metrics import metrics
+from app.retry import RetryPolicy
+from app.scraper.base import ScraperProvider
+
+# Responses worth retrying: timeouts, rate limiting and transient server errors.
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# How long Firecrawl waits for JavaScript to render when parse_js is set.
+JS_WAIT_MS = 2000
+
+
+class FirecrawlError(Exception):
+    """A Firecrawl request or crawl job failed."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retry = retry
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds from a Retry-After header, if it is given as a number."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
 
-class FirecrawlProvider:
-    FIRECRAWL_API = "https://api.firecrawl.dev/v1/scrape"
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json().get("error") or response.reason
+    except ValueError:
+        return response.reason
+
+
+def create_session(api_key: str = FIRECRAWL_API_KEY, pool_size: int = FIRECRAWL_POOL_SIZE) -> requests.Session:
+    """Create a keep-alive session for the Firecrawl API, with up to pool_size pooled connections."""
+    session = requests.Session()
+    # Retries are handled by the provider, which honors Retry-After.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Authorization"] = f"Bearer {api_key}"
+    return session
+
+
+class FirecrawlProvider(ScraperProvider):
+    """Scraper backed by the Firecrawl API, returning pages as markdown."""
+
+    def __init__(
+        self,
+        api_key: str = FIRECRAWL_API_KEY,
+        api_url: str = FIRECRAWL_API_URL,
+        session: Optional[requests.Session] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        max_pages: int = FIRECRAWL_MAX_PAGES,
+        poll_min: float = FIRECRAWL_POLL_MIN_SECONDS,
+        poll_max: float = FIRECRAWL_POLL_MAX_SECONDS,
+        crawl_timeout: float = FIRECRAWL_CRAWL_TIMEOUT_SECONDS,
+        timeout: float = FIRECRAWL_TIMEOUT_SECONDS,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the Firecrawl provider.
+
+        Args:
+            api_key: Firecrawl API key
+            api_url: Base URL of the API, e.g. for a self-hosted Firecrawl
+            session: Session to use instead of a new pooled one
+            retry_policy: Backoff for retried requests, defaults to the INGEST_RETRY_* settings
+            max_pages: Page limit of crawl jobs
+            poll_min: Shortest interval between two crawl status polls
+            poll_max: Longest interval between two crawl status polls
+            crawl_timeout: Seconds after which an unfinished crawl job is cancelled
+            timeout: Timeout of each request in seconds
+            sleep: Sleep function, overridable for tests
+            clock: Monotonic clock, overridable for tests
+        """
+        self.api_url = api_url.rstrip("/")
+        self.session = session or create_session(api_key)
+        self.retry_policy = retry_policy or RetryPolicy(
+            attempts=INGEST_RETRY_ATTEMPTS,
+            base_delay=INGEST_RETRY_BASE_DELAY_MS / 1000,
+            max_delay=INGEST_RETRY_MAX_DELAY_MS / 1000
+        )
+        self.max_pages = max_pages
+        self.poll_min = poll_min
+        self.poll_max = max(poll_min, poll_max)
+        self.crawl_timeout = crawl_timeout
+        self.timeout = timeout
+        self._sleep = sleep
+        self._clock = clock
 
     def scrape(self, url, depth=1, parse_js=False):
+        return list(self.scrape_iter(url, depth, parse_js))
+
+    def scrape_iter(self, url, depth=1, parse_js=False) -> Iterator[Dict[str, Any]]:
+        """
+        Scrape a page, or crawl a site when depth > 1, yielding pages as they are ready.
+
+        Closing the generator cancels a running crawl job.
+
+        Args:
+            url: URL to scrape or start the crawl from
+            depth: 1 scrapes only the URL, 2 also the pages it links to, ...
+            parse_js: Give client-side JavaScript time to render before capturing
+
+        Yields:
+            Page dictionaries with 'url', 'title' and 'text' (markdown)
+
+        Raises:
+            FirecrawlError: If a request fails after the retries, or the crawl job fails
+        """
+        if depth <= 1:
+            body = self._request("POST", "/v1/scrape", json={"url": url, **self._scrape_options(parse_js)})
+            page = self._page(body.get("data") or {}, url)
+            if page is not None:
+                yield page
+            return
+        yield from self._crawl(url, depth, parse_js)
+
+    @staticmethod
+    def _scrape_options(parse_js: bool) -> Dict[str, Any]:
+        options = {"formats": ["markdown"], "onlyMainContent": True}
+        if parse_js:
+            options["waitFor"] = JS_WAIT_MS
+        return options
+
+    def _page(self, document: Dict[str, Any], default_url: str) -> Optional[Dict[str, Any]]:
+        """Convert a Firecrawl document to a page, or None for an error page."""
+        metadata = document.get("metadata") or {}
+        if (metadata.get("statusCode") or 200) >= 400:
+            metrics.increment("firecrawl.error_pages")
+            return None
+        metrics.increment("firecrawl.pages")
+        return {
+            "url": metadata.get("sourceURL") or metadata.get("url") or default_url,
+            "title": metadata.get("title") or "",
+            "text": document.get("markdown") or ""
+        }
+
+    def _crawl(self, url: str, depth: int, parse_js: bool) -> Iterator[Dict[str, Any]]:
+        """Run a crawl job, yielding each page once as the status polls return it."""
+        job = self._request("POST", "/v1/crawl", json={
+            "url": url,
+            "limit": self.max_pages,
+            # Link hops from the start page; 'maxDepth' counts URL path segments instead.
+            "maxDiscoveryDepth": depth - 1,
+            "scrapeOptions": self._scrape_options(parse_js)
+        })
+        job_id = job["id"]
+        deadline = self._clock() + self.crawl_timeout
+        received = 0
+        interval = self.poll_min
+        finished = False
+        try:
+            while True:
+                new_pages = 0
+                body = self._request("GET", f"/v1/crawl/{job_id}", params={"skip": received})
+                while True:
+                    for document in body.get("data") or []:
+                        received += 1
+                        new_pages += 1
+                        page = self._page(document, url)
+                        if page is not None:
+                            yield page
+                    if not body.get("next"):
+                        break
+                    body = self._request("GET", body["next"])
+
+                status = body.get("status")
+                if status == "completed":
+                    finished = True
+                    return
+                if status in ("failed", "cancelled"):
+                    finished = True
+                    raise FirecrawlError(f"Crawl job {job_id} {status} after {received} pages")
+                if self._clock() > deadline:
+                    raise FirecrawlError(f"Crawl job {job_id} did not finish within {self.crawl_timeout:.0f}s")
+
+                # Poll eagerly while pages are flowing, back off while the job is busy elsewhere.
+                interval = self.poll_min if new_pages else min(self.poll_max, interval * 2)
+                self._sleep(interval)
+        finally:
+            if not finished:
+                self._cancel(job_id)
+
+    def _cancel(self, job_id: str):
+        try:
+            self._request("DELETE", f"/v1/crawl/{job_id}")
+        except Exception as e:
+            print(f"Error cancelling Firecrawl crawl job {job_id}: {e}")
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
         """
-        For testing with Qdrant cloud, we'll use a mock response
-        instead of calling the actual API
+        Send a request to the API, retrying rate limiting and transient failures.
+
+        Args:
+            method: HTTP method
+            path: API path, or an absolute URL returned by the API
+            **kwargs: Further arguments of requests.Session.request
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            FirecrawlError: If the request fails after the retries, or cannot succeed
         """
-        print(f"Mock scraping {url}...")
-        
-        if "wikipedia" in url and "artificial_intelligence" in url:
-            return [{
-                "url": url,
-                "text": """Artificial intelligence (AI) is intelligence demonstrated by machines, 
-                unlike natural intelligence displayed by animals including humans. 
-                AI research has been defined as the field of study of intelligent agents, 
-                which refers to any system that perceives its environment and takes actions 
-                that maximize its chance of achieving its goals.
-                
-                The term "artificial intelligence" had previously been used to describe machines 
-                that mimic and display "human" cognitive skills that are associated with the human mind, 
-                such as "learning" and "problem-solving". This definition has since been rejected 
-                by major AI researchers who now describe AI in terms of rationality and acting rationally, 
-                which does not limit how intelligence can be articulated.
-                
-                AI applications include advanced web search engines (e.g., Google), recommendation systems 
-                (used by YouTube, Amazon, and Netflix), understanding human speech (such as Siri and Alexa), 
-                self-driving cars (e.g., Waymo), generative or creative tools (ChatGPT and AI art), 
-                automated decision-making, and competing at the highest level in strategic game systems.
-                """
-            }]
-        else:
-            return [{
-                "url": url,
-                "text": f"This is sample text for {url} used for testing purposes."
-            }]
+        url = path if path.startswith("http") else self.api_url + path
+        for attempt in range(1, self.retry_policy.attempts + 1):
+            retry_after = None
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                error = FirecrawlError(f"Firecrawl request failed: {type(e).__name__}: {e}", retry=True)
+            else:
+                if response.status_code < 400:
+                    body = response.json()
+                    if body.get("success") is False:
+                        raise FirecrawlError(f"Firecrawl error: {body.get('error')}", response.status_code)
+                    return body
+                error = FirecrawlError(
+                    f"Firecrawl returned HTTP {response.status_code}: {_error_message(response)}",
+                    response.status_code,
+                    retry=response.status_code in RETRY_STATUSES
+                )
+                if response.status_code == 429:
+                    metrics.increment("firecrawl.rate_limited")
+                    retry_after = _retry_after(response)
+
+            if not error.retry or attempt == self.retry_policy.attempts:
+                raise error
+            delay = self.retry_policy.delay(attempt)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, FIRECRAWL_MAX_RETRY_AFTER_SECONDS))
+            metrics.increment("firecrawl.retries")
+            print(f"{error}; retrying {method} {path} in {delay:.2f}s (attempt {attempt + 1}/{self.retry_policy.attempts})")
+            self._sleep(delay)
@@ -0,0 +1,376 @@
+"""
+Crawl frontier shared by several crawler processes on one machine.
+
+The frontier is a SQLite database in WAL mode plus a memory-mapped Bloom
+filter file next to it:
+
+    frontier     URLs waiting to be fetched, ordered by priority (crawl depth
+                 by default, so the crawl is breadth-first), with the lease of
+                 the worker currently fetching them
+    hosts        per-host politeness state: when the next fetch may start
+    meta         crawl-wide counters
+    <path>.bloom Bloom filter of every URL ever added, so fetched URLs can be
+                 dropped from the database while still being deduplicated
+
+Politeness holds across all workers: at most `host_concurrency` URLs of a
+host are leased at a time, and fetches of a host start at least `delay`
+seconds apart. Leases expire, so the URLs of a crashed worker are fetched by
+the others, and reopening the same files resumes an interrupted crawl.
+
+Bloom filter bits are only modified inside a database write transaction,
+which serializes updates from different processes.
+"""
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urldefrag, urlsplit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    host TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    priority REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT
+);
+CREATE INDEX IF NOT EXISTS frontier_next ON frontier (host, priority, id);
+CREATE INDEX IF NOT EXISTS frontier_leases ON frontier (host, lease_until);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    next_fetch_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('fetched', 0), ('failed', 0);
+"""
+
+
+def normalize_url(url: str) -> str:
+    """Drop the fragment, which never changes the fetched page."""
+    return urldefrag(url.strip())[0]
+
+
+class BloomFilter:
+    """
+    Memory-mapped Bloom filter persisted in a file.
+
+    The file starts with a 32-byte header (magic, bit count, hash count,
+    item count) followed by the bit array. Opening an existing file keeps its
+    parameters, whatever capacity and error rate are requested.
+    """
+
+    MAGIC = b"KBBLOOM1"
+    HEADER = struct.Struct("<8sQI4xQ")
+
+    def __init__(self, path: str, capacity: int = 1_000_000, error_rate: float = 0.001):
+        """
+        Open or create the filter.
+
+        Args:
+            path: File holding the filter
+            capacity: Expected number of items
+            error_rate: False positive rate at that capacity
+        """
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) < self.HEADER.size:
+            bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+            bits = (bits + 7) // 8 * 8
+            hashes = max(1, int(round(bits / capacity * math.log(2))))
+            with open(path, "wb") as handle:
+                handle.write(self.HEADER.pack(self.MAGIC, bits, hashes, 0))
+                handle.truncate(self.HEADER.size + bits // 8)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.bits, self.hashes, _ = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"Not a Bloom filter file: {path}")
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def __contains__(self, item: str) -> bool:
+        offset = self.HEADER.size
+        return all(self._map[offset + position // 8] >> (position % 8) & 1 for position in self._positions(item))
+
+    def add(self, item: str) -> bool:
+        """
+        Add an item.
+
+        Returns:
+            True if the item was not (probably) present before
+        """
+        offset = self.HEADER.size
+        added = False
+        for position in self._positions(item):
+            index = offset + position // 8
+            mask = 1 << (position % 8)
+            byte = self._map[index]
+            if not byte & mask:
+                self._map[index] = byte | mask
+                added = True
+        if added:
+            self.HEADER.pack_into(self._map, 0, self.MAGIC, self.bits, self.hashes, len(self) + 1)
+        return added
+
+    def __len__(self) -> int:
+        return self.HEADER.unpack_from(self._map, 0)[3]
+
+    def false_positive_rate(self) -> float:
+        """Estimated false positive rate at the current number of items."""
+        return (1 - math.exp(-self.hashes * len(self) / self.bits)) ** self.hashes
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if not self._map.closed:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+
+
+@dataclass
+class Lease:
+    """A URL reserved for one worker to fetch."""
+
+    id: int
+    url: str
+    host: str
+    depth: int
+    attempts: int
+
+
+class CrawlFrontier:
+    """Process-safe priority queue of URLs to crawl, with per-host politeness."""
+
+    def __init__(
+        self,
+        path: str,
+        host_concurrency: int = 2,
+        delay: float = 0.5,
+        lease_seconds: float = 60,
+        max_pages: int = 0,
+        max_attempts: int = 3,
+        bloom_capacity: int = 1_000_000,
+        bloom_error_rate: float = 0.001,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Open or create a frontier.
+
+        Args:
+            path: SQLite database file; the Bloom filter is stored at path + ".bloom"
+            host_concurrency: URLs of one host fetched at the same time, across all workers
+            delay: Minimum seconds between the start of two fetches of one host
+            lease_seconds: How long a worker may hold a URL before others may fetch it
+            max_pages: Stop handing out URLs after this many fetches (0 = unlimited)
+            max_attempts: Fetch attempts before a URL is dropped
+            bloom_capacity: Expected number of distinct URLs
+            bloom_error_rate: Acceptable rate of URLs wrongly skipped as seen
+            clock: Wall clock, overridable for tests (leases are shared across processes)
+        """
+        self.path = path
+        self.host_concurrency = host_concurrency
+        self.delay = delay
+        self.lease_seconds = lease_seconds
+        self.max_pages = max_pages
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        with conn:
+            # Workers starting together must not both create the filter file.
+            conn.execute("BEGIN IMMEDIATE")
+            self.seen = BloomFilter(path + ".bloom", bloom_capacity, bloom_error_rate)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        self.seen.close()
+
+    def _counter(self, conn: sqlite3.Connection, key: str) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def add(self, urls: Iterable[str], depth: int = 0, priority: Optional[float] = None) -> int:
+        """
+        Queue URLs that have not been seen before.
+
+        Args:
+            urls: Absolute http(s) URLs
+            depth: Link distance from the seed
+            priority: Lower is fetched first, defaults to the depth
+
+        Returns:
+            Number of URLs queued
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return self._add(conn, urls, depth, priority)
+
+    def _add(self, conn: sqlite3.Connection, urls: Iterable[str], depth: int, priority: Optional[float]) -> int:
+        priority = depth if priority is None else priority
+        added = 0
+        for url in sorted({normalize_url(url) for url in urls}):
+            if url in self.seen:
+                continue
+            host = urlsplit(url).netloc.lower()
+            conn.execute("INSERT OR IGNORE INTO hosts (host) VALUES (?)", (host,))
+            conn.execute(
+                "INSERT OR IGNORE INTO frontier (url, host, depth, priority) VALUES (?, ?, ?, ?)",
+                (url, host, depth, priority)
+            )
+            self.seen.add(url)
+            added += 1
+        return added
+
+    def pop(self, owner: str) -> Optional[Lease]:
+        """
+        Lease the best URL of a host that may be fetched now.
+
+        Hosts are served in order of their earliest allowed fetch time, so
+        workers spread over all hosts instead of queueing behind one.
+
+        Args:
+            owner: Worker identifier recorded with the lease
+
+        Returns:
+            Leased URL, or None if no URL may be fetched right now
+        """
+        conn = self._conn()
+        now = self._clock()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if self.max_pages:
+                leased = conn.execute("SELECT COUNT(*) FROM frontier WHERE lease_until > ?", (now,)).fetchone()[0]
+                if self._counter(conn, "fetched") + leased >= self.max_pages:
+                    return None
+            row = conn.execute(
+                "SELECT h.host FROM hosts h "
+                "WHERE h.next_fetch_at <= ? "
+                "AND EXISTS (SELECT 1 FROM frontier f WHERE f.host = h.host AND f.lease_until <= ?) "
+                "AND (SELECT COUNT(*) FROM frontier f WHERE f.host = h.host AND f.lease_until > ?) < ? "
+                "ORDER BY h.next_fetch_at LIMIT 1",
+                (now, now, now, self.host_concurrency)
+            ).fetchone()
+            if row is None:
+                return None
+            host = row[0]
+            url_id, url, depth, attempts = conn.execute(
+                "SELECT id, url, depth, attempts FROM frontier WHERE host = ? AND lease_until <= ? "
+                "ORDER BY priority, id LIMIT 1",
+                (host, now)
+            ).fetchone()
+            conn.execute(
+                "UPDATE frontier SET lease_until = ?, lease_owner = ? WHERE id = ?",
+                (now + self.lease_seconds, owner, url_id)
+            )
+            conn.execute("UPDATE hosts SET next_fetch_at = ? WHERE host = ?", (now + self.delay, host))
+        return Lease(url_id, url, host, depth, attempts)
+
+    def complete(self, lease: Lease, links: Iterable[str] = (), link_priority: Optional[float] = None) -> int:
+        """
+        Record a fetched URL and queue the new links found on it.
+
+        Args:
+            lease: Lease returned by pop
+            links: Links to queue one level deeper
+            link_priority: Priority of the links, defaults to their depth
+
+        Returns:
+            Number of links queued
+        """
+        conn = self._conn()
+        with conn:
+            # One transaction, so other workers never see the crawl as finished
+            # between removing this URL and queueing its links.
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM frontier WHERE id = ?", (lease.id,))
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'fetched'")
+            return self._add(conn, links, lease.depth + 1, link_priority)
+
+    def fail(self, lease: Lease, retry: bool = True):
+        """
+        Release a URL whose fetch failed, dropping it after max_attempts tries.
+
+        Args:
+            lease: Lease returned by pop
+            retry: Whether the failure is worth retrying at all
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if retry and lease.attempts + 1 < self.max_attempts:
+                conn.execute(
+                    "UPDATE frontier SET attempts = attempts + 1, lease_until = 0, lease_owner = NULL, "
+                    "priority = priority + 1 WHERE id = ?",
+                    (lease.id,)
+                )
+            else:
+                conn.execute("DELETE FROM frontier WHERE id = ?", (lease.id,))
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'failed'")
+
+    def wait_time(self) -> Optional[float]:
+        """
+        How long a worker that got no lease should wait before trying again.
+
+        Returns:
+            Seconds to wait, or None when the crawl is finished: nothing is
+            queued, or the page limit has been reached
+        """
+        conn = self._conn()
+        now = self._clock()
+        if self.max_pages and self._counter(conn, "fetched") >= self.max_pages:
+            return None
+        row = conn.execute(
+            "SELECT MIN(MAX(h.next_fetch_at, f.lease_until)) FROM frontier f JOIN hosts h ON h.host = f.host"
+        ).fetchone()
+        if row[0] is None:
+            return None
+        # Leased URLs may add links when they complete, so poll at least this often.
+        return min(max(row[0] - now, 0.01), max(self.delay, 0.05))
+
+    def stats(self) -> Dict[str, float]:
+        """Get queue sizes and counters of the crawl."""
+        conn = self._conn()
+        now = self._clock()
+        queued, leased, hosts = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(lease_until > ?), 0), COUNT(DISTINCT host) FROM frontier", (now,)
+        ).fetchone()
+        return {
+            "queued": queued,
+            "leased": leased,
+            "hosts": hosts,
+            "fetched": self._counter(conn, "fetched"),
+            "failed": self._counter(conn, "failed"),
+            "seen": len(self.seen),
+            "seen_false_positive_rate": self.seen.false_positive_rate()
+        }
@@ -1,3 +1,22 @@
-class OwnScraperProvider:
+from app.scraper.base import ScraperProvider
+from app.scraper.crawler import FrontierCrawler
+
+
+class OwnScraperProvider(ScraperProvider):
+    """
+    Scraper that crawls sites itself, with worker processes sharing a crawl frontier.
+
+    Pages are returned as raw HTML in 'text'; JavaScript is not executed.
+    Crawls given a run_id can be resumed, see FrontierCrawler.crawl.
+    """
+
+    resumable = True
+
+    def __init__(self, crawler: FrontierCrawler = None):
+        self.crawler = crawler or FrontierCrawler()
+
+    def scrape_iter(self, url, depth=1, parse_js=False, run_id=None):
+        yield from self.crawler.crawl(url, depth, run_id=run_id)
+
     def scrape(self, url, depth=1, parse_js=False):
-        return [{"url": url, "text": "Stub: own scraper coming soon"}]
+        return list(self.scrape_iter(url, depth, parse_js))
@@ -1,7 +1,18 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Set, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+from urllib.parse import urlsplit
+import copy
+import datetime
+import math
+import re
+import threading
+import time
 import uuid
 
+import numpy as np
+
 from qdrant_client import QdrantClient
+from qdrant_client.local.qdrant_local import QdrantLocal
 from qdrant_client.http.models import (
     Distance,
     VectorParams,
@@ -9,17 +20,282 @@ from qdrant_client.http.models import (
     Filter,
     FieldCondition,
     MatchValue,
-    SearchRequest
+    MatchAny,
+    MatchText,
+    Range,
+    SearchRequest,
+    IntegerIndexParams,
+    IntegerIndexType,
+    TextIndexParams,
+    TextIndexType,
+    TokenizerType,
+    KeywordIndexParams,
+    KeywordIndexType,
+    ShardingMethod,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    SearchParams,
+    FilterSelector,
+    HasIdCondition,
+    IsEmptyCondition,
+    PayloadField
 )
 
+from app.metrics import metrics
+from app.processing.batch import ChunkBatch, as_embedding_matrix
 from app.config import (
     QDRANT_URL,
     QDRANT_PORT,
     QDRANT_COLLECTION_NAME,
     QDRANT_API_KEY,
-    EMBEDDING_PROVIDER
+    EMBEDDING_PROVIDER,
+    QDRANT_TENANT_SHARDING,
+    QDRANT_TIMEOUT_SECONDS,
+    QDRANT_UPLOAD_BATCH_BYTES,
+    QDRANT_UPLOAD_PARALLEL,
+    QDRANT_UPLOAD_WAIT,
+    DEDICATED_TENANT_REFRESH_SECONDS
 )
 
+TENANT_FIELD = "tenant_id"
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+DEDICATED_COLLECTION_SEPARATOR = "__tenant_"
+# Generation n of the collection behind alias A is the physical collection 'A__v<n>'.
+GENERATION_SEPARATOR = "__v"
+# Reindex state is kept in a one-point collection '<alias>__reindex', readable by every worker.
+REINDEX_STATE_SUFFIX = "__reindex"
+MAX_PATH_PREFIX_DEPTH = 8
+# Upload batches are also capped by point count, for collections of tiny points.
+UPLOAD_MAX_POINTS = 2048
+# Estimated request bytes per vector component (a float as JSON text) and per point besides vector and text.
+UPLOAD_BYTES_PER_FLOAT = 12
+UPLOAD_POINT_OVERHEAD_BYTES = 256
+# Point IDs are uuid5s and never nil, so deleting the nil UUID changes nothing.
+BARRIER_POINT_ID = "00000000-0000-0000-0000-000000000000"
+# Search beam of degraded searches, which also skip segments not yet indexed.
+DEGRADED_HNSW_EF = 32
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """
+    Check that a tenant ID is safe to use in payloads, shard keys and collection names.
+    
+    Raises:
+        ValueError: If the tenant ID has invalid characters or length
+    """
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"Invalid tenant ID: '{tenant_id}'. Use 1-64 letters, digits, '-' or '_'")
+    return tenant_id
+
+
+def url_filter_fields(url: str) -> Dict[str, Any]:
+    """
+    Derive the indexed domain and path-prefix payload fields of a URL.
+    
+    'https://Docs.example.com/api/v2/auth' gives domain 'docs.example.com' and
+    path prefixes ['/', '/api', '/api/v2', '/api/v2/auth'], so a prefix filter
+    is a single keyword match.
+    """
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split("/") if segment][:MAX_PATH_PREFIX_DEPTH]
+    prefixes = ["/"] + ["/" + "/".join(segments[:i]) for i in range(1, len(segments) + 1)]
+    return {
+        "domain": (parts.hostname or "").lower(),
+        "path_prefixes": prefixes
+    }
+
+
+def normalize_path_prefix(prefix: str) -> str:
+    """Normalize a path prefix to the form stored in 'path_prefixes'."""
+    segments = [segment for segment in prefix.split("/") if segment][:MAX_PATH_PREFIX_DEPTH]
+    return "/" + "/".join(segments)
+
+
+def timestamp_epoch(timestamp: str) -> Optional[int]:
+    """Convert an ISO-8601 ingestion timestamp to integer epoch seconds."""
+    if not timestamp:
+        return None
+    try:
+        return int(datetime.datetime.fromisoformat(timestamp).timestamp())
+    except ValueError:
+        return None
+
+
+def build_filter_conditions(
+    domain: Optional[Union[str, List[str]]] = None,
+    path_prefix: Optional[str] = None,
+    source: Optional[Union[str, List[str]]] = None,
+    crawled_after: Optional[int] = None,
+    crawled_before: Optional[int] = None,
+    title: Optional[str] = None
+) -> List[FieldCondition]:
+    """
+    Translate structured search filters into Qdrant conditions on indexed fields.
+    
+    Args:
+        domain: Host name, or list of host names, the page must belong to
+        path_prefix: URL path the page must be under, e.g. '/docs'
+        source: Source, or list of sources, of the page
+        crawled_after: Minimum ingestion time, in epoch seconds (inclusive)
+        crawled_before: Maximum ingestion time, in epoch seconds (exclusive)
+        title: Words that must appear in the chunk's title
+        
+    Returns:
+        List of conditions that must all match
+    """
+    def match(values: Union[str, List[str]], normalize=lambda value: value):
+        if isinstance(values, str):
+            return MatchValue(value=normalize(values))
+        return MatchAny(any=[normalize(value) for value in values])
+    
+    conditions = []
+    if domain:
+        conditions.append(FieldCondition(key="domain", match=match(domain, str.lower)))
+    if path_prefix:
+        conditions.append(FieldCondition(key="path_prefixes", match=MatchValue(value=normalize_path_prefix(path_prefix))))
+    if source:
+        conditions.append(FieldCondition(key="source", match=match(source)))
+    if crawled_after is not None or crawled_before is not None:
+        conditions.append(FieldCondition(key="timestamp_epoch", range=Range(gte=crawled_after, lt=crawled_before)))
+    if title:
+        conditions.append(FieldCondition(key="title", match=MatchText(text=title)))
+    return conditions
+
+
+def _join_overlapping(left: str, right: str, max_overlap: int = 4000, min_overlap: int = 32) -> str:
+    """Join consecutive chunk texts, dropping text repeated by chunk overlap."""
+    tail = left[-max_overlap:]
+    probe = right[:min_overlap]
+    if len(probe) == min_overlap:
+        position = tail.find(probe)
+        while position != -1:
+            if right.startswith(tail[position:]):
+                return left + right[len(tail) - position:]
+            position = tail.find(probe, position + 1)
+    return left + "\n\n" + right
+
+
+def build_context_windows(
+    texts: Dict[int, str],
+    scores: Dict[int, float],
+    stitch: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Build context windows from the chunks of one page.
+    
+    Args:
+        texts: Chunk text by chunk index, for hits and any fetched neighbours
+        scores: Score by chunk index, for hits only
+        stitch: Merge runs of consecutive chunk indices into one window
+        
+    Returns:
+        Windows in page order, with start/end chunk index, text and best hit score
+    """
+    windows = []
+    for index in sorted(texts):
+        window = windows[-1] if windows else None
+        if stitch and window is not None and window["end_chunk"] == index - 1:
+            window["end_chunk"] = index
+            window["text"] = _join_overlapping(window["text"], texts[index])
+            if index in scores:
+                window["score"] = max(window["score"] or scores[index], scores[index])
+        else:
+            windows.append({
+                "start_chunk": index,
+                "end_chunk": index,
+                "text": texts[index],
+                "score": scores.get(index)
+            })
+    return windows
+
+
+def _point_size(point: PointStruct) -> int:
+    """Rough size of a point in an upsert request, in bytes."""
+    payload = point.payload or {}
+    return (
+        len(point.vector) * UPLOAD_BYTES_PER_FLOAT
+        + len(payload.get("text", ""))
+        + UPLOAD_POINT_OVERHEAD_BYTES
+    )
+
+
+def upload_batches(points: Iterable[PointStruct], max_bytes: int, max_points: int = UPLOAD_MAX_POINTS) -> Iterator[List[PointStruct]]:
+    """
+    Group a stream of points into batches of at most `max_bytes` (estimated) each.
+    
+    A point larger than `max_bytes` gets a batch of its own.
+    
+    Args:
+        points: Points, consumed lazily
+        max_bytes: Target request size
+        max_points: Maximum points per batch
+        
+    Yields:
+        Lists of points
+    """
+    batch: List[PointStruct] = []
+    size = 0
+    for point in points:
+        point_size = _point_size(point)
+        if batch and (size + point_size > max_bytes or len(batch) >= max_points):
+            yield batch
+            batch, size = [], 0
+        batch.append(point)
+        size += point_size
+    if batch:
+        yield batch
+
+
+def wait_for_updates(client: QdrantClient, collection_name: str, **route):
+    """
+    Wait until every update acknowledged so far for a collection has been applied.
+    
+    Sends a no-op delete by filter with wait=True: filter operations reach every
+    shard, and each shard applies its updates in order, so when it returns all
+    earlier upserts sent with wait=False are searchable.
+    
+    Args:
+        client: Qdrant client
+        collection_name: Collection the updates were sent to
+        **route: Optional 'shard_key_selector', as from QdrantStorage._route
+    """
+    client.delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(filter=Filter(must=[HasIdCondition(has_id=[BARRIER_POINT_ID])])),
+        wait=True,
+        **route
+    )
+
+
+def point_id_for(url: str, chunk_index: int, tenant_id: Optional[str] = None) -> str:
+    """Deterministic point ID for a chunk, so re-ingesting a page overwrites its points."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{tenant_id or ''}|{url}#{chunk_index}"))
+
+
+class SerializedClient:
+    """
+    Proxy that runs the calls of a local in-process Qdrant client one at a time.
+    
+    The local (':memory:') client keeps its points in plain NumPy arrays and is
+    not safe to use from the API's worker threads concurrently.
+    """
+    
+    def __init__(self, client: QdrantClient):
+        self._client = client
+        self._lock = threading.RLock()
+    
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+        
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
 
 class QdrantStorage:
     """Qdrant vector database storage for embeddings."""
@@ -30,33 +306,52 @@ class QdrantStorage:
         port: int = QDRANT_PORT,
         collection_name: str = QDRANT_COLLECTION_NAME,
         api_key: Optional[str] = QDRANT_API_KEY,
-        vector_size: int = 768  # Gemini, у openai вроде другое
+        vector_size: int = 768,  # Gemini, у openai вроде другое
+        client: Optional[QdrantClient] = None,
+        tenant_sharding: bool = QDRANT_TENANT_SHARDING
     ):
         """
         Initialize Qdrant storage.
         
         Args:
-            url: Qdrant server URL
+            url: Qdrant server URL, or ':memory:' for an in-process local instance
             port: Qdrant server port
-            collection_name: Name of the collection to use
+            collection_name: Name of the collection to use. If it is an alias, the
+                collection it points to is used, and reindexing swaps the alias.
             api_key: Qdrant API key (if using cloud)
             vector_size: Size of embedding vectors
+            client: Existing QdrantClient to use instead of connecting to url
+            tenant_sharding: Route each tenant to its own shard key (requires a Qdrant cluster)
         """
         self.url = url
         self.port = port
+        self.alias = collection_name
         self.collection_name = collection_name
         self.api_key = api_key
         self.vector_size = vector_size
+        self.tenant_sharding = tenant_sharding
+        self._shard_keys: Set[str] = set()
+        self._dedicated_tenants: Set[str] = set()
+        self._dedicated_refreshed_at = 0.0
+        self._upload_pool: Optional[ThreadPoolExecutor] = None
+        self._upload_lock = threading.Lock()
         
-        client_kwargs = {
-            "url": url, 
-            "port": port if url == "localhost" else None
-        }
-        
-        if api_key:
-            client_kwargs["api_key"] = api_key
+        if client is not None:
+            self.client = client
+        elif url == ":memory:":
+            self.client = SerializedClient(QdrantClient(location=":memory:"))
+        else:
+            client_kwargs = {
+                "url": url, 
+                "port": port if url == "localhost" else None,
+                "timeout": QDRANT_TIMEOUT_SECONDS
+            }
             
-        self.client = QdrantClient(**client_kwargs)
+            if api_key:
+                client_kwargs["api_key"] = api_key
+                
+            self.client = QdrantClient(**client_kwargs)
+        self.collection_name = self.alias_target() or collection_name
         self._create_collection_if_not_exists()
     
     def _create_collection_if_not_exists(self):
@@ -64,69 +359,629 @@ class QdrantStorage:
         collections = self.client.get_collections().collections
         collection_names = [collection.name for collection in collections]
         
-        if self.collection_name not in collection_names:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE)
-            )
-            
+        if self.collection_name == self.alias and self.alias not in collection_names:
+            # New deployments start behind the alias, so that every reindex swaps it atomically.
+            self.collection_name = self.generation_name(0)
+            if self.collection_name not in collection_names:
+                self._create_collection(self.collection_name, sharded=self.tenant_sharding)
+            self._create_alias(self.collection_name)
+        elif self.collection_name not in collection_names:
+            self._create_collection(self.collection_name, sharded=self.tenant_sharding)
+        else:
+            self._create_payload_indexes(self.collection_name)
+            if self.collection_name == self.alias:
+                print(
+                    f"Collection {self.alias} predates collection aliases; migrate it with "
+                    f"POST /api/admin/reindex/migrate before reindexing"
+                )
+        
+        self._load_dedicated_tenants(collection_names)
+        # Collections created by older versions get indexes added since.
+        for tenant_id in self._dedicated_tenants:
+            self._create_payload_indexes(self.dedicated_collection_name(tenant_id))
+    
+    def _create_collection(self, collection_name: str, sharded: bool = False):
+        """Create a collection with the vector config and payload indexes used for chunks."""
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+            sharding_method=ShardingMethod.CUSTOM if sharded else None
+        )
+        self._create_payload_indexes(collection_name)
+    
+    def _create_payload_indexes(self, collection_name: str):
+        """Create the payload indexes used by filtered searches (a no-op for existing indexes)."""
+        for field_name in ("url", "domain", "path_prefixes", "source"):
             self.client.create_payload_index(
-                collection_name=self.collection_name,
-                field_name="url",
+                collection_name=collection_name,
+                field_name=field_name,
                 field_schema="keyword"
             )
+        
+        # Range-only integer index: time filters are ranges, never exact lookups.
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="timestamp_epoch",
+            field_schema=IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=False, range=True)
+        )
+        # Chunk indices are looked up (first chunks of pages, neighbouring chunks)
+        # and ranged over (chunks left over after a page got shorter).
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="chunk_index",
+            field_schema=IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=True)
+        )
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="title",
+            field_schema=TextIndexParams(
+                type=TextIndexType.TEXT,
+                tokenizer=TokenizerType.WORD,
+                lowercase=True,
+                min_token_len=2
+            )
+        )
+        
+        # is_tenant co-locates each tenant's points on disk, making tenant-filtered
+        # searches scale with the tenant's size instead of the collection's.
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name=TENANT_FIELD,
+            field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+        )
+    
+    def alias_target(self) -> Optional[str]:
+        """Physical collection the alias points to, or None if the name is not an alias."""
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.alias:
+                return alias.collection_name
+        return None
     
-    def store_embeddings(self, chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> List[str]:
+    def generation_name(self, generation: int) -> str:
+        """Name of the physical collection holding a generation of the alias."""
+        return f"{self.alias}{GENERATION_SEPARATOR}{generation}"
+    
+    def generations(self) -> List[int]:
+        """Numbers of the generations of the alias that exist, in ascending order."""
+        pattern = re.compile(re.escape(self.alias + GENERATION_SEPARATOR) + r"(\d+)$")
+        numbers = []
+        for collection in self.client.get_collections().collections:
+            match = pattern.match(collection.name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+    
+    def for_collection(self, collection_name: str, vector_size: Optional[int] = None) -> "QdrantStorage":
         """
-        Store text chunks with their embeddings in Qdrant.
+        Get a storage using another physical collection, sharing this one's client and alias.
+        
+        The collection is not created; see create_generation.
+        """
+        view = copy.copy(self)
+        view.collection_name = collection_name
+        view.vector_size = vector_size or self.vector_size
+        view._shard_keys = set()
+        view._load_dedicated_tenants([c.name for c in self.client.get_collections().collections])
+        return view
+    
+    def create_generation(self, generation: int, vector_size: int) -> "QdrantStorage":
+        """
+        Create the collections of a new generation of the alias.
+        
+        Tenants with a dedicated collection in the current generation get one
+        in the new generation too.
         
         Args:
-            chunks: List of chunk dictionaries with text and metadata
-            embeddings: List of embedding vectors corresponding to chunks
+            generation: Generation number
+            vector_size: Vector size of the new embedding model
             
         Returns:
-            List of point IDs stored in Qdrant
+            Storage using the new generation
         """
-        if len(chunks) != len(embeddings):
-            raise ValueError("Number of chunks and embeddings must match")
-            
-        points = []
-        point_ids = []
+        self._load_dedicated_tenants([c.name for c in self.client.get_collections().collections])
+        target = self.for_collection(self.generation_name(generation), vector_size)
+        target._create_collection(target.collection_name, sharded=self.tenant_sharding)
+        for tenant_id in self._dedicated_tenants:
+            target._create_collection(target.dedicated_collection_name(tenant_id))
+        target._dedicated_tenants = set(self._dedicated_tenants)
+        return target
+    
+    def drop_generation(self, collection_name: str):
+        """Delete a physical collection and the dedicated tenant collections derived from it."""
+        prefix = f"{collection_name}{DEDICATED_COLLECTION_SEPARATOR}"
+        for collection in self.client.get_collections().collections:
+            if collection.name.startswith(prefix):
+                self.client.delete_collection(collection.name)
+        if self.client.collection_exists(collection_name) and self.alias_target() != collection_name:
+            self.client.delete_collection(collection_name)
+    
+    def drop_all(self):
+        """Delete the alias and everything behind it: all generations, dedicated tenant collections and the reindex state."""
+        if self.alias_target() is not None:
+            self.client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias))
+            ])
+        prefix = f"{self.alias}__"
+        for collection in self.client.get_collections().collections:
+            if collection.name == self.alias or collection.name.startswith(prefix):
+                self.client.delete_collection(collection.name)
+    
+    def _create_alias(self, collection_name: str):
+        self.client.update_collection_aliases(change_aliases_operations=[
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=self.alias))
+        ])
+    
+    def swap_alias(self, collection_name: str):
+        """
+        Point the alias at another physical collection, in a single atomic Qdrant request.
+        
+        Raises:
+            ValueError: If the alias' name is still a collection of its own (see migrate_to_alias)
+        """
+        if self.alias_target() is None:
+            raise ValueError(f"Collection {self.alias} is not behind an alias yet; migrate it first")
+        self.client.update_collection_aliases(change_aliases_operations=[
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias)),
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=self.alias))
+        ])
+    
+    def migrate_to_alias(self, batch_size: int = 256) -> Dict[str, Any]:
+        """
+        Move a collection created before aliases were used behind an alias.
         
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            point_id = i + 1  
-            point_ids.append(str(point_id))  
+        The points, and those of the dedicated tenant collections, are copied
+        into generation 0. The old collections are then deleted and the alias
+        created in their place, so the name does not resolve for a moment.
+        This is a one-time step: run it with ingestion paused, and restart the
+        other workers afterwards so they pick up the new layout.
+        
+        Args:
+            batch_size: Number of points copied per request
             
-            points.append(
-                PointStruct(
-                    id=point_id,
-                    vector=embedding,
-                    payload={
-                        "text": chunk["text"],
-                        "url": chunk.get("url", ""),
-                        "chunk_index": chunk.get("chunk_index", i),
-                        "source": chunk.get("source", "web"),
-                        "title": chunk.get("title", ""),
-                        "timestamp": chunk.get("timestamp", "")
-                    }
+        Returns:
+            The new physical collection and the number of points copied
+            
+        Raises:
+            ValueError: If the collection is already behind an alias
+        """
+        if self.alias_target() is not None or not self.client.collection_exists(self.alias):
+            raise ValueError(f"Collection {self.alias} is already behind an alias")
+        
+        legacy = self.for_collection(self.alias)
+        vector_size = self.client.get_collection(self.alias).config.params.vectors.size
+        generation = max(self.generations() + [-1]) + 1
+        for name in (legacy.generation_name(generation), *(
+            legacy.generation_name(generation) + DEDICATED_COLLECTION_SEPARATOR + tenant_id
+            for tenant_id in legacy._dedicated_tenants
+        )):
+            if self.client.collection_exists(name):
+                self.client.delete_collection(name)
+        target = legacy.create_generation(generation, vector_size)
+        
+        copied = self._copy_points(self.alias, target, target.collection_name, sharded=self.tenant_sharding, batch_size=batch_size)
+        for tenant_id in legacy._dedicated_tenants:
+            copied += self._copy_points(
+                legacy.dedicated_collection_name(tenant_id), target,
+                target.dedicated_collection_name(tenant_id), sharded=False, batch_size=batch_size
+            )
+        
+        for tenant_id in legacy._dedicated_tenants:
+            self.client.delete_collection(legacy.dedicated_collection_name(tenant_id))
+        self.client.delete_collection(self.alias)
+        self._create_alias(target.collection_name)
+        
+        self.collection_name = target.collection_name
+        self.vector_size = vector_size
+        self._dedicated_tenants = set(target._dedicated_tenants)
+        self._shard_keys = set()
+        print(f"Migrated {copied} points from {self.alias} into {target.collection_name} behind the alias {self.alias}")
+        return {"collection": target.collection_name, "points": copied}
+    
+    def _copy_points(self, source: str, target: "QdrantStorage", collection_name: str, sharded: bool, batch_size: int) -> int:
+        """Copy every point of a collection into another, routing by tenant when the target is sharded."""
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+            by_route: Dict[Optional[str], List[PointStruct]] = {}
+            for point in points:
+                tenant_id = (point.payload or {}).get(TENANT_FIELD) if sharded else None
+                by_route.setdefault(tenant_id, []).append(
+                    PointStruct(id=point.id, vector=point.vector, payload=point.payload)
                 )
+            for tenant_id, batch in by_route.items():
+                route = {"collection_name": collection_name}
+                if tenant_id is not None:
+                    target._ensure_shard_key(tenant_id)
+                    route["shard_key_selector"] = tenant_id
+                copied += target.upload_points(iter(batch), wait=True, **route)
+            if offset is None:
+                return copied
+    
+    def _reindex_state_id(self) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"reindex|{self.alias}"))
+    
+    def reindex_state(self) -> Optional[Dict[str, Any]]:
+        """Read the state of the last reindex of the alias, or None if it was never reindexed."""
+        name = f"{self.alias}{REINDEX_STATE_SUFFIX}"
+        if not self.client.collection_exists(name):
+            return None
+        for point in self.client.retrieve(collection_name=name, ids=[self._reindex_state_id()], with_payload=True):
+            return point.payload
+        return None
+    
+    def save_reindex_state(self, state: Dict[str, Any]):
+        """Replace the reindex state of the alias."""
+        name = f"{self.alias}{REINDEX_STATE_SUFFIX}"
+        if not self.client.collection_exists(name):
+            self.client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(size=1, distance=Distance.DOT)
+            )
+        self.client.upsert(
+            collection_name=name,
+            points=[PointStruct(id=self._reindex_state_id(), vector=[1.0], payload=state)],
+            wait=True
+        )
+    
+    def page_collections(self) -> List[str]:
+        """The collection and the dedicated tenant collections this storage writes to."""
+        self._load_dedicated_tenants([c.name for c in self.client.get_collections().collections])
+        return [self.collection_name] + [self.dedicated_collection_name(t) for t in sorted(self._dedicated_tenants)]
+    
+    def _first_chunk_filter(self) -> Filter:
+        return Filter(must=[FieldCondition(key="chunk_index", match=MatchValue(value=0))])
+    
+    def count_pages(self, collection_name: str) -> int:
+        """Count the pages stored in a collection."""
+        return self.client.count(collection_name=collection_name, count_filter=self._first_chunk_filter()).count
+    
+    def iter_pages(self, collection_name: str, batch_size: int = 256):
+        """
+        Iterate over the pages stored in a collection, using their first chunk.
+        
+        Yields:
+            Dictionaries with the page's 'url', 'tenant_id' and ingestion 'timestamp'
+        """
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=self._first_chunk_filter(),
+                limit=batch_size,
+                offset=offset,
+                with_payload=["url", TENANT_FIELD, "timestamp"]
             )
+            for point in points:
+                payload = point.payload or {}
+                yield {
+                    "url": payload.get("url", ""),
+                    "tenant_id": payload.get(TENANT_FIELD),
+                    "timestamp": payload.get("timestamp", "")
+                }
+            if offset is None:
+                return
+    
+    def page_chunks(self, url: str, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Read back all chunks of a page.
+        
+        Returns:
+            Chunk payloads ordered by chunk index
+        """
+        page_filter = self._with_tenant([FieldCondition(key="url", match=MatchValue(value=url))], tenant_id)
+        route = self._route(tenant_id)
+        chunks = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                scroll_filter=page_filter,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                **route
+            )
+            chunks.extend(point.payload or {} for point in points)
+            if offset is None:
+                break
+        return sorted(chunks, key=lambda chunk: chunk.get("chunk_index", 0))
+    
+    def page_timestamps(self, pages: List[Dict[str, Any]]) -> Dict[Any, str]:
+        """
+        Look up the ingestion timestamps of pages by the ID of their first chunk.
+        
+        Args:
+            pages: Dictionaries with 'url' and 'tenant_id'
+            
+        Returns:
+            Timestamp by (tenant_id, url), for the pages that are stored
+        """
+        by_tenant: Dict[Optional[str], Dict[str, Any]] = {}
+        for page in pages:
+            key = (page["tenant_id"], page["url"])
+            by_tenant.setdefault(page["tenant_id"], {})[point_id_for(page["url"], 0, page["tenant_id"])] = key
         
-        batch_size = 100
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i+batch_size]
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=batch
+        timestamps = {}
+        for tenant_id, wanted in by_tenant.items():
+            points = self.client.retrieve(ids=list(wanted), with_payload=["timestamp"], **self._route(tenant_id))
+            for point in points:
+                timestamps[wanted[str(point.id)]] = (point.payload or {}).get("timestamp", "")
+        return timestamps
+    
+    def dedicated_collection_name(self, tenant_id: str) -> str:
+        """Name of the dedicated collection a promoted tenant is stored in."""
+        return f"{self.collection_name}{DEDICATED_COLLECTION_SEPARATOR}{tenant_id}"
+    
+    def _load_dedicated_tenants(self, collection_names: List[str]):
+        prefix = f"{self.collection_name}{DEDICATED_COLLECTION_SEPARATOR}"
+        self._dedicated_tenants = {
+            name[len(prefix):] for name in collection_names if name.startswith(prefix)
+        }
+        self._dedicated_refreshed_at = time.monotonic()
+    
+    def _is_dedicated(self, tenant_id: str, fresh: bool = False) -> bool:
+        """
+        Check whether a tenant has been promoted to its own collection.
+        
+        Reads use a periodically refreshed list of collections; writes pass
+        fresh=True so that a promotion done by another worker is never missed.
+        """
+        if fresh:
+            return self.client.collection_exists(self.dedicated_collection_name(tenant_id))
+        if time.monotonic() - self._dedicated_refreshed_at > DEDICATED_TENANT_REFRESH_SECONDS:
+            self._load_dedicated_tenants([c.name for c in self.client.get_collections().collections])
+        return tenant_id in self._dedicated_tenants
+    
+    def _route(self, tenant_id: Optional[str], fresh: bool = False) -> Dict[str, Any]:
+        """
+        Get the collection and shard key selector for a tenant.
+        
+        Returns:
+            Keyword arguments with 'collection_name' and, when sharding, 'shard_key_selector'
+        """
+        if tenant_id is None:
+            return {"collection_name": self.collection_name}
+        if self._is_dedicated(tenant_id, fresh=fresh):
+            return {"collection_name": self.dedicated_collection_name(tenant_id)}
+        if self.tenant_sharding:
+            return {"collection_name": self.collection_name, "shard_key_selector": tenant_id}
+        return {"collection_name": self.collection_name}
+    
+    def _ensure_shard_key(self, tenant_id: str):
+        if tenant_id in self._shard_keys:
+            return
+        try:
+            self.client.create_shard_key(self.collection_name, shard_key=tenant_id)
+        except Exception as e:
+            if "already exists" not in str(e):
+                raise
+        self._shard_keys.add(tenant_id)
+    
+    def _with_tenant(self, conditions: List[FieldCondition], tenant_id: Optional[str]) -> Filter:
+        # Without a tenant, only untenanted points match, never every tenant's.
+        if tenant_id is None:
+            tenant_condition = IsEmptyCondition(is_empty=PayloadField(key=TENANT_FIELD))
+        else:
+            tenant_condition = FieldCondition(key=TENANT_FIELD, match=MatchValue(value=tenant_id))
+        return Filter(must=conditions + [tenant_condition])
+    
+    def promote_tenant(self, tenant_id: str, batch_size: int = 256, cleanup_delay: Optional[float] = None) -> int:
+        """
+        Move a tenant's points from the shared collection into a dedicated collection.
+        
+        New writes for the tenant go to the dedicated collection as soon as it
+        exists; searches switch to it once the copy is finished. Every copy is
+        waited for before anything is deleted. Other workers only notice the
+        promotion at their next refresh of the collection list, so the call
+        then waits `cleanup_delay` before deleting the shared copies. If it
+        fails or the process exits before that, the shared copies are kept and
+        promoting the tenant again finishes the move.
+        
+        Args:
+            tenant_id: Tenant to promote
+            batch_size: Number of points copied per request
+            cleanup_delay: Seconds to wait before the shared copies are deleted,
+                defaults to twice DEDICATED_TENANT_REFRESH_SECONDS
+            
+        Returns:
+            Number of points moved
+        """
+        validate_tenant_id(tenant_id)
+        dedicated = self.dedicated_collection_name(tenant_id)
+        if not self.client.collection_exists(dedicated):
+            self._create_collection(dedicated)
+        
+        shared_filter = self._with_tenant([], tenant_id)
+        shared_route = self._shared_route(tenant_id)
+        
+        moved = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                scroll_filter=shared_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+                **shared_route
             )
+            if points:
+                self.client.upsert(
+                    collection_name=dedicated,
+                    points=[
+                        PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                        for point in points
+                    ],
+                    wait=True
+                )
+                moved += len(points)
+            if offset is None:
+                break
+        
+        self._dedicated_tenants.add(tenant_id)
+        cleanup_delay = 2 * DEDICATED_TENANT_REFRESH_SECONDS if cleanup_delay is None else cleanup_delay
+        if cleanup_delay > 0:
+            time.sleep(cleanup_delay)
+        self.client.delete(points_selector=shared_filter, wait=True, **shared_route)
+        return moved
+    
+    def _shared_route(self, tenant_id: str) -> Dict[str, Any]:
+        route = {"collection_name": self.collection_name}
+        if self.tenant_sharding:
+            route["shard_key_selector"] = tenant_id
+        return route
+    
+    def store_embeddings(
+        self,
+        chunks: Union[ChunkBatch, List[Dict[str, Any]]],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        tenant_id: Optional[str] = None,
+        wait: Optional[bool] = None
+    ) -> List[str]:
+        """
+        Store text chunks with their embeddings in Qdrant.
+        
+        Points are built lazily from the float32 matrix while they are
+        uploaded, so Python float lists and payloads only exist for the
+        batches in flight.
+        
+        Args:
+            chunks: ChunkBatch, or list of chunk dictionaries with text and metadata
+            embeddings: Embedding matrix (or list of vectors) corresponding to chunks
+            tenant_id: Optional tenant that owns the chunks
+            wait: Wait for each batch to be applied, defaults to QDRANT_UPLOAD_WAIT;
+                otherwise batches are only acknowledged and a final barrier waits
+                until all of them are applied
             
+        Returns:
+            List of point IDs stored in Qdrant
+        """
+        if not isinstance(chunks, ChunkBatch):
+            chunks = ChunkBatch.from_dicts(chunks)
+        vectors = as_embedding_matrix(embeddings)
+        
+        if len(chunks) != len(vectors):
+            raise ValueError("Number of chunks and embeddings must match")
+        
+        point_ids = [
+            point_id_for(chunks.get_metadata(i).get("url", ""), chunks.chunk_indices[i], tenant_id)
+            for i in range(len(chunks))
+        ]
+        
+        # Derived filter fields are computed once per document, not per chunk.
+        document_fields = []
+        for metadata in chunks.metadata:
+            fields = url_filter_fields(metadata.get("url", ""))
+            epoch = timestamp_epoch(metadata.get("timestamp", ""))
+            if epoch is not None:
+                fields["timestamp_epoch"] = epoch
+            document_fields.append(fields)
+        
+        points = (
+            PointStruct(
+                id=point_ids[i],
+                vector=vectors[i].tolist(),
+                payload={
+                    "text": chunks.texts[i],
+                    "url": chunks.get_metadata(i).get("url", ""),
+                    "chunk_index": chunks.chunk_indices[i],
+                    "source": chunks.get_metadata(i).get("source", "web"),
+                    "title": chunks.get_metadata(i).get("title", ""),
+                    "timestamp": chunks.get_metadata(i).get("timestamp", ""),
+                    **document_fields[chunks.metadata_ids[i]],
+                    **({TENANT_FIELD: tenant_id} if tenant_id is not None else {})
+                }
+            )
+            for i in range(len(chunks))
+        )
+        
+        route = self._route(tenant_id, fresh=True)
+        if "shard_key_selector" in route:
+            self._ensure_shard_key(tenant_id)
+        
+        self.upload_points(points, wait=wait, **route)
         return point_ids
     
+    def upload_points(
+        self,
+        points: Iterable[PointStruct],
+        wait: Optional[bool] = None,
+        batch_bytes: int = QDRANT_UPLOAD_BATCH_BYTES,
+        parallel: int = QDRANT_UPLOAD_PARALLEL,
+        **route
+    ) -> int:
+        """
+        Upsert a stream of points in byte-sized batches, several of them in flight at once.
+        
+        Without `wait`, batches are only acknowledged by Qdrant. Once all are,
+        wait_for_updates makes sure every batch is searchable.
+        
+        Args:
+            points: Points to upsert, consumed lazily; at most `parallel` batches are built ahead
+            wait: Wait for each batch to be applied, defaults to QDRANT_UPLOAD_WAIT
+            batch_bytes: Target size of each upsert request
+            parallel: Maximum concurrent upsert requests (1 for the in-process local client)
+            **route: 'collection_name' and optionally 'shard_key_selector', as from _route
+            
+        Returns:
+            Number of points upserted
+        """
+        wait = QDRANT_UPLOAD_WAIT if wait is None else wait
+        route = route or {"collection_name": self.collection_name}
+        
+        def upsert(batch: List[PointStruct]):
+            self.client.upsert(points=batch, wait=wait, **route)
+        
+        sent = 0
+        batches = upload_batches(points, batch_bytes)
+        if parallel <= 1 or not self._supports_parallel_upload():
+            for batch in batches:
+                upsert(batch)
+                sent += len(batch)
+        else:
+            in_flight = set()
+            try:
+                for batch in batches:
+                    if len(in_flight) >= parallel:
+                        done, in_flight = wait_futures(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    in_flight.add(self._upload_executor(parallel).submit(upsert, batch))
+                    sent += len(batch)
+            finally:
+                # Let started requests finish before returning or raising, so a
+                # retry does not overlap with them.
+                for future in wait_futures(in_flight).done:
+                    future.result()
+        
+        if sent and not wait:
+            wait_for_updates(self.client, **route)
+        metrics.increment("storage.points_uploaded", sent)
+        return sent
+    
+    def _supports_parallel_upload(self) -> bool:
+        # The in-process client is not thread-safe, and is serialized when we created it.
+        return not isinstance(self.client, SerializedClient) and not isinstance(getattr(self.client, "_client", None), QdrantLocal)
+    
+    def _upload_executor(self, parallel: int) -> ThreadPoolExecutor:
+        with self._upload_lock:
+            if self._upload_pool is None or self._upload_pool._max_workers < parallel:
+                if self._upload_pool is not None:
+                    self._upload_pool.shutdown(wait=False)
+                self._upload_pool = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="qdrant-upload")
+            return self._upload_pool
+    
     def search(
         self, 
         query_vector: List[float],
         limit: int = 5,
-        url_filter: Optional[str] = None
+        url_filter: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        degraded: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Search for similar vectors in Qdrant.
@@ -135,76 +990,210 @@ class QdrantStorage:
             query_vector: The query embedding vector
             limit: Maximum number of results to return
             url_filter: Optional URL to filter results by
+            tenant_id: Tenant to restrict the search to; None searches untenanted chunks only
+            filters: Optional structured filters, as keyword arguments of build_filter_conditions
+            timeout: Seconds after which Qdrant may abandon the search
+            degraded: Trade recall for speed; may return fewer results
             
         Returns:
             List of dictionaries containing search results with scores and payloads
         """
-        search_filter = None
-        if url_filter:
-            search_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="url",
-                        match=MatchValue(value=url_filter)
-                    )
-                ]
-            )
-        
         search_results = self.client.search(
-            collection_name=self.collection_name,
             query_vector=query_vector,
             limit=limit,
-            query_filter=search_filter
+            query_filter=self._search_filter(url_filter, tenant_id, filters),
+            **self._search_options(timeout, degraded),
+            **self._route(tenant_id)
         )
         
-        results = []
-        for result in search_results:
-            results.append({
-                "id": result.id,
-                "score": result.score,
-                "text": result.payload.get("text", ""),
-                "url": result.payload.get("url", ""),
-                "chunk_index": result.payload.get("chunk_index", 0),
-                "title": result.payload.get("title", ""),
-                "source": result.payload.get("source", "web")
-            })
+        return [self._result(result) for result in search_results]
+    
+    @staticmethod
+    def _search_options(timeout: Optional[float], degraded: bool) -> Dict[str, Any]:
+        options = {}
+        if timeout is not None:
+            # Qdrant takes whole seconds; the caller enforces the exact timeout.
+            options["timeout"] = max(1, math.ceil(timeout))
+        if degraded:
+            options["search_params"] = SearchParams(hnsw_ef=DEGRADED_HNSW_EF, indexed_only=True)
+        return options
+    
+    def _search_filter(
+        self,
+        url_filter: Optional[str],
+        tenant_id: Optional[str],
+        filters: Optional[Dict[str, Any]]
+    ) -> Optional[Filter]:
+        conditions = []
+        if url_filter:
+            conditions.append(
+                FieldCondition(
+                    key="url",
+                    match=MatchValue(value=url_filter)
+                )
+            )
+        if filters:
+            conditions.extend(build_filter_conditions(**filters))
+        return self._with_tenant(conditions, tenant_id)
+    
+    @staticmethod
+    def _result(point) -> Dict[str, Any]:
+        payload = point.payload or {}
+        return {
+            "id": point.id,
+            "score": getattr(point, "score", None),
+            "text": payload.get("text", ""),
+            "url": payload.get("url", ""),
+            "chunk_index": payload.get("chunk_index", 0),
+            "title": payload.get("title", ""),
+            "source": payload.get("source", "web"),
+            "timestamp": payload.get("timestamp", "")
+        }
+    
+    def search_pages(
+        self,
+        query_vector: List[float],
+        groups: int = 5,
+        group_size: int = 3,
+        url_filter: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        stitch: bool = True,
+        context_chunks: int = 0,
+        timeout: Optional[float] = None,
+        degraded: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for the best pages, grouping the matching chunks by URL in Qdrant.
+        
+        Args:
+            query_vector: The query embedding vector
+            groups: Maximum number of pages to return
+            group_size: Maximum number of matching chunks per page
+            url_filter: Optional URL to filter results by
+            tenant_id: Tenant to restrict the search to; None searches untenanted chunks only
+            filters: Optional structured filters, as keyword arguments of build_filter_conditions
+            stitch: Merge chunks with consecutive chunk indices into context windows
+            context_chunks: Neighbouring chunks to add on each side of every hit. Neighbours
+                are fetched by their deterministic IDs in one extra request.
+            timeout: Seconds after which Qdrant may abandon the search
+            degraded: Trade recall for speed; may return fewer pages
             
-        return results
+        Returns:
+            List of pages, best first, each with its matching chunks and context windows
+        """
+        route = self._route(tenant_id)
+        result = self.client.query_points_groups(
+            query=query_vector,
+            group_by="url",
+            limit=groups,
+            group_size=group_size,
+            query_filter=self._search_filter(url_filter, tenant_id, filters),
+            with_payload=True,
+            **self._search_options(timeout, degraded),
+            **route
+        )
+        
+        pages = []
+        for group in result.groups:
+            hits = [self._result(point) for point in group.hits]
+            pages.append({
+                "url": str(group.id),
+                "score": max(hit["score"] for hit in hits),
+                "title": hits[0]["title"],
+                "chunks": hits,
+                "windows": []
+            })
+        
+        neighbours = self._fetch_neighbours(pages, context_chunks, tenant_id, route, timeout) if context_chunks > 0 else {}
+        for page in pages:
+            texts = {hit["chunk_index"]: hit["text"] for hit in page["chunks"]}
+            scores = {hit["chunk_index"]: hit["score"] for hit in page["chunks"]}
+            for index in list(scores):
+                for neighbour in range(index - context_chunks, index + context_chunks + 1):
+                    if neighbour not in texts and (page["url"], neighbour) in neighbours:
+                        texts[neighbour] = neighbours[(page["url"], neighbour)]
+            page["windows"] = build_context_windows(texts, scores, stitch)
+        return pages
+    
+    def _fetch_neighbours(
+        self,
+        pages: List[Dict[str, Any]],
+        context_chunks: int,
+        tenant_id: Optional[str],
+        route: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Dict[Any, str]:
+        """Retrieve the texts of chunks next to the hits, keyed by (url, chunk_index)."""
+        wanted = {}
+        for page in pages:
+            hit_indices = {hit["chunk_index"] for hit in page["chunks"]}
+            for index in hit_indices:
+                for neighbour in range(max(0, index - context_chunks), index + context_chunks + 1):
+                    if neighbour not in hit_indices:
+                        wanted[point_id_for(page["url"], neighbour, tenant_id)] = (page["url"], neighbour)
+        if not wanted:
+            return {}
+        points = self.client.retrieve(
+            ids=list(wanted),
+            with_payload=["text"],
+            **({"timeout": max(1, math.ceil(timeout))} if timeout is not None else {}),
+            **route
+        )
+        return {wanted[str(point.id)]: (point.payload or {}).get("text", "") for point in points}
+    
+    def delete_chunks_from(self, url: str, first_chunk: int, tenant_id: Optional[str] = None):
+        """
+        Delete a page's chunks from `first_chunk` on, left over after it got shorter.
+        
+        Args:
+            url: Page URL
+            first_chunk: Index of the first chunk to delete
+            tenant_id: Optional tenant that owns the page
+        """
+        self.client.delete(
+            points_selector=self._with_tenant(
+                [
+                    FieldCondition(key="url", match=MatchValue(value=url)),
+                    FieldCondition(key="chunk_index", range=Range(gte=first_chunk))
+                ],
+                tenant_id
+            ),
+            **self._route(tenant_id, fresh=True)
+        )
     
-    def delete_by_url(self, url: str) -> int:
+    def delete_by_url(self, url: str, tenant_id: Optional[str] = None) -> int:
         """
         Delete all vectors associated with a specific URL.
         
         Args:
             url: The URL to delete vectors for
+            tenant_id: Optional tenant whose vectors should be deleted
             
         Returns:
             Number of points deleted
         """
         try:
+            url_filter = self._with_tenant(
+                [
+                    FieldCondition(
+                        key="url",
+                        match=MatchValue(value=url)
+                    )
+                ],
+                tenant_id
+            )
+            route = self._route(tenant_id, fresh=True)
+            
             count_result = self.client.count(
-                collection_name=self.collection_name,
-                count_filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="url",
-                            match=MatchValue(value=url)
-                        )
-                    ]
-                )
+                count_filter=url_filter,
+                **route
             )
             points_to_delete = count_result.count
             
             self.client.delete(
-                collection_name=self.collection_name,
-                points_selector=Filter(
-                    must=[
-                        FieldCondition(
-                            key="url",
-                            match=MatchValue(value=url)
-                        )
-                    ]
-                )
+                points_selector=url_filter,
+                **route
             )
             return points_to_delete
         except Exception as e:
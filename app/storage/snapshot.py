@@ -0,0 +1,231 @@
+"""
+Export and import of collection snapshots without re-embedding.
+
+A snapshot is a directory containing:
+    manifest.json          collection settings, point count and payload fields
+    vectors.f32            float32 matrix of shape (count, vector_size), memory-mappable
+    ids.jsonl.gz           point IDs, one JSON value per line
+    payload/<n>.jsonl.gz   one gzip-compressed column per payload field
+
+Vectors are kept uncompressed so they can be memory-mapped on import; the
+payload columns, which are mostly text, compress well.
+"""
+import gzip
+import json
+import os
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from app.storage.qdrant_client import wait_for_updates
+
+SNAPSHOT_FORMAT = "kb-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.jsonl.gz"
+PAYLOAD_DIR = "payload"
+
+
+class _ColumnWriter:
+    """Writes payload fields column by column, padding columns that start late."""
+
+    def __init__(self, directory: str, compresslevel: int):
+        self.directory = directory
+        self.compresslevel = compresslevel
+        self.fields: List[str] = []
+        self.files: Dict[str, IO[str]] = {}
+        self.rows = 0
+
+    def _open(self, field: str) -> IO[str]:
+        handle = gzip.open(
+            os.path.join(self.directory, f"{len(self.fields)}.jsonl.gz"),
+            "wt",
+            encoding="utf-8",
+            compresslevel=self.compresslevel
+        )
+        handle.write("null\n" * self.rows)
+        self.fields.append(field)
+        self.files[field] = handle
+        return handle
+
+    def write(self, payload: Optional[Dict[str, Any]]):
+        payload = payload or {}
+        for field in payload:
+            if field not in self.files:
+                self._open(field)
+        for field, handle in self.files.items():
+            handle.write(json.dumps(payload.get(field), ensure_ascii=False))
+            handle.write("\n")
+        self.rows += 1
+
+    def close(self):
+        for handle in self.files.values():
+            handle.close()
+
+
+def export_collection(
+    client: QdrantClient,
+    collection_name: str,
+    path: str,
+    batch_size: int = 1000,
+    compresslevel: int = 6
+) -> Dict[str, Any]:
+    """
+    Stream every point of a collection into a snapshot directory.
+
+    Args:
+        client: Qdrant client
+        collection_name: Collection to export
+        path: Snapshot directory to create
+        batch_size: Points fetched per scroll request
+        compresslevel: gzip level for IDs and payload columns
+
+    Returns:
+        The snapshot manifest
+    """
+    info = client.get_collection(collection_name)
+    vectors_config = info.config.params.vectors
+    vector_size = vectors_config.size
+
+    os.makedirs(os.path.join(path, PAYLOAD_DIR), exist_ok=True)
+    columns = _ColumnWriter(os.path.join(path, PAYLOAD_DIR), compresslevel)
+    count = 0
+
+    with open(os.path.join(path, VECTORS_FILE), "wb") as vectors_file, \
+            gzip.open(os.path.join(path, IDS_FILE), "wt", encoding="utf-8", compresslevel=compresslevel) as ids_file:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                np.asarray([point.vector for point in points], dtype=np.float32).tofile(vectors_file)
+                for point in points:
+                    ids_file.write(json.dumps(point.id))
+                    ids_file.write("\n")
+                    columns.write(point.payload)
+                count += len(points)
+            if offset is None:
+                break
+    columns.close()
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "collection": collection_name,
+        "count": count,
+        "vector_size": vector_size,
+        "distance": str(vectors_config.distance.value),
+        "payload_fields": columns.fields
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """
+    Read and validate a snapshot manifest.
+
+    Raises:
+        ValueError: If the directory does not contain a supported snapshot
+    """
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot format in {path}")
+    return manifest
+
+
+def load_vectors(path: str, manifest: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Memory-map the snapshot's vector matrix."""
+    manifest = manifest or read_manifest(path)
+    if manifest["count"] == 0:
+        return np.zeros((0, manifest["vector_size"]), dtype=np.float32)
+    return np.memmap(
+        os.path.join(path, VECTORS_FILE),
+        dtype=np.float32,
+        mode="r",
+        shape=(manifest["count"], manifest["vector_size"])
+    )
+
+
+def _read_jsonl(file_path: str) -> Iterator[Any]:
+    with gzip.open(file_path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            yield json.loads(line)
+
+
+def iter_ids(path: str) -> Iterator[Any]:
+    """Stream the snapshot's point IDs."""
+    return _read_jsonl(os.path.join(path, IDS_FILE))
+
+
+def iter_payloads(path: str, manifest: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream payloads, reassembled row by row from the payload columns."""
+    manifest = manifest or read_manifest(path)
+    fields = manifest["payload_fields"]
+    columns = [
+        _read_jsonl(os.path.join(path, PAYLOAD_DIR, f"{i}.jsonl.gz"))
+        for i in range(len(fields))
+    ]
+    for _ in range(manifest["count"]):
+        row = {}
+        for field, column in zip(fields, columns):
+            value = next(column)
+            if value is not None:
+                row[field] = value
+        yield row
+
+
+def import_collection(
+    client: QdrantClient,
+    collection_name: str,
+    path: str,
+    batch_size: int = 256,
+    parallel: int = 4
+) -> int:
+    """
+    Bulk-upload a snapshot into an existing collection.
+
+    Vectors are read from the memory-mapped matrix and uploaded in parallel
+    batches without waiting for each batch to be indexed; a final barrier
+    waits until all of them are applied.
+
+    Args:
+        client: Qdrant client
+        collection_name: Target collection (must exist with a matching vector size)
+        path: Snapshot directory
+        batch_size: Points per upload request
+        parallel: Number of parallel upload workers
+
+    Returns:
+        Number of points uploaded
+    """
+    manifest = read_manifest(path)
+    info = client.get_collection(collection_name)
+    if info.config.params.vectors.size != manifest["vector_size"]:
+        raise ValueError(
+            f"Snapshot vector size {manifest['vector_size']} does not match "
+            f"collection '{collection_name}' ({info.config.params.vectors.size})"
+        )
+    if manifest["count"] == 0:
+        return 0
+
+    client.upload_collection(
+        collection_name=collection_name,
+        vectors=load_vectors(path, manifest),
+        payload=iter_payloads(path, manifest),
+        ids=iter_ids(path),
+        batch_size=batch_size,
+        parallel=parallel,
+        wait=False
+    )
+    wait_for_updates(client, collection_name)
+    return manifest["count"]
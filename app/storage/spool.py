@@ -0,0 +1,381 @@
+"""
+Durable write-ahead spool for website ingestion.
+
+Every stage of process_website persists its output before the next stage
+starts, so a failed embedding or Qdrant call only repeats that stage for the
+affected pages instead of the whole crawl. The spool is one SQLite database in
+WAL mode, shared by all workers on a node:
+
+    jobs   one row per process_website call: URL, tenant, chunking strategy
+           and the ingestion timestamp, so a later drain chunks identically
+    pages  one row per scraped page, moving through the states
+           scraped -> chunked -> embedded -> stored
+
+A page's row holds the output of its latest stage (page JSON, chunk batch
+JSON, float32 vectors); the bulky columns are cleared once the page is stored.
+Workers lease the pages they drain, so a page is only worked on by one worker
+at a time, and a crashed worker's pages become drainable again when its lease
+expires. Draining is idempotent because point IDs are derived from the URL and
+chunk index: storing a page twice overwrites the same points.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.processing.batch import ChunkBatch
+
+SCRAPED = "scraped"
+CHUNKED = "chunked"
+EMBEDDED = "embedded"
+STORED = "stored"
+
+JOB_SCRAPING = "scraping"
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    tenant_id TEXT,
+    strategy TEXT,
+    timestamp TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    page TEXT,
+    chunks TEXT,
+    vectors BLOB,
+    dimension INTEGER,
+    chunks_created INTEGER NOT NULL DEFAULT 0,
+    vectors_stored INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    UNIQUE (job_id, url)
+);
+CREATE INDEX IF NOT EXISTS pages_pending ON pages (job_id, state, next_attempt_at);
+"""
+
+
+@dataclass
+class SpoolJob:
+    """Settings a job's pages are chunked and stored with."""
+
+    id: str
+    url: str
+    tenant_id: Optional[str]
+    strategy: Optional[str]
+    timestamp: str
+
+
+@dataclass
+class SpooledPage:
+    """A leased page with the output of its latest completed stage."""
+
+    id: int
+    url: str
+    state: str
+    attempts: int
+    page: Optional[Dict[str, Any]] = None
+    batch: Optional[ChunkBatch] = None
+    vectors: Optional[np.ndarray] = None
+
+
+def _encode_batch(batch: ChunkBatch) -> str:
+    return json.dumps({
+        "texts": batch.texts,
+        "chunk_indices": batch.chunk_indices.tolist(),
+        "token_counts": batch.token_counts.tolist() if batch.token_counts is not None else None,
+        "metadata": batch.metadata,
+        "metadata_ids": batch.metadata_ids.tolist()
+    })
+
+
+def _decode_batch(data: str) -> ChunkBatch:
+    state = json.loads(data)
+    batch = ChunkBatch()
+    batch.texts = state["texts"]
+    batch.chunk_indices = array("I", state["chunk_indices"])
+    batch.token_counts = array("I", state["token_counts"]) if state["token_counts"] is not None else None
+    batch.metadata = state["metadata"]
+    batch.metadata_ids = array("I", state["metadata_ids"])
+    return batch
+
+
+class IngestionSpool:
+    """SQLite-backed spool of ingestion jobs and their pages."""
+
+    def __init__(self, path: str, lease_seconds: float = 300, clock: Callable[[], float] = time.time):
+        """
+        Initialize the spool, creating the database if needed.
+
+        Args:
+            path: SQLite database file, shared by the workers of a node
+            lease_seconds: How long a claimed page stays reserved for one worker
+            clock: Wall clock, overridable for tests (leases are shared across processes)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._clock = clock
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def create_job(self, url: str, tenant_id: Optional[str], strategy: Optional[str], timestamp: str) -> SpoolJob:
+        """Register a new job, in the scraping state."""
+        job = SpoolJob(uuid.uuid4().hex, url, tenant_id, strategy, timestamp)
+        now = self._clock()
+        self._conn().execute(
+            "INSERT INTO jobs (id, url, tenant_id, strategy, timestamp, state, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, url, tenant_id, strategy, timestamp, JOB_SCRAPING, now, now)
+        )
+        return job
+
+    def get_job(self, job_id: str) -> Optional[SpoolJob]:
+        row = self._conn().execute(
+            "SELECT id, url, tenant_id, strategy, timestamp FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return SpoolJob(*row) if row else None
+
+    def add_page(self, job_id: str, page: Dict[str, Any], default_url: str) -> int:
+        """
+        Persist a scraped page. A page scraped again under the same URL replaces the earlier copy.
+
+        Returns:
+            Page ID
+        """
+        conn = self._conn()
+        now = self._clock()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "INSERT INTO pages (job_id, url, state, page) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (job_id, url) DO UPDATE SET state = excluded.state, page = excluded.page, "
+                "chunks = NULL, vectors = NULL, dimension = NULL "
+                "RETURNING id",
+                (job_id, page.get("url", default_url), SCRAPED, json.dumps(page))
+            ).fetchone()
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+        return row[0]
+
+    def finish_scrape(self, job_id: str):
+        """Mark a job's crawl as complete, making its pages drainable."""
+        self._set_job_state(job_id, JOB_PENDING)
+
+    def fail_job(self, job_id: str, error: str):
+        """Give up on a job whose crawl failed."""
+        self._set_job_state(job_id, JOB_FAILED, error)
+
+    def _set_job_state(self, job_id: str, state: str, error: Optional[str] = None):
+        self._conn().execute(
+            "UPDATE jobs SET state = ?, updated_at = ?, last_error = COALESCE(?, last_error) WHERE id = ?",
+            (state, self._clock(), error, job_id)
+        )
+
+    def ready_jobs(self, limit: int = 10) -> List[str]:
+        """
+        Find jobs with pages that are due for another attempt and not leased.
+
+        A job still in the scraping state whose crawl has not made progress
+        for a lease period is assumed abandoned, and its scraped pages are
+        drained as well.
+        """
+        now = self._clock()
+        rows = self._conn().execute(
+            "SELECT DISTINCT jobs.id FROM jobs JOIN pages ON pages.job_id = jobs.id "
+            "WHERE (jobs.state = ? OR (jobs.state = ? AND jobs.updated_at < ?)) "
+            "AND pages.state != ? AND pages.next_attempt_at <= ? AND pages.lease_until <= ? "
+            "ORDER BY jobs.created_at LIMIT ?",
+            (JOB_PENDING, JOB_SCRAPING, now - self.lease_seconds, STORED, now, now, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job_id: str, force: bool = False) -> List[SpooledPage]:
+        """
+        Lease a job's unstored pages that are due and not leased by another worker.
+
+        Args:
+            job_id: Job to claim pages of
+            force: Also claim pages whose backoff has not yet expired
+
+        Returns:
+            Claimed pages in scrape order, with their latest stage output loaded
+        """
+        conn = self._conn()
+        now = self._clock()
+        due = float("inf") if force else now
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, url, state, attempts, page, chunks, vectors, dimension FROM pages "
+                "WHERE job_id = ? AND state != ? AND next_attempt_at <= ? AND lease_until <= ? ORDER BY id",
+                (job_id, STORED, due, now)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE pages SET lease_until = ? WHERE id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows]
+            )
+
+        pages = []
+        for page_id, url, state, attempts, page, chunks, vectors, dimension in rows:
+            spooled = SpooledPage(page_id, url, state, attempts)
+            if state == SCRAPED:
+                spooled.page = json.loads(page)
+            elif state == CHUNKED:
+                spooled.batch = _decode_batch(chunks)
+            elif state == EMBEDDED:
+                spooled.batch = _decode_batch(chunks)
+                spooled.vectors = np.frombuffer(vectors, dtype=np.float32).reshape(-1, dimension)
+            pages.append(spooled)
+        return pages
+
+    def save_chunks(self, page: SpooledPage, batch: ChunkBatch):
+        """Persist a page's chunks, dropping the raw page."""
+        self._conn().execute(
+            "UPDATE pages SET state = ?, chunks = ?, page = NULL, chunks_created = ? WHERE id = ?",
+            (CHUNKED, _encode_batch(batch), len(batch), page.id)
+        )
+        page.state, page.batch, page.page = CHUNKED, batch, None
+
+    def save_embeddings(self, page: SpooledPage, vectors: np.ndarray):
+        """Persist a page's embeddings as a float32 matrix."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._conn().execute(
+            "UPDATE pages SET state = ?, vectors = ?, dimension = ? WHERE id = ?",
+            (EMBEDDED, vectors.tobytes(), vectors.shape[1] if vectors.ndim == 2 else 0, page.id)
+        )
+        page.state, page.vectors = EMBEDDED, vectors
+
+    def discard_embeddings(self) -> int:
+        """Send embedded pages back to be embedded again, after the embedding model changed."""
+        return self._conn().execute(
+            "UPDATE pages SET state = ?, vectors = NULL, dimension = NULL WHERE state = ?",
+            (CHUNKED, EMBEDDED)
+        ).rowcount
+
+    def mark_stored(self, page: SpooledPage, vectors_stored: int):
+        """Record that a page's points are in Qdrant, releasing its lease and stage data."""
+        self._conn().execute(
+            "UPDATE pages SET state = ?, vectors_stored = ?, page = NULL, chunks = NULL, vectors = NULL, "
+            "lease_until = 0, last_error = NULL WHERE id = ?",
+            (STORED, vectors_stored, page.id)
+        )
+        page.state = STORED
+
+    def defer(self, pages: List[SpooledPage], error: str, delay: float):
+        """
+        Release pages that could not be completed, to be retried after `delay` seconds.
+
+        Pages keep the output of their last completed stage.
+        """
+        now = self._clock()
+        self._conn().executemany(
+            "UPDATE pages SET attempts = attempts + 1, next_attempt_at = ?, lease_until = 0, last_error = ? WHERE id = ?",
+            [(now + delay, error, page.id) for page in pages]
+        )
+
+    def refresh_job(self, job_id: str) -> str:
+        """Mark a job done once every page is stored, returning its state."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            state, remaining = conn.execute(
+                "SELECT jobs.state, (SELECT COUNT(*) FROM pages WHERE job_id = jobs.id AND state != ?) "
+                "FROM jobs WHERE id = ?",
+                (STORED, job_id)
+            ).fetchone()
+            if state in (JOB_PENDING, JOB_SCRAPING) and remaining == 0:
+                state = JOB_DONE
+                conn.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?", (state, self._clock(), job_id))
+        return state
+
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Summarize a job's progress.
+
+        Returns:
+            Dictionary with the job settings, state, page counts per state and
+            totals, or None if the job is unknown
+        """
+        conn = self._conn()
+        job = conn.execute(
+            "SELECT url, tenant_id, state, created_at, updated_at, last_error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+        url, tenant_id, state, created_at, updated_at, job_error = job
+        pages = {SCRAPED: 0, CHUNKED: 0, EMBEDDED: 0, STORED: 0}
+        for page_state, count in conn.execute(
+            "SELECT state, COUNT(*) FROM pages WHERE job_id = ? GROUP BY state", (job_id,)
+        ):
+            pages[page_state] = count
+        chunks, vectors, next_attempt_at = conn.execute(
+            "SELECT COALESCE(SUM(chunks_created), 0), COALESCE(SUM(vectors_stored), 0), "
+            "MIN(CASE WHEN state != ? THEN next_attempt_at END) FROM pages WHERE job_id = ?",
+            (STORED, job_id)
+        ).fetchone()
+        page_error = conn.execute(
+            "SELECT last_error FROM pages WHERE job_id = ? AND state != ? AND last_error IS NOT NULL "
+            "ORDER BY id LIMIT 1",
+            (job_id, STORED)
+        ).fetchone()
+        return {
+            "job_id": job_id,
+            "url": url,
+            "tenant_id": tenant_id,
+            "state": state,
+            "pages": pages,
+            "chunks_created": chunks,
+            "vectors_stored": vectors,
+            "next_attempt_at": next_attempt_at,
+            "last_error": page_error[0] if page_error else job_error,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def purge(self, older_than: float) -> int:
+        """
+        Delete finished and failed jobs not updated for `older_than` seconds.
+
+        Returns:
+            Number of jobs deleted
+        """
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+            (JOB_DONE, JOB_FAILED, self._clock() - older_than)
+        )
+        return cursor.rowcount
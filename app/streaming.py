@@ -0,0 +1,65 @@
+"""
+Helpers for streaming newline-delimited JSON (NDJSON) responses.
+"""
+import json
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_EXHAUSTED = object()
+
+
+def ndjson_line(item: Any) -> bytes:
+    """Serialize a single item as one NDJSON line."""
+    return (json.dumps(item, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def _next_item(iterator: Iterator[Any]) -> Any:
+    return next(iterator, _EXHAUSTED)
+
+
+def _close_iterator(iterator: Iterator[Any]) -> None:
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def stream_ndjson(
+    items: Iterable[Any],
+    request: Optional[Request] = None
+) -> AsyncIterator[bytes]:
+    """
+    Stream items from a (blocking) iterable as NDJSON lines.
+
+    Items are pulled one at a time in the threadpool, so only the item
+    currently being sent is held in memory and the producer is paused
+    while the client is slow to read. If the client disconnects, the
+    underlying iterator is closed so that no further pages are fetched.
+    A failure in the producer is reported as a final error line, since the
+    status code has already been sent by then.
+
+    Args:
+        items: Iterable producing JSON-serializable items
+        request: Incoming request, used to detect client disconnects
+
+    Yields:
+        Encoded NDJSON lines
+    """
+    iterator = iter(items)
+    try:
+        while True:
+            if request is not None and await request.is_disconnected():
+                break
+            try:
+                item = await run_in_threadpool(_next_item, iterator)
+            except Exception as e:
+                yield ndjson_line({"status": "error", "detail": str(e)})
+                break
+            if item is _EXHAUSTED:
+                break
+            yield ndjson_line(item)
+    finally:
+        _close_iterator(iterator)
@@ -0,0 +1,143 @@
+"""
+Lightweight per-request span tracing.
+
+A Trace is bound to the current context for the duration of a request, and
+span() records how long each pipeline stage took. When no trace is active,
+span() costs a single context variable lookup.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Collects timed spans for a single request."""
+
+    def __init__(self, name: str):
+        """
+        Initialize the trace.
+
+        Args:
+            name: Name of the traced operation, e.g. 'POST /api/kb/search'
+        """
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float):
+        """Record a finished span."""
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": (start - self.start) * 1000,
+                "duration_ms": duration * 1000
+            })
+
+    def finish(self):
+        """Mark the traced operation as finished."""
+        self.end = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregate spans by name.
+
+        Returns:
+            Mapping of span name to total duration in milliseconds and call count
+        """
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for span_data in self.spans:
+                entry = totals.setdefault(span_data["name"], {"duration_ms": 0.0, "count": 0})
+                entry["duration_ms"] += span_data["duration_ms"]
+                entry["count"] += 1
+        return totals
+
+    def server_timing(self) -> str:
+        """Format the aggregated spans as a Server-Timing header value."""
+        parts = [
+            f'{name};dur={entry["duration_ms"]:.2f};desc="x{entry["count"]}"'
+            for name, entry in self.totals().items()
+        ]
+        parts.append(f"total;dur={self.duration_ms:.2f}")
+        return ", ".join(parts)
+
+    def summary(self) -> Dict[str, Any]:
+        """Get a JSON-serializable summary of the trace."""
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 2),
+            "spans": {
+                name: {"duration_ms": round(entry["duration_ms"], 2), "count": entry["count"]}
+                for name, entry in self.totals().items()
+            }
+        }
+
+
+def start_trace(name: str) -> Token:
+    """
+    Start a trace and bind it to the current context.
+
+    Args:
+        name: Name of the traced operation
+
+    Returns:
+        Token to pass to end_trace()
+    """
+    return _current_trace.set(Trace(name))
+
+
+def end_trace(token: Token) -> Trace:
+    """
+    Finish the trace started with `token` and unbind it from the context.
+
+    Returns:
+        The finished Trace
+    """
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    trace.finish()
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace bound to the current context, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time a block of code as a named span of the current trace.
+
+    Args:
+        name: Span name, e.g. 'embed' or 'storage.search'
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter() - start)
+
+
+def log_slow_trace(trace: Trace, threshold_ms: float):
+    """Log a trace summary if it took at least `threshold_ms` milliseconds."""
+    if threshold_ms > 0 and trace.duration_ms >= threshold_ms:
+        logger.warning("Slow request: %s", trace.summary())
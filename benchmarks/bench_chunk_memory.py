@@ -0,0 +1,81 @@
+"""
+Compare the memory footprint of dict chunks + list embeddings with ChunkBatch + float32 matrix.
+
+Usage:
+    python -m benchmarks.bench_chunk_memory --chunks 20000 --dimension 768
+"""
+import argparse
+import datetime
+import gc
+import tracemalloc
+
+import numpy as np
+
+from app.processing.batch import ChunkBatch
+
+CHUNKS_PER_PAGE = 20
+
+
+def make_pages(num_chunks: int, chunk_chars: int):
+    timestamp = datetime.datetime.now().isoformat()
+    text = ("lorem ipsum dolor sit amet " * (chunk_chars // 27 + 1))[:chunk_chars]
+    for page in range(0, num_chunks, CHUNKS_PER_PAGE):
+        metadata = {"url": f"https://example.com/page/{page}", "source": "web", "timestamp": timestamp}
+        # Distinct string objects per chunk, as produced by real chunking.
+        texts = [text[:-1] + str(i % 10) for i in range(min(CHUNKS_PER_PAGE, num_chunks - page))]
+        yield texts, metadata
+
+
+def build_dicts(num_chunks, chunk_chars, dimension):
+    chunks, embeddings = [], []
+    rng = np.random.default_rng(0)
+    for texts, metadata in make_pages(num_chunks, chunk_chars):
+        for i, text in enumerate(texts):
+            chunks.append({"text": text, "chunk_index": i, **metadata})
+        embeddings.extend(rng.standard_normal((len(texts), dimension)).tolist())
+    return chunks, embeddings
+
+
+def build_batch(num_chunks, chunk_chars, dimension):
+    batch = ChunkBatch()
+    rng = np.random.default_rng(0)
+    matrix = np.empty((num_chunks, dimension), dtype=np.float32)
+    row = 0
+    for texts, metadata in make_pages(num_chunks, chunk_chars):
+        batch.add_document(texts, metadata)
+        matrix[row:row + len(texts)] = rng.standard_normal((len(texts), dimension))
+        row += len(texts)
+    return batch, matrix
+
+
+def measure(builder, *args):
+    gc.collect()
+    tracemalloc.start()
+    result = builder(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk representation memory benchmark")
+    parser.add_argument("--chunks", type=int, default=20000, help="Chunks to build (results are scaled to 100k)")
+    parser.add_argument("--chunk-chars", type=int, default=800, help="Characters per chunk")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    args = parser.parse_args()
+
+    scale = 100_000 / args.chunks
+    text_only = measure(lambda: [t for texts, _ in make_pages(args.chunks, args.chunk_chars) for t in texts])
+    dict_bytes = measure(build_dicts, args.chunks, args.chunk_chars, args.dimension)
+    batch_bytes = measure(build_batch, args.chunks, args.chunk_chars, args.dimension)
+
+    print(f"per 100k chunks ({args.chunk_chars} chars, dim {args.dimension}):")
+    print(f"  chunk text alone:              {text_only * scale / 2**20:10.1f} MiB")
+    print(f"  dict chunks + list embeddings: {dict_bytes * scale / 2**20:10.1f} MiB")
+    print(f"  ChunkBatch + float32 matrix:   {batch_bytes * scale / 2**20:10.1f} MiB")
+    print(f"  reduction:                     {dict_bytes / batch_bytes:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark parallel chunking throughput on a synthetic corpus.
+
+Usage:
+    python -m benchmarks.bench_chunking --docs 2000 --strategy token
+"""
+import argparse
+import os
+import random
+import time
+
+from app.processing.chunker import TextChunker
+from app.processing.parallel import ParallelChunker
+
+WORDS = (
+    "vector search index embedding chunk token paragraph sentence crawl page "
+    "knowledge base query result score model batch latency throughput storage"
+).split()
+
+
+def make_corpus(num_docs: int, paragraphs: int, seed: int = 0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(num_docs):
+        text = "\n\n".join(
+            ". ".join(
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+                for _ in range(rng.randint(2, 6))
+            ) + "."
+            for _ in range(paragraphs)
+        )
+        corpus.append((text, {"url": f"https://example.com/{i}", "source": "web"}))
+    return corpus
+
+
+def run_sequential(corpus, strategy):
+    chunker = TextChunker(strategy=strategy)
+    start = time.perf_counter()
+    chunks = sum(len(chunker.chunk_text(text, metadata)) for text, metadata in corpus)
+    return time.perf_counter() - start, chunks
+
+
+def run_parallel(corpus, strategy, workers, batch_size):
+    with ParallelChunker(workers=workers, batch_size=batch_size, strategy=strategy) as chunker:
+        # Warm up the pool so process start-up is not counted.
+        list(chunker.chunk_documents(corpus[:workers], strategy=strategy))
+        start = time.perf_counter()
+        chunks = sum(len(doc_chunks) for doc_chunks in chunker.chunk_documents(corpus, strategy=strategy))
+        return time.perf_counter() - start, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel chunking benchmark")
+    parser.add_argument("--docs", type=int, default=2000, help="Number of synthetic documents")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per document")
+    parser.add_argument("--strategy", choices=["paragraph", "sentence", "token"], default="token")
+    parser.add_argument("--batch-size", type=int, default=16, help="Documents per worker task")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.paragraphs)
+    base_time, base_chunks = run_sequential(corpus, args.strategy)
+    print(f"sequential: {args.docs / base_time:8.1f} docs/s  ({base_chunks} chunks)")
+
+    workers = 1
+    while workers <= args.max_workers:
+        elapsed, chunks = run_parallel(corpus, args.strategy, workers, args.batch_size)
+        assert chunks == base_chunks
+        print(f"workers={workers:<3} {args.docs / elapsed:8.1f} docs/s  speedup x{base_time / elapsed:.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Measure HTML content extraction throughput and its effect on chunk counts.
+
+Synthetic pages mix article content with typical boilerplate (navigation,
+scripts, sidebars, footers). Chunk counts are compared between chunking the
+raw HTML, as the pipeline did before extraction, and chunking the extracted
+sections.
+
+Usage:
+    python -m benchmarks.bench_extraction --pages 200 --paragraphs 40
+"""
+import argparse
+import random
+import time
+
+from app.processing.chunker import TextChunker
+from app.processing.extractor import extract_sections
+
+WORDS = (
+    "data index vector search crawl page content model query result token chunk "
+    "embedding storage latency request server client network cache batch"
+).split()
+
+
+def make_page(rng: random.Random, paragraphs: int) -> str:
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    sidebar = "".join(f'<li><a href="/post/{i}">{sentence(6)}</a></li>' for i in range(20))
+    body = []
+    for i in range(paragraphs):
+        if i % 8 == 0:
+            body.append(f"<h2>{sentence(4)}</h2>")
+        body.append(f"<p>{' '.join(sentence(rng.randint(8, 20)) for _ in range(rng.randint(2, 5)))}</p>")
+    return (
+        "<!DOCTYPE html><html><head><title>Benchmark page</title>"
+        "<script>" + "var config = {'key': 'value'};" * 200 + "</script>"
+        "<style>" + ".class { color: red; margin: 0 }" * 200 + "</style></head><body>"
+        f"<header><h1>Site</h1><nav><ul>{nav}</ul></nav></header>"
+        f"<main><article>{''.join(body)}</article></main>"
+        f"<aside><ul>{sidebar}</ul></aside>"
+        "<footer><p>Copyright Example Inc. All rights reserved.</p></footer>"
+        "<script>" + "trackEvent('view');" * 100 + "</script></body></html>"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content extraction benchmark")
+    parser.add_argument("--pages", type=int, default=200, help="Pages to process")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Content paragraphs per page")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [make_page(rng, args.paragraphs) for _ in range(args.pages)]
+    chunker = TextChunker(strategy="sentence")
+
+    start = time.perf_counter()
+    extracted = [extract_sections(page) for page in pages]
+    elapsed = time.perf_counter() - start
+
+    raw_batches = [chunker.chunk_batch(page) for page in pages]
+    extracted_batches = [
+        chunker.chunk_batch(section.text)
+        for sections in extracted
+        for section in sections
+    ]
+    raw_chunks = sum(len(batch) for batch in raw_batches)
+    extracted_chunks = sum(len(batch) for batch in extracted_batches)
+    raw_embedded = sum(len(text) for batch in raw_batches for text in batch.texts)
+    extracted_embedded = sum(len(text) for batch in extracted_batches for text in batch.texts)
+    raw_chars = sum(len(page) for page in pages)
+    kept_chars = sum(len(section.text) for sections in extracted for section in sections)
+
+    print(f"{args.pages} pages, {raw_chars / args.pages / 1024:.1f} KiB of HTML each")
+    print(f"  extraction:          {args.pages / elapsed:10.1f} pages/s  ({raw_chars / elapsed / 2**20:.1f} MiB/s)")
+    print(f"  text kept:           {kept_chars / raw_chars:10.1%}")
+    print(f"  chunks/page raw:     {raw_chunks / args.pages:10.1f}")
+    print(f"  chunks/page extract: {extracted_chunks / args.pages:10.1f}")
+    print(f"  chunk reduction:     {1 - extracted_chunks / raw_chunks:10.1%}")
+    print(f"  chars embedded/page: {raw_embedded / args.pages:10.0f} raw, {extracted_embedded / args.pages:.0f} extracted")
+
+
+if __name__ == "__main__":
+    main()
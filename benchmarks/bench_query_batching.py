@@ -0,0 +1,89 @@
+"""
+Compare direct and micro-batched query embedding at increasing concurrency.
+
+The fake model charges a fixed cost per forward pass plus a small cost per
+text, which is roughly how a CPU-bound SentenceTransformer behaves for short
+queries.
+
+Usage:
+    python -m benchmarks.bench_query_batching --queries 400 --pass-ms 8 --per-text-ms 0.3
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.processing.batching import MicroBatchingEmbeddings
+from app.processing.fakes import FakeEmbeddings
+
+
+class SerialModel(FakeEmbeddings):
+    """Fake model that, like a single CPU model, runs one forward pass at a time."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._model_lock = threading.Lock()
+
+    def get_embeddings(self, texts, token_counts=None):
+        with self._model_lock:
+            return super().get_embeddings(texts, token_counts)
+
+
+def run(provider, concurrency: int, queries: int):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = queries // concurrency
+
+    def worker(worker_id):
+        for i in range(per_thread):
+            start = time.perf_counter()
+            provider.get_embeddings([f"query {worker_id} {i}"])
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return (
+        len(latencies) / elapsed,
+        statistics.median(latencies) * 1000,
+        latencies[int(len(latencies) * 0.99) - 1] * 1000
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query micro-batching benchmark")
+    parser.add_argument("--queries", type=int, default=400, help="Queries per concurrency level")
+    parser.add_argument("--pass-ms", type=float, default=8.0, help="Fixed cost of one forward pass")
+    parser.add_argument("--per-text-ms", type=float, default=0.3, help="Additional cost per text")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8,16,32,64")
+    args = parser.parse_args()
+
+    print(f"{'conc':>5} {'direct q/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'batched q/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>10}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        model_args = dict(dimension=384, latency=args.pass_ms / 1000, per_text_latency=args.per_text_ms / 1000)
+        direct = run(SerialModel(**model_args), concurrency, args.queries)
+
+        model = SerialModel(**model_args)
+        batcher = MicroBatchingEmbeddings(model, args.max_batch_size, args.max_wait_ms / 1000)
+        batched = run(batcher, concurrency, args.queries)
+        batcher.close()
+
+        avg_batch = sum(model.batch_sizes) / len(model.batch_sizes)
+        print(
+            f"{concurrency:>5} {direct[0]:>11.1f} {direct[1]:>8.1f} {direct[2]:>8.1f} "
+            f"{batched[0]:>12.1f} {batched[1]:>8.1f} {batched[2]:>8.1f} {avg_batch:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
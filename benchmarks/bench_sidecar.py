@@ -0,0 +1,121 @@
+"""
+Compare per-worker memory and throughput of in-process embedding models
+against a shared embedding sidecar.
+
+The model is simulated by a fake provider holding a ballast array of the
+given size (all-MiniLM-L6-v2 with torch is roughly 300-500 MiB resident),
+and a fixed per-call compute cost. Each worker process embeds batches of
+queries and reports its resident set size.
+
+Usage:
+    python -m benchmarks.bench_sidecar --workers 4 --model-mb 300 --calls 200
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.processing.fakes import FakeEmbeddings
+
+
+class BallastEmbeddings(FakeEmbeddings):
+    """Fake provider that holds `model_mb` of resident memory like a loaded model."""
+
+    def __init__(self, model_mb: int, **kwargs):
+        super().__init__(**kwargs)
+        self.weights = np.ones(model_mb * 2**20 // 4, dtype=np.float32)
+
+
+def rss_mib(pid: str = "self") -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_sidecar(socket_path: str, model_mb: int, latency: float):
+    from app.processing.sidecar import serve
+    serve(socket_path, BallastEmbeddings(model_mb, dimension=384, latency=latency))
+
+
+def run_worker(mode: str, socket_path: str, model_mb: int, latency: float, calls: int, batch: int, results):
+    if mode == "sidecar":
+        from app.processing.sidecar import SidecarEmbeddings
+        provider = SidecarEmbeddings(socket_path)
+    else:
+        provider = BallastEmbeddings(model_mb, dimension=384, latency=latency)
+
+    start = time.perf_counter()
+    for i in range(calls):
+        provider.get_embeddings([f"query {os.getpid()} {i} {j}" for j in range(batch)])
+    elapsed = time.perf_counter() - start
+    results.put((calls * batch / elapsed, rss_mib()))
+
+
+def measure(mode: str, args, socket_path: str):
+    context = multiprocessing.get_context("spawn")
+    sidecar = None
+    sidecar_rss = 0.0
+    if mode == "sidecar":
+        sidecar = context.Process(target=run_sidecar, args=(socket_path, args.model_mb, args.latency_ms / 1000))
+        sidecar.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+
+    results = context.Queue()
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(mode, socket_path, args.model_mb, args.latency_ms / 1000, args.calls, args.batch, results)
+        )
+        for _ in range(args.workers)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    stats = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    if sidecar is not None:
+        sidecar_rss = rss_mib(str(sidecar.pid))
+        sidecar.terminate()
+        sidecar.join()
+
+    worker_rss = [rss for _, rss in stats]
+    total_texts = args.workers * args.calls * args.batch
+    return {
+        "worker_rss": sum(worker_rss) / len(worker_rss),
+        "node_rss": sum(worker_rss) + sidecar_rss,
+        "sidecar_rss": sidecar_rss,
+        "throughput": total_texts / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding sidecar benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--model-mb", type=int, default=300, help="Simulated resident model size")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated compute per call")
+    parser.add_argument("--calls", type=int, default=200, help="Embedding calls per worker")
+    parser.add_argument("--batch", type=int, default=1, help="Texts per call")
+    args = parser.parse_args()
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    print(f"{args.workers} workers, {args.model_mb} MiB model, {args.calls} calls of {args.batch} text(s) each")
+    print(f"{'mode':>10} {'RSS/worker MiB':>15} {'sidecar MiB':>12} {'node MiB':>10} {'texts/s':>10}")
+    for mode in ("in-process", "sidecar"):
+        result = measure(mode, args, socket_path)
+        print(
+            f"{mode:>10} {result['worker_rss']:>15.1f} {result['sidecar_rss']:>12.1f} "
+            f"{result['node_rss']:>10.1f} {result['throughput']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure upsert throughput (vectors/second) of QdrantStorage.store_embeddings.
+
+Compares the previous upload path (upload_collection in batches of 100,
+waiting for each) with byte-sized batches uploaded serially and with several
+batches in flight and a single final barrier. Each run uses a fresh scratch
+collection that is dropped afterwards.
+
+Start a local Qdrant first, e.g. `docker run -p 6333:6333 qdrant/qdrant`.
+With --url :memory: uploads stay serial, as the in-process client is not
+thread-safe.
+
+Usage:
+    python -m benchmarks.bench_upsert --url http://localhost:6333 --points 20000 --dim 384 --parallel 1,2,4,8
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct
+
+from app.processing.batch import ChunkBatch
+from app.storage.qdrant_client import QdrantStorage, point_id_for
+
+
+def make_chunks(count: int, text_bytes: int) -> ChunkBatch:
+    return ChunkBatch.from_dicts(
+        {
+            "text": f"Chunk {i} " + "lorem ipsum " * (text_bytes // 12),
+            "url": f"https://bench.example/page-{i // 20}",
+            "chunk_index": i % 20,
+            "timestamp": "2024-01-01T00:00:00"
+        }
+        for i in range(count)
+    )
+
+
+def run(client, vector_size, chunks, vectors, upload):
+    name = f"bench_upsert_{uuid.uuid4().hex[:8]}"
+    storage = QdrantStorage(client=client, collection_name=name, vector_size=vector_size)
+    try:
+        start = time.perf_counter()
+        upload(storage)
+        elapsed = time.perf_counter() - start
+        stored = storage.client.count(name, exact=True).count
+    finally:
+        storage.client.delete_collection(name)
+    assert stored == len(chunks), f"{stored} of {len(chunks)} points stored"
+    return len(chunks) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant upsert throughput benchmark")
+    parser.add_argument("--url", type=str, default="http://localhost:6333", help="Qdrant URL, or :memory:")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--text-bytes", type=int, default=1000, help="Approximate text size per chunk")
+    parser.add_argument("--batch-mb", type=float, default=4.0, help="Target size of one upsert request")
+    parser.add_argument("--parallel", type=str, default="1,2,4,8", help="Upsert requests in flight")
+    args = parser.parse_args()
+
+    client = QdrantClient(location=":memory:") if args.url == ":memory:" else QdrantClient(url=args.url, timeout=60)
+    chunks = make_chunks(args.points, args.text_bytes)
+    vectors = np.random.default_rng(0).standard_normal((args.points, args.dim)).astype(np.float32)
+    batch_bytes = int(args.batch_mb * 1024 * 1024)
+
+    def previous(storage):
+        # The upload path before byte-sized batches.
+        storage.client.upload_collection(
+            collection_name=storage.collection_name,
+            vectors=vectors,
+            payload=({"text": chunks.texts[i], "url": chunks.get_metadata(i).get("url", "")} for i in range(len(chunks))),
+            batch_size=100,
+            wait=True
+        )
+
+    def batched(parallel, wait):
+        def upload(storage):
+            storage.upload_points(
+                points(),
+                wait=wait,
+                batch_bytes=batch_bytes,
+                parallel=parallel
+            )
+        return upload
+
+    def points():
+        # The points store_embeddings builds, minus most payload fields; upload_points takes parallelism directly.
+        for i in range(len(chunks)):
+            metadata = chunks.get_metadata(i)
+            yield PointStruct(
+                id=point_id_for(metadata["url"], chunks.chunk_indices[i]),
+                vector=vectors[i].tolist(),
+                payload={"text": chunks.texts[i], "url": metadata["url"], "chunk_index": chunks.chunk_indices[i]}
+            )
+
+    print(f"{args.points} points, dim {args.dim}, ~{args.text_bytes} text bytes, {args.batch_mb} MiB batches")
+    print(f"{'upload':<34} {'vectors/s':>10}")
+    print(f"{'upload_collection(100), wait':<34} {run(client, args.dim, chunks, vectors, previous):>10.0f}")
+    for parallel in [int(p) for p in args.parallel.split(",")]:
+        for wait in (True, False):
+            label = f"byte batches x{parallel}, " + ("wait" if wait else "barrier")
+            print(f"{label:<34} {run(client, args.dim, chunks, vectors, batched(parallel, wait)):>10.0f}")
+
+    def store(storage):
+        storage.store_embeddings(chunks, vectors)
+    print(f"{'store_embeddings (configured)':<34} {run(client, args.dim, chunks, vectors, store):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
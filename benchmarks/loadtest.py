@@ -0,0 +1,306 @@
+"""
+Open-loop load generator for the HTTP API.
+
+Requests arrive as a Poisson process at each configured rate, independently
+of how fast the server answers, so queueing delay shows up in the measured
+latency instead of silently lowering the offered load. Latency is measured
+from each request's scheduled arrival time. Traffic is a weighted mix of
+search, ingest and delete requests.
+
+The app runs with fake embedding and scraper backends and an in-memory
+Qdrant collection, either in this process (through httpx's ASGI transport)
+or in a uvicorn server started for the run. An already running server can
+be targeted with --url.
+
+Usage:
+    python -m benchmarks.loadtest --rates 5,10,20,40 --duration 10 --mix search=8,ingest=1,delete=1
+    python -m benchmarks.loadtest --uvicorn --workers 2 --rates 50,100,200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+ENDPOINTS = ("search", "ingest", "delete")
+QUERY_WORDS = "search index vector crawl page content model query result token chunk embedding".split()
+
+
+def create_app():
+    """
+    Build the API app with local fake backends.
+
+    Used in-process by the load generator and as a uvicorn factory
+    (uvicorn benchmarks.loadtest:create_app --factory). Backend behaviour is
+    read from LOADTEST_* environment variables so that uvicorn workers pick
+    up the same settings.
+    """
+    # Must be set before app.config is imported, so that the knowledge base
+    # built by app.main starts on an in-memory collection.
+    os.environ.setdefault("QDRANT_URL", ":memory:")
+    from app import main
+    from app.processing.fakes import FakeEmbeddings
+    from app.scraper.fake import FakeScraperProvider
+
+    kb = main.kb
+    if kb.storage.url != ":memory:":
+        raise RuntimeError("Load testing needs QDRANT_URL=:memory: set before the app is imported")
+    kb.scraper = FakeScraperProvider(
+        pages=int(os.getenv("LOADTEST_PAGES", "3")),
+        paragraphs=int(os.getenv("LOADTEST_PARAGRAPHS", "8")),
+        latency=float(os.getenv("LOADTEST_SCRAPE_LATENCY_MS", "0")) / 1000
+    )
+    kb.embedder = FakeEmbeddings(
+        dimension=kb.storage.vector_size,
+        latency=float(os.getenv("LOADTEST_EMBED_LATENCY_MS", "5")) / 1000,
+        per_text_latency=float(os.getenv("LOADTEST_EMBED_PER_TEXT_MS", "0.2")) / 1000
+    )
+    return main.app
+
+
+class Recorder:
+    """Collects latencies and status codes per endpoint for one rate step."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.dropped: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, status: int, latency: float):
+        self.statuses[endpoint][status] += 1
+        if 200 <= status < 300:
+            self.latencies[endpoint].append(latency)
+
+    def report(self, duration: float) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for endpoint in ENDPOINTS:
+            statuses = self.statuses.get(endpoint, {})
+            sent = sum(statuses.values()) + self.dropped.get(endpoint, 0)
+            if not sent:
+                continue
+            latencies = sorted(self.latencies.get(endpoint, []))
+            ok = len(latencies)
+            report[endpoint] = {
+                "sent": sent,
+                "ok": ok,
+                "errors": sent - ok,
+                "statuses": {str(code): count for code, count in sorted(statuses.items())},
+                "dropped": self.dropped.get(endpoint, 0),
+                "throughput": ok / duration,
+                "p50_ms": _percentile(latencies, 0.50),
+                "p95_ms": _percentile(latencies, 0.95),
+                "p99_ms": _percentile(latencies, 0.99)
+            }
+        return report
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q * len(values))) - 1))
+    return values[index] * 1000
+
+
+class TrafficMix:
+    """Builds requests for each endpoint, tracking which sites have been ingested."""
+
+    def __init__(self, weights: Dict[str, float], seed: int = 0):
+        self.endpoints = [endpoint for endpoint in ENDPOINTS if weights.get(endpoint, 0) > 0]
+        self.weights = [weights[endpoint] for endpoint in self.endpoints]
+        self.random = random.Random(seed)
+        self.ingested: List[str] = []
+        self.next_site = 0
+
+    def choose(self) -> str:
+        return self.random.choices(self.endpoints, self.weights)[0]
+
+    def request(self, endpoint: str) -> Dict[str, Any]:
+        if endpoint == "search":
+            query = " ".join(self.random.choice(QUERY_WORDS) for _ in range(4))
+            return {"method": "POST", "url": "/api/kb/search", "json": {"query": query, "limit": 5}}
+        if endpoint == "ingest":
+            site = f"https://site-{self.next_site}.example.com/"
+            self.next_site += 1
+            self.ingested.append(site)
+            return {"method": "POST", "url": "/api/kb/process", "json": {"url": site, "depth": 2}}
+        site = self.ingested.pop(self.random.randrange(len(self.ingested))) if self.ingested else "https://missing.example.com/"
+        return {"method": "DELETE", "url": "/api/kb/website", "params": {"url": site}}
+
+
+async def run_step(
+    client: httpx.AsyncClient,
+    mix: TrafficMix,
+    rate: float,
+    duration: float,
+    max_outstanding: int,
+    timeout: float
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Offer `rate` requests per second for `duration` seconds.
+
+    Returns:
+        Per-endpoint report for the step
+    """
+    recorder = Recorder()
+    tasks = set()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    next_arrival = start
+
+    async def send(endpoint: str, request: Dict[str, Any], scheduled: float):
+        try:
+            response = await client.request(timeout=timeout, **request)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        recorder.record(endpoint, status, loop.time() - scheduled)
+
+    while True:
+        next_arrival += mix.random.expovariate(rate)
+        if next_arrival - start >= duration:
+            break
+        delay = next_arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = mix.choose()
+        if len(tasks) >= max_outstanding:
+            recorder.dropped[endpoint] += 1
+            continue
+        task = asyncio.ensure_future(send(endpoint, mix.request(endpoint), next_arrival))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.wait(tasks)
+    return recorder.report(loop.time() - start)
+
+
+async def run(client: httpx.AsyncClient, args) -> List[Dict[str, Any]]:
+    mix = TrafficMix(parse_mix(args.mix), seed=args.seed)
+
+    # Seed the collection so that searches and deletes have data to work on.
+    for _ in range(args.warmup_sites):
+        await client.request(timeout=args.timeout, **mix.request("ingest"))
+
+    steps = []
+    for rate in args.rates:
+        report = await run_step(client, mix, rate, args.duration, args.max_outstanding, args.timeout)
+        steps.append({"rate": rate, "endpoints": report})
+        print_step(rate, report, args.slo_ms)
+    return steps
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def print_step(rate: float, report: Dict[str, Dict[str, Any]], slo_ms: Optional[float] = None):
+    def ms(value):
+        return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+    for endpoint, stats in report.items():
+        saturated = stats["errors"] > 0.01 * stats["sent"] or (
+            slo_ms is not None and stats["p99_ms"] is not None and stats["p99_ms"] > slo_ms
+        )
+        print(
+            f"{rate:>7.1f} {endpoint:>7} {stats['sent']:>6} {stats['ok']:>6} {stats['errors']:>6} "
+            f"{stats['throughput']:>8.1f} {ms(stats['p50_ms'])} {ms(stats['p95_ms'])} {ms(stats['p99_ms'])}"
+            f"{'  saturated' if saturated else ''}"
+        )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(workers: int) -> Tuple[subprocess.Popen, str]:
+    """Start a uvicorn server running the app with fake backends."""
+    port = _free_port()
+    env = dict(os.environ, QDRANT_URL=":memory:")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.loadtest:create_app", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+        ],
+        env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/api/metrics", timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+async def main_async(args):
+    process = None
+    if args.url:
+        transport, base_url = None, args.url
+    elif args.uvicorn:
+        process, base_url = start_uvicorn(args.workers)
+        transport = None
+    else:
+        transport, base_url = httpx.ASGITransport(app=create_app()), "http://loadtest"
+
+    limits = httpx.Limits(max_connections=args.max_outstanding, max_keepalive_connections=args.max_outstanding)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits) as client:
+            print(f"{'rate':>7} {'endpoint':>7} {'sent':>6} {'ok':>6} {'errors':>6} {'ok/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            steps = await run(client, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"mix": args.mix, "duration": args.duration, "steps": steps}, output, indent=2)
+    return steps
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Open-loop load test of the HTTP API")
+    parser.add_argument("--rates", type=lambda value: [float(rate) for rate in value.split(",")],
+                        default=[5, 10, 20, 40], help="Comma-separated arrival rates in requests/s")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per rate step")
+    parser.add_argument("--mix", default="search=8,ingest=1,delete=1", help="Endpoint weights")
+    parser.add_argument("--warmup-sites", type=int, default=5, help="Sites ingested before the first step")
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="Requests in flight before new arrivals are dropped")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--slo-ms", type=float, help="Mark steps whose p99 exceeds this latency as saturated")
+    parser.add_argument("--seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--uvicorn", action="store_true", help="Run the app in a uvicorn server instead of in-process")
+    target.add_argument("--url", help="Target an already running server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --uvicorn (each has its own in-memory collection)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser
+
+
+def main():
+    asyncio.run(main_async(build_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
 from app.config import QDRANT_URL, QDRANT_PORT, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+from app.storage.qdrant_client import QdrantStorage
 
 
 client = QdrantClient(
@@ -10,27 +10,12 @@ client = QdrantClient(
     timeout=10
 )
 
-collections = client.get_collections().collections
-collection_names = [c.name for c in collections]
-
-if QDRANT_COLLECTION_NAME in collection_names:
-    print(f"Deleting existing collection '{QDRANT_COLLECTION_NAME}'...")
-    client.delete_collection(collection_name=QDRANT_COLLECTION_NAME)
-    print(f"Collection '{QDRANT_COLLECTION_NAME}' deleted.")
+storage = QdrantStorage(client=client, collection_name=QDRANT_COLLECTION_NAME, vector_size=768)
+print(f"Deleting '{QDRANT_COLLECTION_NAME}' and the collections behind it...")
+storage.drop_all()
+print(f"Collection '{QDRANT_COLLECTION_NAME}' deleted.")
 
 print(f"Creating collection '{QDRANT_COLLECTION_NAME}'")
-client.create_collection(
-    collection_name=QDRANT_COLLECTION_NAME,
-    vectors_config=models.VectorParams(
-        size=768,
-        distance=models.Distance.COSINE,
-    ),
-)
-
-client.create_payload_index(
-    collection_name=QDRANT_COLLECTION_NAME,
-    field_name="url",
-    field_schema="keyword"
-)
+storage = QdrantStorage(client=client, collection_name=QDRANT_COLLECTION_NAME, vector_size=768)
 
-print(f"Collection '{QDRANT_COLLECTION_NAME}' created successfully with 768 dimensions")
\ No newline at end of file
+print(f"Collection '{QDRANT_COLLECTION_NAME}' created successfully with 768 dimensions, as {storage.collection_name} behind the alias")
@@ -0,0 +1,67 @@
+"""
+Export the knowledge base to a local snapshot, or restore it, without re-embedding.
+
+    python snapshot_kb.py export ./kb-snapshot
+    python snapshot_kb.py import ./kb-snapshot --recreate
+"""
+import argparse
+import sys
+import time
+
+from app.config import QDRANT_COLLECTION_NAME
+from app.storage.qdrant_client import QdrantStorage
+from app.storage.snapshot import export_collection, import_collection, read_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge base snapshot export/import")
+    subparsers = parser.add_subparsers(dest="command", help="Command to run")
+
+    export_parser = subparsers.add_parser("export", help="Export all points to a snapshot directory")
+    export_parser.add_argument("path", help="Snapshot directory")
+    export_parser.add_argument("--collection", default=QDRANT_COLLECTION_NAME, help="Collection to export")
+    export_parser.add_argument("--batch-size", type=int, default=1000, help="Points per scroll request")
+
+    import_parser = subparsers.add_parser("import", help="Upload a snapshot directory into a collection")
+    import_parser.add_argument("path", help="Snapshot directory")
+    import_parser.add_argument("--collection", default=QDRANT_COLLECTION_NAME, help="Target collection")
+    import_parser.add_argument("--batch-size", type=int, default=256, help="Points per upload request")
+    import_parser.add_argument("--parallel", type=int, default=4, help="Parallel upload workers")
+    import_parser.add_argument("--recreate", action="store_true", help="Drop the target collection first")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    if args.command == "export":
+        storage = QdrantStorage(collection_name=args.collection)
+        manifest = export_collection(storage.client, args.collection, args.path, batch_size=args.batch_size)
+        print(f"Exported {manifest['count']} points from '{args.collection}' to {args.path}")
+
+    elif args.command == "import":
+        manifest = read_manifest(args.path)
+        storage = QdrantStorage(collection_name=args.collection, vector_size=manifest["vector_size"])
+        if args.recreate:
+            print(f"Recreating collection '{args.collection}'...")
+            # The name is an alias: drop the collections behind it too.
+            storage.drop_all()
+            storage = QdrantStorage(collection_name=args.collection, vector_size=manifest["vector_size"])
+        count = import_collection(
+            storage.client,
+            args.collection,
+            args.path,
+            batch_size=args.batch_size,
+            parallel=args.parallel
+        )
+        print(f"Imported {count} points into '{args.collection}'")
+
+    else:
+        parser.print_help()
+        return 1
+
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
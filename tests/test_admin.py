@@ -0,0 +1,29 @@
+"""
+Tests for the admin token check on /api/admin endpoints.
+"""
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+with patch("app.knowledge_base.KnowledgeBase"):
+    from app import main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_admin_endpoints_are_disabled_without_a_token(client):
+    with patch.object(main, "ADMIN_TOKEN", ""):
+        response = client.get("/api/admin/profile")
+        assert response.status_code == 403
+        assert client.get("/api/admin/profile", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_admin_endpoints_require_the_configured_token(client):
+    with patch.object(main, "ADMIN_TOKEN", "secret"):
+        assert client.get("/api/admin/profile").status_code == 403
+        assert client.get("/api/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        assert client.get("/api/admin/profile", headers={"X-Admin-Token": "secret"}).status_code == 200
@@ -0,0 +1,160 @@
+"""
+Tests for admission control and load shedding.
+"""
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.admission import AdmissionClass, AdmissionController, AdmissionMiddleware, AdmissionRejected
+
+
+def _controller(capacity=2, search_queue=4, ingest_queue=4, timeout=1.0):
+    return AdmissionController(
+        capacity=capacity,
+        classes={
+            "search": AdmissionClass("search", limit=2, max_queue=search_queue, queue_timeout=timeout, priority=0),
+            "ingest": AdmissionClass("ingest", limit=1, max_queue=ingest_queue, queue_timeout=timeout, priority=2)
+        }
+    )
+
+
+def test_search_is_admitted_before_queued_ingestion():
+    """When a slot frees up, waiting searches go ahead of waiting ingests."""
+    async def run():
+        controller = _controller(capacity=1)
+        admitted = []
+        held = await controller.acquire("ingest")
+
+        async def request(name):
+            token = await controller.acquire(name)
+            admitted.append(name)
+            controller.release(name, token)
+
+        ingest = asyncio.ensure_future(request("ingest"))
+        await asyncio.sleep(0)
+        search = asyncio.ensure_future(request("search"))
+        await asyncio.sleep(0)
+        assert controller.stats()["classes"]["ingest"]["queued"] == 1
+        assert controller.stats()["classes"]["search"]["queued"] == 1
+
+        controller.release("ingest", held)
+        await asyncio.gather(ingest, search)
+        return admitted
+
+    assert asyncio.run(run()) == ["search", "ingest"]
+
+
+def test_lower_priority_is_admitted_while_global_capacity_is_left():
+    """Searches waiting on their own class limit do not hold back ingests."""
+    async def run():
+        controller = _controller(capacity=4)
+        searches = [await controller.acquire("search") for _ in range(2)]
+        waiting = asyncio.ensure_future(controller.acquire("search"))
+        await asyncio.sleep(0)
+        assert controller.stats()["classes"]["search"]["queued"] == 1
+
+        await asyncio.wait_for(controller.acquire("ingest"), timeout=0.1)
+        stats = controller.stats()
+        controller.release("search", searches[0])
+        await waiting
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["in_flight"] == 3
+    assert stats["classes"]["ingest"]["in_flight"] == 1
+
+
+def test_waiters_behind_a_cancelled_request_are_admitted():
+    """A request that leaves the queue without a slot never strands the ones behind it."""
+    async def run():
+        controller = _controller(capacity=1)
+        held = await controller.acquire("ingest")
+        cancelled = asyncio.ensure_future(controller.acquire("ingest"))
+        behind = asyncio.ensure_future(controller.acquire("ingest"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert controller.stats()["classes"]["ingest"]["queued"] == 1
+
+        controller.release("ingest", held)
+        await asyncio.wait_for(behind, timeout=0.1)
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert stats["in_flight"] == 1
+    assert stats["classes"]["ingest"]["admitted"] == 2
+
+
+def test_full_queue_is_rejected_with_429():
+    """Requests beyond the queue bound are shed immediately."""
+    async def run():
+        controller = _controller(capacity=1, ingest_queue=1)
+        await controller.acquire("ingest")
+        waiting = asyncio.ensure_future(controller.acquire("ingest"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("ingest")
+        waiting.cancel()
+        return excinfo.value, controller.stats()
+
+    rejected, stats = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert 1 <= rejected.retry_after <= 60
+    assert stats["classes"]["ingest"]["rejected_queue_full"] == 1
+
+
+def test_queue_timeout_is_rejected_with_503():
+    """Requests that wait longer than the class timeout are shed."""
+    async def run():
+        controller = _controller(capacity=1, timeout=0.01)
+        await controller.acquire("search")
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("search")
+        return excinfo.value, controller.stats()
+
+    rejected, stats = asyncio.run(run())
+    assert rejected.status_code == 503
+    assert stats["classes"]["search"]["queued"] == 0
+    assert stats["classes"]["search"]["rejected_timeout"] == 1
+
+
+def test_middleware_sheds_with_retry_after():
+    """The middleware answers shed requests itself and bypasses unclassified paths."""
+    async def run():
+        gate = asyncio.Event()
+
+        async def slow(request):
+            await gate.wait()
+            return JSONResponse({"ok": True})
+
+        async def health(request):
+            return JSONResponse({"ok": True})
+
+        controller = _controller(capacity=1, ingest_queue=0)
+        app = AdmissionMiddleware(
+            Starlette(routes=[Route("/ingest", slow, methods=["POST"]), Route("/health", health)]),
+            controller=controller,
+            classify=lambda method, path: "ingest" if path == "/ingest" else None
+        )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.ensure_future(client.post("/ingest"))
+            while controller.in_flight == 0:
+                await asyncio.sleep(0.001)
+            shed = await client.post("/ingest")
+            bypass = await client.get("/health")
+            gate.set()
+            ok = await first
+        return shed, bypass, ok, controller.in_flight
+
+    shed, bypass, ok, in_flight = asyncio.run(run())
+    assert shed.status_code == 429
+    assert "Retry-After" in shed.headers
+    assert bypass.status_code == 200
+    assert ok.status_code == 200
+    assert in_flight == 0
@@ -0,0 +1,58 @@
+"""
+Tests for the columnar chunk batch and float32 embedding path.
+"""
+import numpy as np
+from qdrant_client import QdrantClient
+
+from app.processing.batch import ChunkBatch, as_embedding_matrix
+from app.processing.chunker import TextChunker
+from app.storage.qdrant_client import QdrantStorage
+
+TEST_TEXT = "First paragraph.\n\nSecond paragraph.\n\nThird paragraph."
+
+
+def test_chunk_batch_shares_metadata():
+    """All chunks of a document reference one metadata dict."""
+    metadata = {"url": "https://example.com", "source": "web"}
+    batch = TextChunker(max_chunk_size=20, strategy="paragraph").chunk_batch(TEST_TEXT, metadata)
+
+    assert len(batch) == 3
+    assert len(batch.metadata) == 1
+    assert batch.get_metadata(2) is batch.get_metadata(0)
+    assert list(batch.chunk_indices) == [0, 1, 2]
+    assert batch.to_dicts() == TextChunker(max_chunk_size=20, strategy="paragraph").chunk_text(TEST_TEXT, metadata)
+
+
+def test_chunk_batch_extend_and_token_counts():
+    """Extending keeps metadata references and drops partial token counts."""
+    batch = ChunkBatch.from_texts(["a", "b"], {"url": "u1"}, token_counts=[1, 1])
+    batch.extend(ChunkBatch.from_texts(["c"], {"url": "u2"}, token_counts=[3]))
+
+    assert batch.has_token_counts
+    assert batch[2] == {"text": "c", "chunk_index": 0, "url": "u2", "token_count": 3}
+
+    batch.add_document(["d"], {"url": "u3"})
+    assert not batch.has_token_counts
+
+
+def test_as_embedding_matrix_does_not_copy_float32():
+    """A contiguous float32 matrix passes through without a copy."""
+    matrix = np.ones((2, 4), dtype=np.float32)
+
+    assert as_embedding_matrix(matrix) is matrix
+    assert as_embedding_matrix([[1, 2], [3, 4]]).dtype == np.float32
+
+
+def test_store_embeddings_from_chunk_batch():
+    """A ChunkBatch and float32 matrix are stored with per-chunk payloads."""
+    storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="test", vector_size=4)
+    batch = ChunkBatch.from_texts(["a", "b", "c"], {"url": "https://example.com", "source": "web"})
+    vectors = np.eye(3, 4, dtype=np.float32)
+
+    ids = storage.store_embeddings(batch, vectors)
+
+    assert len(ids) == 3
+    results = storage.search(query_vector=vectors[1], limit=1)
+    assert results[0]["text"] == "b"
+    assert results[0]["chunk_index"] == 1
+    assert results[0]["url"] == "https://example.com"
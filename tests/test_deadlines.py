@@ -0,0 +1,84 @@
+"""
+Tests for search deadlines and their degradation paths.
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+from qdrant_client import QdrantClient
+
+from app.deadline import Deadline, DeadlineExceeded
+from app.knowledge_base import KnowledgeBase
+from app.metrics import metrics
+from app.processing.fakes import FakeEmbeddings
+from app.scraper.fake import FakeScraperProvider
+from app.storage.qdrant_client import QdrantStorage
+
+QUERY = "vector search latency"
+
+
+@pytest.fixture
+def kb():
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.scraper = FakeScraperProvider(pages=2, paragraphs=4)
+    kb.embedder = FakeEmbeddings(dimension=8)
+    kb.storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=8)
+    kb.spool = None
+    kb.query_cache = None
+    kb.process_website("https://a.example/", depth=2)
+    return kb
+
+
+def test_requested_deadlines_are_capped():
+    with patch("app.deadline.SEARCH_MAX_DEADLINE_MS", 1000), patch("app.deadline.SEARCH_DEADLINE_MS", 0):
+        assert Deadline.from_ms(5000).budget == 1.0
+        assert Deadline.from_ms(200).budget == 0.2
+        assert Deadline.from_ms().remaining() == float("inf")
+
+
+def test_slow_embedding_falls_back_to_the_cached_query_embedding(kb):
+    expected = kb.search(QUERY, limit=3)
+    kb.embedder = FakeEmbeddings(dimension=8, latency=0.5)
+    served = metrics.get("search.degraded.cached_embedding")
+
+    start = time.monotonic()
+    # Same query up to case and spacing.
+    results = kb.search("  Vector search   LATENCY", limit=3, deadline=Deadline(0.1))
+    assert time.monotonic() - start < 0.4
+    assert results == expected
+    assert metrics.get("search.degraded.cached_embedding") == served + 1
+
+    exceeded = metrics.get("search.deadline_exceeded.embed_query")
+    with pytest.raises(DeadlineExceeded) as error:
+        kb.search("a query never embedded before", deadline=Deadline(0.1))
+    assert error.value.stage == "embed_query"
+    assert metrics.get("search.deadline_exceeded.embed_query") == exceeded + 1
+
+
+def test_slow_qdrant_call_exceeds_the_remaining_budget(kb):
+    search = kb.storage.search
+
+    def slow_search(**kwargs):
+        time.sleep(0.5)
+        return search(**kwargs)
+
+    with patch.object(kb.storage, "search", side_effect=slow_search) as storage_search:
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as error:
+            kb.search(QUERY, deadline=Deadline(0.15))
+        assert time.monotonic() - start < 0.4
+    assert error.value.stage == "storage_search"
+    # Qdrant was told what was left of the budget, so it can give up too.
+    assert 0 < storage_search.call_args.kwargs["timeout"] <= 0.15
+
+
+def test_tight_budget_searches_cheaper_and_skips_context(kb):
+    with patch("app.knowledge_base.SEARCH_DEGRADE_BELOW_MS", 10_000):
+        with patch.object(kb.storage, "search_pages", wraps=kb.storage.search_pages) as search_pages:
+            pages = kb.search_pages(QUERY, groups=2, context_chunks=2, deadline=Deadline(5))
+
+    assert pages
+    assert search_pages.call_args.kwargs["degraded"] is True
+    assert search_pages.call_args.kwargs["context_chunks"] == 0
+    assert kb.search(QUERY, limit=2, deadline=Deadline(None))
@@ -0,0 +1,61 @@
+"""
+Tests for HTML main-content extraction.
+"""
+from app.knowledge_base import KnowledgeBase
+from app.processing.batch import ChunkBatch
+from app.processing.extractor import extract_sections, looks_like_html
+
+PAGE = """<!DOCTYPE html><html><head><title>Guide | Example</title>
+<script>var tracking = "should never be indexed";</script></head><body>
+<header><h1>Example</h1></header>
+<nav><ul><li><a href="/">Home</a></li><li><a href="/blog">Blog</a></li></ul></nav>
+<main>
+<p>An introduction that appears before the first heading of the page.</p>
+<h2>Installation</h2>
+<p>Download the installer and run it with the default options selected.</p>
+<ul><li>Python 3.11</li></ul>
+<div class="share-buttons"><p>Share this page with your friends and colleagues today.</p></div>
+<p><a href="/a">One</a> <a href="/b">Two</a> <a href="/c">Three</a> <a href="/d">Four</a> <a href="/e">Five</a></p>
+<h2>Usage</h2>
+<p>Pass the URL of the site to crawl and wait for the index to build.</p>
+</main>
+<footer><p>Copyright Example Inc, all rights reserved in every country.</p></footer>
+</body></html>"""
+
+
+def test_extracts_sections_without_boilerplate():
+    """Headings split the content into titled sections and boilerplate is dropped."""
+    sections = extract_sections(PAGE)
+
+    assert [section.title for section in sections] == ["Guide | Example", "Installation", "Usage"]
+    assert sections[1].text == (
+        "Download the installer and run it with the default options selected.\n\nPython 3.11"
+    )
+    text = " ".join(section.text for section in sections)
+    for boilerplate in ("tracking", "Home", "Share this page", "Copyright", "Four"):
+        assert boilerplate not in text
+
+
+def test_incremental_feeding_matches_whole_page():
+    """Feeding the page in small pieces produces the same sections."""
+    assert extract_sections(PAGE, piece_size=7) == extract_sections(PAGE)
+
+
+def test_looks_like_html():
+    assert looks_like_html(PAGE)
+    assert looks_like_html("  <div class='x'>text</div>")
+    assert not looks_like_html("Plain text mentioning <b> tags later")
+
+
+def test_sections_of_a_page_get_distinct_chunk_indices():
+    """Section batches of one page are merged and numbered across the page."""
+    batches = [
+        ChunkBatch.from_texts(["a", "b"], {"url": "https://x/1", "title": "Intro"}),
+        ChunkBatch.from_texts(["c"], {"url": "https://x/1", "title": "Usage"}),
+        ChunkBatch.from_texts(["d"], {"url": "https://x/2", "title": ""}),
+    ]
+
+    pages = list(KnowledgeBase._merge_pages(batches))
+
+    assert [list(page.chunk_indices) for page in pages] == [[0, 1, 2], [0]]
+    assert [page.get_metadata(2)["title"] for page in pages[:1]] == ["Usage"]
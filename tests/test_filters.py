@@ -0,0 +1,64 @@
+"""
+Tests for structured search filters.
+"""
+import datetime
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.processing.batch import ChunkBatch
+from app.schemas import SearchFilter
+from app.storage.qdrant_client import QdrantStorage, url_filter_fields
+
+QUERY = [1.0, 0.0, 0.0, 0.0]
+
+
+@pytest.fixture
+def storage():
+    storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=4)
+    pages = [
+        ("https://docs.example.com/guides/install", "Installing the CLI", "docs", "2024-05-01T10:00:00"),
+        ("https://docs.example.com/api/search", "Search API reference", "docs", "2024-05-08T10:00:00"),
+        ("https://blog.example.com/posts/launch", "Launch announcement", "web", "2024-05-09T10:00:00"),
+    ]
+    for url, title, source, timestamp in pages:
+        batch = ChunkBatch.from_texts([f"text of {url}"], {"url": url, "title": title, "source": source, "timestamp": timestamp})
+        storage.store_embeddings(batch, np.array([QUERY], dtype=np.float32))
+    return storage
+
+
+def urls(results):
+    return sorted(result["url"] for result in results)
+
+
+def test_url_filter_fields():
+    assert url_filter_fields("https://Docs.Example.com/api/v2/auth?x=1") == {
+        "domain": "docs.example.com",
+        "path_prefixes": ["/", "/api", "/api/v2", "/api/v2/auth"]
+    }
+
+
+def test_domain_and_path_prefix(storage):
+    results = storage.search(QUERY, limit=10, filters={"domain": "docs.example.com", "path_prefix": "/guides/"})
+
+    assert urls(results) == ["https://docs.example.com/guides/install"]
+
+
+def test_time_range_and_source_list(storage):
+    search_filter = SearchFilter(
+        source=["docs", "web"],
+        crawledAfter=datetime.datetime(2024, 5, 7),
+        crawledBefore=datetime.datetime(2024, 5, 9)
+    )
+
+    results = storage.search(QUERY, limit=10, filters=search_filter.to_filters())
+
+    assert urls(results) == ["https://docs.example.com/api/search"]
+
+
+def test_title_words(storage):
+    results = storage.search(QUERY, limit=10, filters={"title": "Launch"})
+
+    assert urls(results) == ["https://blog.example.com/posts/launch"]
+    assert results[0]["timestamp"] == "2024-05-09T10:00:00"
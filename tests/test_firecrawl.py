@@ -0,0 +1,193 @@
+"""
+Tests for the Firecrawl client against a local stand-in of the Firecrawl API.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.retry import RetryPolicy
+from app.scraper.firecrawl import FirecrawlError, FirecrawlProvider
+
+PAGE_SIZE = 2
+
+
+class FakeFirecrawl:
+    """State of the stand-in API: one crawl job that finishes a few pages per status poll."""
+
+    def __init__(self, total_pages=8, pages_per_poll=3, idle_polls=0, status="completed"):
+        self.total_pages = total_pages
+        self.pages_per_poll = pages_per_poll
+        self.idle_polls = idle_polls
+        self.final_status = status
+        self.done = 0
+        self.polls = 0
+        self.failures = []  # (status, headers) of responses to fail with, in order
+        self.requests = []
+        self.connections = set()
+        self.cancelled = []
+
+    def document(self, index):
+        return {
+            "markdown": f"# Page {index}\n\nContent of page {index}.",
+            "metadata": {"sourceURL": f"https://site.example/page-{index}", "title": f"Page {index}", "statusCode": 200}
+        }
+
+    def handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        self.requests.append((method, parsed.path, handler.headers.get("Authorization")))
+        self.connections.add(handler.client_address)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = json.loads(handler.rfile.read(length)) if length else None
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            return status, {"success": False, "error": "Rate limit exceeded"}, headers
+
+        if method == "POST" and parsed.path == "/v1/scrape":
+            return 200, {"success": True, "data": self.document(0) | {"metadata": {"sourceURL": body["url"], "title": "Home"}}}, {}
+        if method == "POST" and parsed.path == "/v1/crawl":
+            self.crawl_request = body
+            return 200, {"success": True, "id": "job-1", "url": f"http://{handler.headers['Host']}/v1/crawl/job-1"}, {}
+        if method == "DELETE" and parsed.path == "/v1/crawl/job-1":
+            self.cancelled.append("job-1")
+            return 200, {"status": "cancelled"}, {}
+        if method == "GET" and parsed.path == "/v1/crawl/job-1":
+            skip = int(parse_qs(parsed.query).get("skip", ["0"])[0])
+            if skip == 0 or "page" not in parse_qs(parsed.query):
+                # A new status poll, not a follow-up page of the previous one.
+                self.polls += 1
+                if self.polls > self.idle_polls:
+                    self.done = min(self.total_pages, self.done + self.pages_per_poll)
+            documents = [self.document(index) for index in range(skip, min(self.done, skip + PAGE_SIZE))]
+            status = self.final_status if self.done == self.total_pages else "scraping"
+            payload = {"success": True, "status": status, "total": self.total_pages, "completed": self.done, "data": documents}
+            if skip + PAGE_SIZE < self.done:
+                payload["next"] = f"http://{handler.headers['Host']}/v1/crawl/job-1?skip={skip + PAGE_SIZE}&page=1"
+            return 200, payload, {}
+        return 404, {"success": False, "error": "Not found"}, {}
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def respond(self, method):
+            status, payload, headers = api.handle(self, method)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.respond("GET")
+
+        def do_POST(self):
+            self.respond("POST")
+
+        def do_DELETE(self):
+            self.respond("DELETE")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def server():
+    def start(api):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(api))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    servers = []
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def make_provider(url, sleeps, **kwargs):
+    return FirecrawlProvider(
+        api_key="test-key",
+        api_url=url,
+        retry_policy=RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.1),
+        poll_min=1,
+        poll_max=8,
+        sleep=sleeps.append,
+        **kwargs
+    )
+
+
+def test_scrape_retries_rate_limit_after_retry_after(server):
+    api = FakeFirecrawl()
+    api.failures = [(429, {"Retry-After": "2"}), (503, {})]
+    sleeps = []
+    provider = make_provider(server(api), sleeps)
+
+    pages = provider.scrape("https://site.example/", depth=1)
+
+    assert pages == [{"url": "https://site.example/", "title": "Home", "text": "# Page 0\n\nContent of page 0."}]
+    assert sleeps[0] == 2 and sleeps[1] < 1
+    assert all(auth == "Bearer test-key" for _, _, auth in api.requests)
+    # All three attempts reused one keep-alive connection.
+    assert len(api.connections) == 1
+
+
+def test_client_errors_are_not_retried(server):
+    api = FakeFirecrawl()
+    api.failures = [(401, {})]
+    sleeps = []
+    provider = make_provider(server(api), sleeps)
+
+    with pytest.raises(FirecrawlError) as error:
+        provider.scrape("https://site.example/")
+    assert error.value.status == 401
+    assert len(api.requests) == 1 and sleeps == []
+
+
+def test_crawl_streams_pages_as_the_job_progresses(server):
+    api = FakeFirecrawl(total_pages=8, pages_per_poll=3, idle_polls=2)
+    sleeps = []
+    provider = make_provider(server(api), sleeps, max_pages=50)
+
+    pages = provider.scrape_iter("https://site.example/", depth=3)
+    first = next(pages)
+    # The first page arrives while the job is still running.
+    assert first["url"] == "https://site.example/page-0"
+    assert api.done < api.total_pages
+
+    urls = [first["url"]] + [page["url"] for page in pages]
+    assert urls == [f"https://site.example/page-{index}" for index in range(8)]
+    assert api.crawl_request["maxDiscoveryDepth"] == 2 and api.crawl_request["limit"] == 50
+    # Backs off while the job has nothing new, polls eagerly while pages flow.
+    assert sleeps == [2, 4, 1, 1]
+    assert api.cancelled == []
+    assert len(api.connections) == 1
+
+
+def test_closing_the_stream_cancels_the_crawl(server):
+    api = FakeFirecrawl(total_pages=8, pages_per_poll=2)
+    provider = make_provider(server(api), [])
+
+    pages = provider.scrape_iter("https://site.example/", depth=2)
+    next(pages)
+    pages.close()
+
+    assert api.cancelled == ["job-1"]
+
+
+def test_failed_crawl_raises(server):
+    api = FakeFirecrawl(total_pages=2, status="failed")
+    provider = make_provider(server(api), [])
+
+    with pytest.raises(FirecrawlError, match="failed"):
+        provider.scrape("https://site.example/", depth=2)
+    assert api.cancelled == []
@@ -0,0 +1,46 @@
+"""
+Tests for grouped (per-page) search.
+"""
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.processing.batch import ChunkBatch
+from app.storage.qdrant_client import QdrantStorage, build_context_windows
+
+
+@pytest.fixture
+def storage():
+    storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=2)
+    # Chunk i of each page points at angle i, so chunks near angle 0 match the query best.
+    for url, offset in (("https://a.example/", 0.0), ("https://b.example/", 0.05)):
+        texts = [f"{url} chunk {i}" for i in range(6)]
+        angles = offset + np.array([0.0, 0.1, 0.2, 1.2, 1.3, 1.4])
+        vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype(np.float32)
+        storage.store_embeddings(ChunkBatch.from_texts(texts, {"url": url, "title": url}), vectors)
+    return storage
+
+
+def test_groups_pages_and_stitches_consecutive_hits(storage):
+    pages = storage.search_pages([1.0, 0.0], groups=2, group_size=2)
+
+    assert [page["url"] for page in pages] == ["https://a.example/", "https://b.example/"]
+    first = pages[0]
+    assert sorted(hit["chunk_index"] for hit in first["chunks"]) == [0, 1]
+    assert len(first["windows"]) == 1
+    assert (first["windows"][0]["start_chunk"], first["windows"][0]["end_chunk"]) == (0, 1)
+    assert first["windows"][0]["text"] == "https://a.example/ chunk 0\n\nhttps://a.example/ chunk 1"
+
+
+def test_context_chunks_fetch_neighbours(storage):
+    pages = storage.search_pages([1.0, 0.0], groups=1, group_size=1, context_chunks=1, timeout=0.5)
+
+    window = pages[0]["windows"][0]
+    assert (window["start_chunk"], window["end_chunk"]) == (0, 1)
+    assert window["score"] == pytest.approx(pages[0]["score"])
+
+
+def test_unstitched_windows_keep_neighbours_separate():
+    windows = build_context_windows({3: "c", 4: "d"}, {4: 0.8}, stitch=False)
+
+    assert [(w["start_chunk"], w["score"]) for w in windows] == [(3, None), (4, 0.8)]
@@ -0,0 +1,116 @@
+"""
+Tests for the hedged, failover embedding provider.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.processing.embeddings import get_embedding_provider
+from app.processing.fakes import FakeEmbeddings
+from app.processing.hedging import CircuitBreaker, HedgedEmbeddings
+
+
+def test_hedged_request_returns_fastest_answer():
+    """A slow primary is hedged and the faster secondary answer wins."""
+    slow = FakeEmbeddings(dimension=4, latency=0.5)
+    fast = FakeEmbeddings(dimension=4)
+    provider = HedgedEmbeddings([slow, fast], hedge_delay=0.02)
+
+    start = time.monotonic()
+    embeddings = provider.get_embeddings(["hello"])
+
+    assert time.monotonic() - start < 0.4
+    assert embeddings == fast.get_embeddings(["hello"])
+    assert slow.calls == 1
+
+
+
+def test_concurrent_calls_are_not_hedged_for_time_spent_queueing():
+    """Under load, every primary call starts at once, so none waits out the hedge delay."""
+    primary = FakeEmbeddings(dimension=4, latency=0.1)
+    secondary = FakeEmbeddings(dimension=4)
+    provider = HedgedEmbeddings([primary, secondary], hedge_delay=0.3)
+
+    threads = [threading.Thread(target=provider.get_embeddings, args=([f"text {i}"],)) for i in range(48)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert primary.calls == 48
+    assert secondary.calls == 0
+
+def test_failover_on_error():
+    """A failing primary fails over to the next provider without waiting for the hedge delay."""
+    broken = FakeEmbeddings(dimension=4, failure_rate=1.0)
+    healthy = FakeEmbeddings(dimension=4)
+    provider = HedgedEmbeddings([broken, healthy], hedge_delay=5)
+
+    start = time.monotonic()
+    assert provider.get_embeddings(["a", "b"]) == healthy.get_embeddings(["a", "b"])
+    assert time.monotonic() - start < 1
+
+
+def test_circuit_breaker_skips_failing_provider():
+    """Once the breaker opens, the failing provider is no longer called."""
+    broken = FakeEmbeddings(dimension=4, failure_rate=1.0)
+    healthy = FakeEmbeddings(dimension=4)
+    provider = HedgedEmbeddings([broken, healthy], hedge_delay=0, failure_threshold=2, reset_timeout=60)
+
+    for _ in range(5):
+        provider.get_embeddings(["text"])
+
+    assert broken.calls == 2
+    assert provider.health()[0]["state"] == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_half_open_trial():
+    """After the reset timeout a single trial request is allowed through."""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure(ConnectionError("down"))
+
+    assert not breaker.allow_request()
+    now[0] = 11
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cache_serves_when_all_providers_fail():
+    """Previously embedded texts are served from cache during an outage."""
+    primary = FakeEmbeddings(dimension=4)
+    provider = HedgedEmbeddings([primary], hedge_delay=0, cache_size=10)
+    expected = provider.get_embeddings(["cached"])
+
+    primary.failure_rate = 1.0
+    assert np.allclose(provider.get_embeddings(["cached"]), expected)
+    with pytest.raises(ConnectionError):
+        provider.get_embeddings(["not cached"])
+
+
+def test_incompatible_models_are_rejected():
+    """Providers producing different embedding spaces cannot be combined."""
+    with pytest.raises(ValueError):
+        HedgedEmbeddings([FakeEmbeddings(model="a"), FakeEmbeddings(model="b")])
+
+
+def test_configured_fallbacks_must_serve_the_primary_model():
+    models = {"openai@http://tei-1:8080/v1": "bge-small", "openai@http://tei-2:8080/v1": "bge-small", "huggingface": "minilm"}
+
+    def create(name, model=None):
+        return FakeEmbeddings(dimension=4, model=models[name])
+
+    with patch("app.processing.embeddings._create_provider", side_effect=create), \
+            patch("app.processing.embeddings.EMBEDDING_PROVIDER", "openai@http://tei-1:8080/v1"):
+        with patch("app.processing.embeddings.EMBEDDING_FALLBACK_PROVIDERS", "openai@http://tei-2:8080/v1"):
+            provider = get_embedding_provider()
+        with patch("app.processing.embeddings.EMBEDDING_FALLBACK_PROVIDERS", "openai@http://tei-2:8080/v1,huggingface"):
+            with pytest.raises(ValueError, match="EMBEDDING_FALLBACK_PROVIDERS entry 'huggingface'"):
+                get_embedding_provider()
+
+    assert isinstance(provider, HedgedEmbeddings) and len(provider.providers) == 2
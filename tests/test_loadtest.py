@@ -0,0 +1,62 @@
+"""
+Tests for the load-testing harness.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from app.scraper.fake import FakeScraperProvider
+from benchmarks.loadtest import Recorder, TrafficMix, parse_mix
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_traffic_mix_deletes_ingested_sites():
+    mix = TrafficMix(parse_mix("ingest=1,delete=1"), seed=1)
+
+    ingest = mix.request("ingest")
+    delete = mix.request("delete")
+
+    assert delete["params"]["url"] == ingest["json"]["url"]
+    assert mix.request("delete")["params"]["url"] == "https://missing.example.com/"
+
+
+def test_recorder_percentiles_only_count_successes():
+    recorder = Recorder()
+    for i in range(1, 101):
+        recorder.record("search", 200, i / 1000)
+    recorder.record("search", 429, 0.0)
+
+    report = recorder.report(duration=10)["search"]
+
+    assert (report["sent"], report["ok"], report["errors"]) == (101, 100, 1)
+    assert (report["p50_ms"], report["p99_ms"]) == (50, 99)
+    assert report["statuses"] == {"200": 100, "429": 1}
+
+
+def test_fake_scraper_is_deterministic():
+    scraper = FakeScraperProvider(pages=2)
+
+    assert scraper.scrape("https://a.example/", depth=2) == scraper.scrape("https://a.example/", depth=2)
+    assert len(scraper.scrape("https://a.example/", depth=1)) == 1
+
+
+def test_in_process_run_reports_every_endpoint(tmp_path):
+    output = tmp_path / "results.json"
+    env = dict(os.environ, QDRANT_URL=":memory:", LOADTEST_EMBED_LATENCY_MS="0")
+    subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.loadtest",
+            "--rates", "20", "--duration", "1", "--warmup-sites", "2", "--output", str(output)
+        ],
+        cwd=ROOT, env=env, check=True, capture_output=True, timeout=120
+    )
+
+    steps = json.loads(output.read_text())["steps"]
+
+    assert [step["rate"] for step in steps] == [20]
+    endpoints = steps[0]["endpoints"]
+    assert set(endpoints) <= {"search", "ingest", "delete"}
+    assert "search" in endpoints
+    assert all(stats["errors"] == 0 for stats in endpoints.values())
@@ -0,0 +1,123 @@
+"""
+Tests for token-budget batch packing in the OpenAI embeddings provider.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.deadline import Deadline
+from app.processing.embeddings import OpenAIEmbeddings
+
+
+class WordTokenizer:
+    """Tokenizer stand-in where every whitespace-separated word is one token."""
+
+    def __init__(self):
+        self.batch_encodes = 0
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.batch_encodes += 1
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class FakeEmbeddingsAPI:
+    """Records requests and returns [number of words, 1.0] for each input, out of order."""
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, input, encoding_format=None):
+        with self._lock:
+            self.requests.append(list(input))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(random.uniform(0.01, 0.03))
+        with self._lock:
+            self.in_flight -= 1
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text.split())), 1.0])
+            for i, text in enumerate(input)
+        ]
+        random.shuffle(data)
+        return SimpleNamespace(data=data)
+
+
+def make_provider(**kwargs):
+    provider = OpenAIEmbeddings(api_key="test", tokens_per_minute=0, **kwargs)
+    provider._tokenizer = WordTokenizer()
+    provider.client = SimpleNamespace(embeddings=FakeEmbeddingsAPI())
+    return provider
+
+
+def test_batches_are_packed_by_tokens_and_inputs():
+    """Requests stay within the token and input limits and results keep input order."""
+    provider = make_provider(max_tokens_per_request=10, max_inputs_per_request=3, concurrency=4)
+    texts = [" ".join(["word"] * n) for n in [4, 4, 4, 1, 1, 1, 1, 9, 2]]
+
+    embeddings = provider.get_embeddings(texts)
+
+    api = provider.client.embeddings
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [4, 4, 4, 1, 1, 1, 1, 9, 2]
+    for request in api.requests:
+        assert len(request) <= 3
+        assert sum(len(text.split()) for text in request) <= 10
+    assert api.max_in_flight > 1
+
+
+def test_token_counts_from_chunking_are_reused():
+    """Known token counts skip re-tokenizing the inputs."""
+    provider = make_provider()
+    provider.get_embeddings(["a b", "c"], token_counts=[2, 1])
+
+    assert provider.tokenizer.batch_encodes == 0
+
+
+def test_long_inputs_are_split_and_averaged():
+    """Inputs above the per-input limit are embedded in pieces and combined."""
+    provider = make_provider(max_input_tokens=4)
+
+    embeddings = provider.get_embeddings(["one two three four five six", "short"])
+
+    # Pieces of 4 and 2 words give [4, 1] and [2, 1], averaged with weights 4 and 2.
+    expected = np.average([[4, 1], [2, 1]], axis=0, weights=[4, 2])
+    assert np.allclose(embeddings[0], expected / np.linalg.norm(expected))
+    assert embeddings[1].tolist() == [1.0, 1.0]
+
+
+def test_long_inputs_can_be_truncated():
+    """In truncate mode only the first max_input_tokens tokens are embedded."""
+    provider = make_provider(max_input_tokens=4, long_input_mode="truncate")
+
+    embeddings = provider.get_embeddings(["one two three four five six"])
+
+    assert embeddings.tolist() == [[4.0, 1.0]]
+
+
+def test_requests_in_a_deadline_stage_use_its_time_left_as_timeout():
+    provider = make_provider()
+    create = provider.client.embeddings.create
+    timeouts = []
+
+    def create_with_timeout(timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return create(**kwargs)
+
+    provider.client.embeddings.create = create_with_timeout
+    provider.get_embeddings(["outside a search"])
+    Deadline(5.0).run("embed_query", lambda: provider.get_embeddings(["inside a search"]))
+
+    assert timeouts[0] is None
+    assert 0 < timeouts[1] <= 5.0
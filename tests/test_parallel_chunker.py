@@ -0,0 +1,20 @@
+"""
+Tests for parallel chunking.
+"""
+from app.processing.chunker import TextChunker
+from app.processing.parallel import ParallelChunker
+
+
+def test_parallel_chunker_matches_sequential_order():
+    """Chunks come back per document, in input order, identical to TextChunker."""
+    documents = [
+        (f"Paragraph one of doc {i}.\n\nParagraph two of doc {i}.", {"url": f"https://example.com/{i}"})
+        for i in range(25)
+    ]
+    chunker = TextChunker(max_chunk_size=30, strategy="paragraph")
+    expected = [chunker.chunk_text(text, metadata) for text, metadata in documents]
+
+    with ParallelChunker(workers=2, batch_size=4, max_chunk_size=30, strategy="paragraph") as parallel:
+        results = [batch.to_dicts() for batch in parallel.chunk_documents(iter(documents))]
+
+    assert results == expected
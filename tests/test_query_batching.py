@@ -0,0 +1,148 @@
+"""
+Tests for micro-batching of query embeddings.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.deadline import Deadline, DeadlineExceeded
+from app.knowledge_base import KnowledgeBase
+from app.processing.batching import BatcherClosed, MicroBatchingEmbeddings
+from app.processing.fakes import FakeEmbeddings
+
+
+def _run_concurrently(batcher, queries):
+    results = {}
+    barrier = threading.Barrier(len(queries))
+
+    def search(query):
+        barrier.wait()
+        results[query] = batcher.get_embeddings([query])[0]
+
+    threads = [threading.Thread(target=search, args=(query,)) for query in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_queries_share_batches():
+    """Concurrent single-text calls are embedded in fewer, larger batches."""
+    fake = FakeEmbeddings(dimension=16, latency=0.01)
+    batcher = MicroBatchingEmbeddings(fake, max_batch_size=8, max_wait=0.005)
+    queries = [f"query {i}" for i in range(16)]
+
+    results = _run_concurrently(batcher, queries)
+    batcher.close()
+
+    assert fake.calls < len(queries)
+    assert max(fake.batch_sizes) <= 8
+    for query in queries:
+        np.testing.assert_allclose(results[query], fake.embed_text(query), rtol=1e-6)
+
+
+def test_large_requests_bypass_the_queue():
+    """Batches bigger than max_batch_size go straight to the provider."""
+    fake = FakeEmbeddings(dimension=8)
+    batcher = MicroBatchingEmbeddings(fake, max_batch_size=2)
+
+    embeddings = batcher.get_embeddings(["a", "b", "c"])
+
+    assert fake.batch_sizes == [3]
+    assert len(embeddings) == 3
+    assert batcher._worker is None
+
+
+def test_provider_errors_reach_every_caller():
+    fake = FakeEmbeddings(dimension=8, failure_rate=1.0)
+    batcher = MicroBatchingEmbeddings(fake, max_batch_size=4, max_wait=0.001)
+
+    with pytest.raises(ConnectionError):
+        batcher.get_embeddings(["query"])
+    batcher.close()
+
+
+def test_empty_input_returns_an_empty_matrix():
+    batcher = MicroBatchingEmbeddings(FakeEmbeddings(dimension=8))
+    embeddings = batcher.get_embeddings([])
+    assert isinstance(embeddings, np.ndarray) and len(embeddings) == 0
+
+
+def test_closing_while_queries_are_in_flight_answers_every_caller():
+    """Closing the batcher, as a reindex swap does, never strands a caller."""
+    fake = FakeEmbeddings(dimension=8, latency=0.005)
+    batcher = MicroBatchingEmbeddings(fake, max_batch_size=4, max_wait=0.002)
+    results = {}
+
+    def search(query):
+        for round in range(20):
+            results[(query, round)] = batcher.get_embeddings([f"{query} {round}"])[0]
+
+    threads = [threading.Thread(target=search, args=(f"query {i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    batcher.get_embeddings(["warm up"])
+    batcher.close()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(results) == 160
+    for (query, round), embedding in results.items():
+        np.testing.assert_allclose(embedding, fake.embed_text(f"{query} {round}"), rtol=1e-6)
+
+
+def test_requests_left_behind_the_sentinel_are_failed_on_close():
+    batcher = MicroBatchingEmbeddings(FakeEmbeddings(dimension=8))
+    batcher.get_embeddings(["start the worker"])
+    late = Future()
+    batcher._queue.put(None)
+    batcher._queue.put(("late", late))
+
+    batcher.close()
+
+    with pytest.raises(BatcherClosed):
+        late.result(timeout=1)
+
+
+def test_waiting_for_the_batch_is_bounded_by_the_deadline_stage():
+    """A search stage gives up on its query once its time is up, and it is not embedded later."""
+    fake = FakeEmbeddings(dimension=8, latency=0.3)
+    batcher = MicroBatchingEmbeddings(fake, max_batch_size=4, max_wait=0.001)
+    busy = threading.Thread(target=batcher.get_embeddings, args=(["occupies the worker"],))
+    busy.start()
+    time.sleep(0.05)
+    waited = []
+
+    def stage():
+        start = time.monotonic()
+        try:
+            batcher.get_embeddings(["late query"])
+        finally:
+            waited.append(time.monotonic() - start)
+
+    # Whichever of the stage and its caller notices first reports the timeout.
+    with pytest.raises((DeadlineExceeded, TimeoutError)):
+        Deadline(0.1).run("embed_query", stage)
+    busy.join()
+    batcher.close()
+
+    assert len(waited) == 1 and waited[0] < 0.2
+    assert fake.batch_sizes == [1]
+
+
+def test_only_batching_providers_get_a_query_batcher():
+    """Providers that embed one text per request are called directly."""
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.embedder = FakeEmbeddings(dimension=8)
+    assert kb.query_embedder is kb.embedder
+
+    kb.embedder.batches_texts = True
+    assert isinstance(kb.query_embedder, MicroBatchingEmbeddings)
+    kb.query_embedder.close()
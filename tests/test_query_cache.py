@@ -0,0 +1,108 @@
+"""
+Tests for the semantic query cache.
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.knowledge_base import KnowledgeBase
+from app.processing.fakes import FakeEmbeddings
+from app.query_cache import SemanticQueryCache, cache_scope
+from app.scraper.fake import FakeScraperProvider
+from app.storage.qdrant_client import QdrantStorage
+
+SCOPE = cache_scope("search", None, None, filters=None)
+RESULTS = [{"url": "https://a.example/", "text": "a"}, {"url": "https://b.example/", "text": "b"}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def angle(radians):
+    return [np.cos(radians), np.sin(radians)]
+
+
+def test_similar_queries_in_the_same_scope_hit():
+    cache = SemanticQueryCache(capacity=4, threshold=0.99)
+    cache.put(angle(0.0), SCOPE, 2, RESULTS)
+
+    assert cache.get(angle(0.05), SCOPE, 2) == RESULTS
+    assert cache.get(angle(0.05), SCOPE, 1) == RESULTS[:1]
+    assert cache.get(angle(0.5), SCOPE, 2) is None
+    assert cache.get(angle(0.0), SCOPE, 3) is None
+    assert cache.get(angle(0.0), cache_scope("search", "t1", None, filters=None), 2) is None
+
+
+def test_entries_expire_and_least_recently_used_is_evicted():
+    clock = Clock()
+    cache = SemanticQueryCache(capacity=2, threshold=0.99, ttl=10, clock=clock)
+    cache.put(angle(0.0), SCOPE, 2, RESULTS)
+    clock.now = 1
+    cache.put(angle(1.0), SCOPE, 2, RESULTS)
+    clock.now = 2
+    assert cache.get(angle(0.0), SCOPE, 2) is not None
+
+    clock.now = 3
+    cache.put(angle(2.0), SCOPE, 2, RESULTS)
+    assert cache.get(angle(1.0), SCOPE, 2) is None
+    assert cache.get(angle(0.0), SCOPE, 2) is not None
+
+    clock.now = 20
+    assert cache.get(angle(0.0), SCOPE, 2) is None
+    assert len(cache) == 0
+
+
+def test_invalidation_follows_ingested_and_deleted_urls():
+    cache = SemanticQueryCache(capacity=8, threshold=0.99)
+    tenant_scope = cache_scope("search", "t1", None, filters=None)
+    filtered_scope = cache_scope("search", None, "https://c.example/", filters=None)
+    cache.put(angle(0.0), SCOPE, 2, RESULTS)
+    cache.put(angle(0.0), tenant_scope, 2, RESULTS, tenant_id="t1")
+    cache.put(angle(0.0), filtered_scope, 2, [], url_filter="https://c.example/")
+
+    # Deleting a URL nobody returned changes nothing.
+    assert cache.invalidate(["https://z.example/"], added=False) == 0
+    assert cache.invalidate(["https://a.example/"], tenant_id="t2", added=False) == 1
+    assert cache.get(angle(0.0), SCOPE, 2) is None
+    assert cache.get(angle(0.0), tenant_scope, 2) is not None
+
+    # New content may match any query of the tenant that can reach it.
+    generation = cache.generation
+    assert cache.invalidate(["https://d.example/"], tenant_id="t1") == 1
+    assert cache.get(angle(0.0), filtered_scope, 2) is not None
+
+    # Results computed before the invalidation are not cached.
+    cache.put(angle(0.0), SCOPE, 2, RESULTS, generation=generation)
+    assert cache.get(angle(0.0), SCOPE, 2) is None
+
+
+@pytest.fixture
+def kb():
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.scraper = FakeScraperProvider(pages=1, paragraphs=4)
+    kb.embedder = FakeEmbeddings(dimension=8)
+    kb.storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=8)
+    kb.spool = None
+    kb.query_cache = SemanticQueryCache(capacity=16, threshold=0.99)
+    return kb
+
+
+def test_search_skips_qdrant_until_ingestion_invalidates(kb):
+    kb.process_website("https://a.example/")
+    search = kb.storage.search
+    with patch.object(kb.storage, "search", side_effect=search) as storage_search:
+        first = kb.search("vector search latency", limit=3)
+        assert kb.search("vector search latency", limit=2) == first[:2]
+        assert storage_search.call_count == 1
+
+        kb.process_website("https://b.example/")
+        kb.search("vector search latency", limit=3)
+        assert storage_search.call_count == 2
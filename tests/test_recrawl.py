@@ -0,0 +1,122 @@
+"""
+Tests for change-rate-aware re-crawl scheduling.
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.knowledge_base import KnowledgeBase
+from app.processing.fakes import FakeEmbeddings
+from app.recrawl import RecrawlScheduler, estimate_change_rates
+from app.scraper.base import ScraperProvider
+from app.storage.qdrant_client import QdrantStorage
+
+HOUR = 3600
+STATIC = [f"https://docs.example/page-{index}" for index in range(10)]
+VOLATILE = ["https://news.example/", "https://news.example/live"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Site(ScraperProvider):
+    """Pages whose content the test edits, counting fetches per URL."""
+
+    def __init__(self):
+        self.content = {}
+        self.fetches = {}
+
+    def scrape(self, url, depth=1, parse_js=False):
+        self.fetches[url] = self.fetches.get(url, 0) + 1
+        return [{"url": url, "title": "Page", "text": self.content[url]}]
+
+
+@pytest.fixture
+def kb(tmp_path):
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.scraper = Site()
+    kb.embedder = FakeEmbeddings(dimension=8)
+    kb.storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=8)
+    kb.spool = None
+    kb.query_cache = None
+    kb.clock = Clock()
+    kb.recrawl = RecrawlScheduler(
+        kb, str(tmp_path / "recrawl.db"),
+        pages_per_hour=4, chunks_per_hour=0, interval=HOUR,
+        min_staleness=0.3, min_interval=0, default_change_days=1, clock=kb.clock
+    )
+    return kb
+
+
+def test_change_rate_estimates_follow_the_check_history():
+    prior = 1 / 86400
+    rates = estimate_change_rates([0, 20, 20, 20], [0, 0, 10, 20], [0, 20 * HOUR, 20 * HOUR, 20 * HOUR], prior)
+
+    assert rates[0] == pytest.approx(prior)
+    # Never changed in 20 checks: much slower than the prior.
+    assert rates[1] < prior / 5
+    # Changed at every hourly check: at least once an hour, more than the naive count suggests.
+    assert rates[3] > 1 / HOUR > rates[2] > 0.5 / HOUR
+    assert np.all(np.isfinite(rates))
+
+
+def test_recrawls_concentrate_on_pages_that_change(kb):
+    site, clock = kb.scraper, kb.clock
+    for url in STATIC + VOLATILE:
+        site.content[url] = f"Content of {url}. It talks about vector search."
+        kb.process_website(url)
+
+    summaries = []
+    for hour in range(48):
+        if hour == 24:
+            first_day = dict(site.fetches)
+        for url in VOLATILE:
+            site.content[url] = f"Breaking news at hour {hour} from {url}."
+        clock.now += HOUR
+        summaries.append(kb.recrawl.run_pass())
+
+    # The budget refills 4 pages per hour and saves up at most two passes' worth.
+    assert all(summary["pages_checked"] <= 8 for summary in summaries)
+    # Once the change rates are learned, the news pages are re-crawled every
+    # hour and the docs pages about once a day.
+    assert all(site.fetches[url] - first_day[url] == 24 for url in VOLATILE)
+    assert all(site.fetches[url] - first_day[url] <= 2 for url in STATIC)
+    volatile_fetches = sum(site.fetches[url] - 1 for url in VOLATILE)
+    static_fetches = sum(site.fetches[url] - 1 for url in STATIC)
+
+    report = kb.recrawl.report(window_hours=48)
+    assert report["pages"] == 12
+    assert report["spent"]["pages_checked"] == volatile_fetches + static_fetches
+    # Only the volatile pages were re-embedded.
+    assert report["spent"]["pages_changed"] == volatile_fetches
+    assert report["spent"]["change_yield"] > 0.6
+    assert 0 < report["freshness"] <= 1
+    assert len(report["recent_passes"]) == 24
+
+    assert [chunk["text"] for chunk in kb.storage.page_chunks(VOLATILE[0])] == [
+        f"Breaking news at hour 47 from {VOLATILE[0]}."
+    ]
+
+
+def test_shorter_page_drops_its_trailing_chunks(kb):
+    url = STATIC[0]
+    kb.scraper.content[url] = "\n\n".join(f"Paragraph {index}. " + "word " * 300 for index in range(6))
+    kb.process_website(url)
+    before = len(kb.storage.page_chunks(url))
+
+    kb.scraper.content[url] = "Only a short paragraph is left."
+    page = kb.recrawl.tracked()[0]
+    result = kb.refresh_page(url, page.fingerprint)
+
+    assert before > 1
+    assert result["changed"] and result["chunks"] == 1
+    assert [chunk["text"] for chunk in kb.storage.page_chunks(url)] == ["Only a short paragraph is left."]
+    assert kb.refresh_page(url, result["fingerprint"])["changed"] is False
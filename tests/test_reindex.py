@@ -0,0 +1,219 @@
+"""
+Tests for blue/green reindexing through a collection alias.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from app.knowledge_base import KnowledgeBase
+from app.processing.fakes import FakeEmbeddings
+from app.processing.ratelimit import TokenBucket
+from app.reindex import Reindexer, page_sections
+from app.scraper.fake import FakeScraperProvider
+from app.storage.qdrant_client import QdrantStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def kb():
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.scraper = FakeScraperProvider(pages=3, paragraphs=6)
+    kb.embedder = FakeEmbeddings(dimension=8, model="old-model")
+    kb.storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=8)
+    kb.spool = None
+    kb.query_cache = None
+    kb.process_website("https://a.example/", depth=2)
+    return kb
+
+
+def urls(results):
+    return {result["url"] for result in results}
+
+
+def test_page_sections_undo_chunk_overlap():
+    chunks = [
+        {"chunk_index": 0, "title": "Intro", "text": "alpha beta gamma delta epsilon zeta eta theta iota kappa"},
+        {"chunk_index": 1, "title": "Intro", "text": "eta theta iota kappa lambda mu nu xi omicron pi rho"},
+        {"chunk_index": 2, "title": "Usage", "text": "run it"}
+    ]
+    sections = page_sections(chunks)
+    assert [section["title"] for section in sections] == ["Intro", "Usage"]
+    assert sections[0]["text"].startswith("alpha beta")
+    assert sections[0]["text"].endswith("omicron pi rho")
+
+
+def test_reindex_swaps_alias_after_dual_writing_new_ingests(kb):
+    clock = Clock()
+    waits = []
+    during = {}
+
+    def sleep(seconds):
+        waits.append(seconds)
+        clock.now += seconds
+        if len(waits) == 1:
+            # Live traffic while the new generation is being built.
+            during["search"] = kb.search("vector search latency", limit=10)
+            kb.process_website("https://b.example/")
+            kb.delete_website("https://a.example/page-2")
+
+    kb.reindexer = Reindexer(kb, rate_limiter=TokenBucket(60, capacity=1, clock=clock, sleep=sleep))
+    new_embedder = FakeEmbeddings(dimension=12, model="new-model")
+    status = kb.reindexer.start(
+        embedder=new_embedder, chunking_strategy="sentence", max_chunk_size=200, chunk_overlap=20, background=False
+    )
+
+    assert during["search"] and kb.storage.collection_name == "kb__v1"
+    assert status["state"] == "active"
+    assert status["pages_total"] == 3 and status["pages_done"] == 3
+    assert status["progress"] == 1.0 and status["rechunk"]
+    # Throttled to one chunk per second once the burst is spent.
+    assert sum(waits) == pytest.approx(status["chunks_done"] - 1, abs=1)
+
+    assert kb.storage.alias_target() == "kb__v1"
+    assert kb.embedder is new_embedder
+    assert kb.chunker.max_chunk_size == 200
+    results = kb.search("vector search latency", limit=50)
+    assert urls(results) == {"https://a.example/", "https://a.example/page-1", "https://b.example/"}
+    assert max(len(result["text"]) for result in results) < 250  # re-chunked from ~1000 characters
+
+    # Another worker opening the alias gets the new generation.
+    other = QdrantStorage(client=kb.storage.client, collection_name="kb", vector_size=12)
+    assert other.collection_name == "kb__v1"
+
+
+def test_second_reindex_moves_alias_and_drops_previous(kb):
+    kb.reindexer = Reindexer(kb, chunks_per_minute=0, keep_previous=False, sleep=lambda seconds: None)
+    kb.reindexer.start(embedder=FakeEmbeddings(dimension=12, model="new-model"), background=False)
+    kb.reindexer.start(embedder=FakeEmbeddings(dimension=16, model="newer-model"), background=False)
+
+    names = {collection.name for collection in kb.storage.client.get_collections().collections}
+    assert kb.storage.alias_target() == "kb__v2"
+    assert "kb__v1" not in names
+    assert len(kb.search("vector search latency", limit=3)) == 3
+
+
+def test_cancelled_reindex_keeps_live_generation(kb):
+    def sleep(seconds):
+        if kb.reindexer.status()["state"] == "building":
+            kb.reindexer.cancel()
+
+    kb.reindexer = Reindexer(kb, rate_limiter=TokenBucket(60, capacity=1, sleep=sleep))
+    status = kb.reindexer.start(embedder=FakeEmbeddings(dimension=12, model="new-model"), background=False)
+
+    names = {collection.name for collection in kb.storage.client.get_collections().collections}
+    assert status["state"] == "cancelled"
+    assert "kb__v1" not in names
+    assert kb.storage.collection_name == "kb__v0" and kb.storage.alias_target() == "kb__v0"
+    assert len(kb.search("vector search latency", limit=3)) == 3
+    with pytest.raises(ValueError):
+        kb.reindexer.cancel()
+
+
+def test_queries_wait_for_a_generation_switch_instead_of_re_embedding(kb):
+    old_embedder, new_embedder = kb.embedder, FakeEmbeddings(dimension=12, model="new-model")
+    old_calls = old_embedder.calls
+    target = kb.storage.create_generation(1, 12)
+    # Searches do not take part in syncing, which would also wait for the lock.
+    kb._generation_synced_at = float("inf")
+    switching = threading.Event()
+    results = {}
+
+    def switch():
+        with kb._generation_lock:
+            kb._generation += 1
+            switching.set()
+            # Rebuilding the parallel chunker can take this long.
+            time.sleep(0.3)
+            kb.storage, kb.embedder = target, new_embedder
+            kb._generation += 1
+
+    def search():
+        switching.wait()
+        results["search"] = kb.search("vector search latency", limit=3)
+
+    threads = [threading.Thread(target=switch), threading.Thread(target=search)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The query was embedded once, by the new model, and searched the new (empty) generation.
+    assert old_embedder.calls == old_calls and new_embedder.calls == 1
+    assert results["search"] == []
+
+
+def test_pre_alias_collection_is_migrated_before_reindexing():
+    client = QdrantClient(location=":memory:")
+    for name in ("kb", "kb__tenant_acme"):
+        client.create_collection(name, vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    client.upsert("kb", points=[PointStruct(id=i, vector=[1.0] * 8, payload={"url": f"https://a.example/{i}"}) for i in range(5)])
+    client.upsert("kb__tenant_acme", points=[PointStruct(id=9, vector=[1.0] * 8, payload={"tenant_id": "acme"})])
+
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.embedder = FakeEmbeddings(dimension=8, model="old-model")
+    kb.storage = QdrantStorage(client=client, collection_name="kb", vector_size=8)
+    kb.spool = None
+    kb.query_cache = None
+    kb.reindexer = Reindexer(kb, chunks_per_minute=0, sleep=lambda seconds: None)
+    assert kb.storage.collection_name == "kb" and kb.storage.alias_target() is None
+    with pytest.raises(ValueError):
+        kb.reindexer.start(embedder=FakeEmbeddings(dimension=12, model="new-model"), background=False)
+
+    assert kb.migrate_to_alias() == {"collection": "kb__v0", "points": 6}
+    names = {collection.name for collection in client.get_collections().collections}
+    assert {"kb__v0", "kb__v0__tenant_acme"} <= names and "kb__tenant_acme" not in names
+    assert kb.storage.alias_target() == "kb__v0" and client.count("kb").count == 5
+    assert kb.storage._is_dedicated("acme")
+    with pytest.raises(ValueError):
+        kb.migrate_to_alias()
+
+    # The first reindex now swaps the alias and keeps the migrated generation to roll back to.
+    kb.reindexer.start(embedder=FakeEmbeddings(dimension=12, model="new-model"), background=False)
+    names = {collection.name for collection in client.get_collections().collections}
+    assert kb.storage.alias_target() == "kb__v1" and "kb__v0" in names
+
+
+def test_drop_all_removes_every_generation_behind_the_alias(kb):
+    kb.reindexer = Reindexer(kb, chunks_per_minute=0, sleep=lambda seconds: None)
+    kb.reindexer.start(embedder=FakeEmbeddings(dimension=12, model="new-model"), background=False)
+    client = kb.storage.client
+    client.create_collection("kb_other", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+
+    kb.storage.drop_all()
+
+    assert [collection.name for collection in client.get_collections().collections] == ["kb_other"]
+    assert kb.storage.alias_target() is None
+    recreated = QdrantStorage(client=client, collection_name="kb", vector_size=8)
+    assert recreated.alias_target() == "kb__v0" and client.count("kb").count == 0
+
+
+def test_every_collection_gets_the_chunk_index_index(kb):
+    """Generations and dedicated tenant collections are indexed like the live collection."""
+    indexed = []
+    create_payload_index = kb.storage.client.create_payload_index
+
+    def record(collection_name, field_name, **kwargs):
+        indexed.append((collection_name, field_name))
+        return create_payload_index(collection_name=collection_name, field_name=field_name, **kwargs)
+
+    kb.storage.client.create_payload_index = record
+    kb.storage.promote_tenant("acme", cleanup_delay=0)
+    kb.storage.create_generation(1, vector_size=8)
+    QdrantStorage(client=kb.storage.client, collection_name="kb", vector_size=8)
+
+    assert {name for name, field in indexed if field == "chunk_index"} == {
+        "kb__v0__tenant_acme", "kb__v1", "kb__v1__tenant_acme", "kb__v0"
+    }
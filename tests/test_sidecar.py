@@ -0,0 +1,96 @@
+"""
+Tests for the embedding sidecar and its client.
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.deadline import Deadline, DeadlineExceeded
+from app.processing.fakes import FakeEmbeddings
+from app.processing.sidecar import SidecarEmbeddings, SidecarServer
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    fake = FakeEmbeddings(dimension=32, model="fake-sidecar")
+    server = SidecarServer(str(tmp_path / "embeddings.sock"), fake)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield fake, str(tmp_path / "embeddings.sock")
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_returns_provider_embeddings(sidecar):
+    fake, socket_path = sidecar
+    client = SidecarEmbeddings(socket_path, timeout=5)
+
+    embeddings = client.get_embeddings(["alpha", "beta"])
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.shape == (2, 32)
+    np.testing.assert_array_equal(embeddings[1], fake.embed_text("beta"))
+    assert client.model_id == "fake-sidecar"
+
+
+def test_connections_are_reused_per_thread(sidecar):
+    fake, socket_path = sidecar
+    client = SidecarEmbeddings(socket_path, timeout=5)
+    results = []
+
+    def worker(i):
+        for j in range(5):
+            results.append(client.get_embeddings([f"text {i} {j}"]).shape)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [(1, 32)] * 20
+
+
+def test_provider_errors_are_reported(sidecar):
+    fake, socket_path = sidecar
+    fake.failure_rate = 1.0
+    client = SidecarEmbeddings(socket_path, timeout=5)
+
+    with pytest.raises(ValueError, match="Injected failure"):
+        client.get_embeddings(["alpha"])
+
+    fake.failure_rate = 0.0
+    assert client.get_embeddings(["alpha"]).shape == (1, 32)
+
+
+def test_unreachable_sidecar_raises_connection_error(tmp_path):
+    client = SidecarEmbeddings(str(tmp_path / "missing.sock"), timeout=1)
+
+    with pytest.raises(ConnectionError):
+        client.get_embeddings(["alpha"])
+
+
+def test_requests_in_a_deadline_stage_time_out_with_it(sidecar):
+    """A search stage does not keep waiting on the sidecar after its deadline."""
+    fake, socket_path = sidecar
+    client = SidecarEmbeddings(socket_path, timeout=5)
+    client.get_embeddings(["connect"])
+    fake.latency = 1.0
+    waited = []
+
+    def stage():
+        start = time.monotonic()
+        try:
+            client.get_embeddings(["slow"])
+        finally:
+            waited.append(time.monotonic() - start)
+
+    with pytest.raises((DeadlineExceeded, ConnectionError, TimeoutError)):
+        Deadline(0.2).run("embed_query", stage)
+    deadline = time.monotonic() + 2
+    while not waited and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert waited and waited[0] < 0.5
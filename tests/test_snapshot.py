@@ -0,0 +1,40 @@
+"""
+Tests for snapshot export and import.
+"""
+from unittest.mock import patch
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from app.processing.batch import ChunkBatch
+from app.storage.qdrant_client import QdrantStorage
+from app.storage.snapshot import export_collection, import_collection, load_vectors, read_manifest
+
+
+def test_export_import_roundtrip(tmp_path):
+    """Points, vectors and payloads survive an export/import cycle."""
+    source = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=4)
+    batch = ChunkBatch.from_texts(["a", "b"], {"url": "https://example.com/1", "source": "web"})
+    batch.add_document(["c"], {"url": "https://example.com/2", "source": "web", "title": "Two"})
+    vectors = np.random.default_rng(0).standard_normal((3, 4)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    source.store_embeddings(batch, vectors, tenant_id="acme")
+
+    manifest = export_collection(source.client, "kb", str(tmp_path), batch_size=2)
+
+    assert manifest["count"] == 3
+    assert read_manifest(str(tmp_path))["vector_size"] == 4
+    assert load_vectors(str(tmp_path)).shape == (3, 4)
+
+    target = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="restored", vector_size=4)
+    with patch.object(target.client, "delete", wraps=target.client.delete) as delete:
+        assert import_collection(target.client, "restored", str(tmp_path), batch_size=2, parallel=1) == 3
+    # The import ends with a barrier waiting for the unacknowledged batches.
+    assert delete.call_count == 1 and delete.call_args.kwargs["wait"] is True
+
+    original = {p.id: p for p in source.client.scroll("kb", limit=10, with_vectors=True)[0]}
+    restored = {p.id: p for p in target.client.scroll("restored", limit=10, with_vectors=True)[0]}
+    assert original.keys() == restored.keys()
+    for point_id, point in original.items():
+        assert restored[point_id].payload == point.payload
+        assert np.allclose(restored[point_id].vector, point.vector)
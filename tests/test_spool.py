@@ -0,0 +1,171 @@
+"""
+Tests for retries and the durable ingestion spool.
+"""
+from unittest.mock import patch
+
+import httpx
+import pytest
+from qdrant_client import QdrantClient
+
+from app.knowledge_base import IngestionDeferred, KnowledgeBase
+from app.processing.batch import ChunkBatch
+from app.processing.fakes import FakeEmbeddings
+from app.retry import RetryPolicy, call_with_retry, is_transient
+from app.scraper.fake import FakeScraperProvider
+from app.storage.qdrant_client import QdrantStorage
+from app.storage.spool import IngestionSpool, CHUNKED
+
+SITE = "https://docs.example.com/"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.texts_embedded = 0
+
+    def get_embeddings(self, texts, token_counts=None):
+        self.texts_embedded += len(texts)
+        return super().get_embeddings(texts)
+
+
+@pytest.fixture
+def kb(tmp_path):
+    with patch("app.knowledge_base.QdrantStorage"), patch("app.knowledge_base.get_embedding_provider"):
+        kb = KnowledgeBase()
+    kb.scraper = FakeScraperProvider(pages=3, paragraphs=4)
+    kb.embedder = CountingEmbeddings(dimension=8)
+    kb.storage = QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=8)
+    kb.spool = IngestionSpool(str(tmp_path / "spool.db"), clock=Clock())
+    kb.retry_policy = RetryPolicy(attempts=2, base_delay=0)
+    return kb
+
+
+def test_call_with_retry_backs_off_until_success():
+    calls, sleeps = [], []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("down")
+        return "ok"
+
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=1.5)
+    assert call_with_retry(flaky, policy, sleep=sleeps.append) == "ok"
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] < 1.0 and 0 <= sleeps[1] < 1.5
+    assert [policy.delay(retry, rng=lambda: 0.999) for retry in (1, 2, 3)] == pytest.approx([0.999, 1.4985, 1.4985])
+
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        call_with_retry(flaky, RetryPolicy(attempts=2, base_delay=0), sleep=sleeps.append)
+    assert len(calls) == 2
+
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_only_transient_errors_are_retried_by_default():
+    wrapped = RuntimeError("request failed")
+    wrapped.__cause__ = httpx.ConnectError("refused")
+    assert all(is_transient(e) for e in (ConnectionError(), TimeoutError(), StatusError(429), StatusError(503), wrapped))
+    assert not any(is_transient(e) for e in (ValueError("bad input"), StatusError(400), StatusError(404)))
+
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        call_with_retry(invalid, RetryPolicy(attempts=3, base_delay=0), sleep=lambda delay: None)
+    assert len(calls) == 1
+
+    # Callers can opt in to retrying more.
+    with pytest.raises(ValueError):
+        call_with_retry(invalid, RetryPolicy(attempts=3, base_delay=0), retry_on=(ValueError,), sleep=lambda delay: None)
+    assert len(calls) == 4
+
+def test_store_outage_resumes_from_spooled_embeddings(kb):
+    store = kb.storage.store_embeddings
+    with patch.object(kb.storage, "store_embeddings", side_effect=ConnectionError("qdrant down")):
+        with pytest.raises(IngestionDeferred) as deferred:
+            kb.process_website(SITE, depth=2)
+
+    status = deferred.value.status
+    assert status["state"] == "pending"
+    # The first page got as far as its embeddings; the rest keep their chunks.
+    assert (status["pages"]["embedded"], status["pages"]["chunked"]) == (1, 2)
+    assert "qdrant down" in status["last_error"]
+
+    # Still backing off, so a regular drain leaves the job alone.
+    assert kb.spool.ready_jobs() == []
+    kb.spool._clock.now += 3600
+    assert kb.spool.ready_jobs() == [status["job_id"]]
+
+    with patch.object(kb.storage, "store_embeddings", side_effect=store):
+        assert kb.drain_spool() == 1
+
+    final = kb.job_status(status["job_id"])
+    assert final["state"] == "done"
+    # No chunk was embedded twice.
+    assert kb.embedder.texts_embedded == final["chunks_created"]
+    assert final["vectors_stored"] == final["chunks_created"] == kb.storage.client.count("kb").count
+
+
+def test_failure_after_every_page_is_stored_finishes_the_job(kb):
+    """A failure once nothing is pending defers no pages and keeps the job's results."""
+    with patch.object(kb, "_observe_pages", side_effect=RuntimeError("tracking down")):
+        result = kb.process_website(SITE, depth=2)
+
+    assert kb.job_status(result["job_id"])["state"] == "done"
+    assert result["vectors_stored"] == kb.storage.client.count("kb").count > 0
+
+
+def test_draining_a_job_keeps_the_shared_chunker_strategy(kb):
+    """A job spooled with another strategy is chunked with it, without changing other ingests'."""
+    job = kb.spool.create_job(SITE, None, "sentence", "2024-01-01T00:00:00")
+    kb.spool.add_page(job.id, {"url": SITE, "text": "One sentence. Another sentence."}, SITE)
+    kb.spool.finish_scrape(job.id)
+    kb.chunker.strategy = "paragraph"
+
+    assert kb.drain_job(job.id) == "done"
+    assert kb.chunker.strategy == "paragraph"
+
+
+def test_reingesting_overwrites_the_same_points(kb):
+    first = kb.process_website(SITE, depth=2)
+    second = kb.process_website(SITE, depth=2)
+
+    assert second["vectors_stored"] == first["vectors_stored"]
+    assert kb.storage.client.count("kb").count == first["vectors_stored"]
+    assert second["job_id"] != first["job_id"]
+
+
+def test_leases_keep_pages_with_one_worker(tmp_path):
+    clock = Clock()
+    spool = IngestionSpool(str(tmp_path / "spool.db"), lease_seconds=60, clock=clock)
+    job = spool.create_job(SITE, None, "paragraph", "2024-01-01T00:00:00")
+    spool.add_page(job.id, {"url": SITE, "text": "Hello"}, SITE)
+    spool.finish_scrape(job.id)
+
+    (page,) = spool.claim(job.id)
+    batch = ChunkBatch.from_texts(["Hello"], {"url": SITE}, token_counts=[1])
+    spool.save_chunks(page, batch)
+    assert spool.claim(job.id) == []
+
+    clock.now += 61
+    (reclaimed,) = spool.claim(job.id)
+    assert reclaimed.state == CHUNKED
+    assert reclaimed.batch.to_dicts() == batch.to_dicts()
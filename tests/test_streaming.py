@@ -0,0 +1,57 @@
+"""
+Tests for NDJSON streaming helpers.
+"""
+import asyncio
+import json
+
+from app.streaming import stream_ndjson
+
+
+def _collect(async_iterable, limit=None):
+    async def run():
+        lines = []
+        async for line in async_iterable:
+            lines.append(line)
+            if limit is not None and len(lines) >= limit:
+                break
+        await async_iterable.aclose()
+        return lines
+    return asyncio.run(run())
+
+
+def test_stream_ndjson_yields_one_line_per_item():
+    """Each item is serialized as a separate JSON line."""
+    lines = _collect(stream_ndjson([{"url": "https://a"}, {"url": "https://b"}]))
+
+    assert [json.loads(line) for line in lines] == [{"url": "https://a"}, {"url": "https://b"}]
+    assert all(line.endswith(b"\n") for line in lines)
+
+
+def test_stream_ndjson_closes_producer_on_early_exit():
+    """Stopping consumption closes the producer so no further pages are fetched."""
+    state = {"produced": 0, "closed": False}
+
+    def pages():
+        try:
+            for i in range(100):
+                state["produced"] += 1
+                yield {"index": i}
+        finally:
+            state["closed"] = True
+
+    lines = _collect(stream_ndjson(pages()), limit=2)
+
+    assert len(lines) == 2
+    assert state["produced"] == 2
+    assert state["closed"]
+
+
+def test_stream_ndjson_reports_producer_errors():
+    """A failing producer ends the stream with an error line."""
+    def pages():
+        yield {"index": 0}
+        raise RuntimeError("crawl failed")
+
+    lines = _collect(stream_ndjson(pages()))
+
+    assert json.loads(lines[-1]) == {"status": "error", "detail": "crawl failed"}
@@ -0,0 +1,118 @@
+"""
+Tests for multi-tenant storage.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from app.processing.batch import ChunkBatch
+from app.storage.qdrant_client import QdrantStorage, validate_tenant_id
+
+
+@pytest.fixture
+def storage():
+    return QdrantStorage(client=QdrantClient(location=":memory:"), collection_name="kb", vector_size=4)
+
+
+def store(storage, tenant_id, url, texts):
+    batch = ChunkBatch.from_texts(texts, {"url": url, "source": "web"})
+    vectors = np.tile(np.array([1, 0, 0, 0], dtype=np.float32), (len(texts), 1))
+    return storage.store_embeddings(batch, vectors, tenant_id=tenant_id)
+
+
+def test_search_is_scoped_to_tenant(storage):
+    """A tenant only sees its own chunks, even for the same URL."""
+    store(storage, "acme", "https://example.com", ["acme chunk"])
+    store(storage, "globex", "https://example.com", ["globex chunk"])
+
+    results = storage.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="acme")
+
+    assert [result["text"] for result in results] == ["acme chunk"]
+
+
+def test_tenantless_requests_only_see_untenanted_chunks(storage):
+    """Without a tenant, search and delete leave every tenant's chunks alone."""
+    store(storage, "acme", "https://example.com", ["acme chunk"])
+    store(storage, None, "https://example.com", ["public chunk"])
+
+    results = storage.search([1.0, 0.0, 0.0, 0.0], limit=10)
+
+    assert [result["text"] for result in results] == ["public chunk"]
+    assert [chunk["text"] for chunk in storage.page_chunks("https://example.com")] == ["public chunk"]
+    assert storage.delete_by_url("https://example.com") == 1
+    assert [result["text"] for result in storage.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="acme")] == ["acme chunk"]
+
+
+def test_delete_is_scoped_to_tenant(storage):
+    """Deleting a URL for one tenant keeps other tenants' copies."""
+    store(storage, "acme", "https://example.com", ["a", "b"])
+    store(storage, "globex", "https://example.com", ["c"])
+
+    assert storage.delete_by_url("https://example.com", tenant_id="acme") == 2
+    assert len(storage.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="globex")) == 1
+
+
+def test_promote_tenant_moves_points_to_dedicated_collection(storage):
+    """Promotion moves the tenant's points and routes later reads and writes."""
+    store(storage, "acme", "https://example.com/1", ["a", "b"])
+    store(storage, "globex", "https://example.com/2", ["c"])
+
+    assert storage.promote_tenant("acme", cleanup_delay=0) == 2
+
+    dedicated = storage.dedicated_collection_name("acme")
+    assert storage.client.count(dedicated).count == 2
+    assert storage.client.count("kb").count == 1
+
+    store(storage, "acme", "https://example.com/3", ["d"])
+    assert storage.client.count(dedicated).count == 3
+    assert {r["text"] for r in storage.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="acme")} == {"a", "b", "d"}
+
+
+def test_promotion_keeps_shared_copies_until_other_workers_refresh(storage):
+    """Workers that have not noticed the promotion yet still find the tenant's points."""
+    store(storage, "acme", "https://example.com/1", ["a", "b"])
+    other_worker = QdrantStorage(client=storage.client, collection_name="kb", vector_size=4)
+
+    promotion = threading.Thread(target=storage.promote_tenant, args=("acme",), kwargs={"cleanup_delay": 0.5})
+    promotion.start()
+    time.sleep(0.2)
+
+    assert not other_worker._is_dedicated("acme")
+    assert len(other_worker.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="acme")) == 2
+    assert len(storage.search([1.0, 0.0, 0.0, 0.0], limit=10, tenant_id="acme")) == 2
+
+    promotion.join()
+    assert storage.client.count("kb").count == 0
+    assert storage.client.count(storage.dedicated_collection_name("acme")).count == 2
+
+
+
+def test_failed_copy_keeps_the_shared_points(storage):
+    """Nothing is deleted from the shared collection unless every copy was applied."""
+    store(storage, "acme", "https://example.com/1", ["a", "b"])
+
+    with patch.object(storage.client, "upsert", side_effect=ConnectionError("qdrant down")):
+        with pytest.raises(ConnectionError):
+            storage.promote_tenant("acme", cleanup_delay=0)
+
+    assert storage.client.count("kb").count == 2
+    assert storage.promote_tenant("acme", cleanup_delay=0) == 2
+    assert storage.client.count("kb").count == 0
+
+
+def test_reingesting_overwrites_points(storage):
+    """Point IDs are deterministic per tenant, URL and chunk index."""
+    first = store(storage, "acme", "https://example.com", ["a", "b"])
+    second = store(storage, "acme", "https://example.com", ["a2", "b2"])
+
+    assert first == second
+    assert storage.client.count("kb").count == 2
+
+
+def test_invalid_tenant_id_is_rejected():
+    with pytest.raises(ValueError):
+        validate_tenant_id("../etc")
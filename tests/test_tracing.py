@@ -0,0 +1,65 @@
+"""
+Tests for request tracing and the sampling profiler.
+"""
+import threading
+import time
+
+from app.profiling import SamplingProfiler
+from app.tracing import current_trace, end_trace, span, start_trace
+
+
+def test_spans_are_recorded_and_aggregated():
+    """Spans of the same name are summed into one Server-Timing entry."""
+    token = start_trace("POST /api/kb/process")
+    with span("embed"):
+        pass
+    with span("embed"):
+        pass
+    with span("store"):
+        pass
+    trace = end_trace(token)
+
+    totals = trace.totals()
+    assert totals["embed"]["count"] == 2
+    assert totals["store"]["count"] == 1
+    assert trace.server_timing().startswith("embed;dur=")
+    assert "total;dur=" in trace.server_timing()
+    assert current_trace() is None
+
+
+def test_span_without_trace_is_noop():
+    """Outside a request, span() records nothing."""
+    with span("embed"):
+        pass
+    assert current_trace() is None
+
+
+def busy_function(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_busy_thread_and_stops_after_requests():
+    """The profiler collects folded stacks and disarms after N requests."""
+    profiler = SamplingProfiler(interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_function, args=(stop,))
+    worker.start()
+    try:
+        profiler.arm(2)
+        time.sleep(0.1)
+        profiler.request_finished()
+        assert profiler.active
+        profiler.request_finished()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.active
+    folded = profiler.folded()
+    assert "busy_function" in folded
+    stack, count = folded.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+    # Frames carry no line numbers, so one busy function folds into a single frame.
+    assert f"busy_function ({__file__})" in folded
+    assert f"{__file__}:" not in folded
@@ -0,0 +1,121 @@
+"""
+Tests for the batched, parallel upload path of QdrantStorage.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct
+
+from app.processing.batch import ChunkBatch
+from app.storage.qdrant_client import QdrantStorage, upload_batches
+
+
+class RecordingClient:
+    """Thread-safe wrapper of the local client that records upserts as a remote server would see them."""
+
+    # Not the in-process client, as far as QdrantStorage can tell, so uploads run in parallel.
+    _client = None
+
+    def __init__(self, delay=0.02, fail_on=None):
+        self._inner = QdrantClient(location=":memory:")
+        self._lock = threading.Lock()
+        self.delay = delay
+        self.fail_on = fail_on
+        self.calls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def upsert(self, points, wait=True, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.calls.append(("upsert", len(points), wait))
+            number = len(self.calls)
+        try:
+            time.sleep(self.delay)
+            if number == self.fail_on:
+                raise ConnectionError("upsert failed")
+            with self._lock:
+                return self._inner.upsert(points=points, wait=wait, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def delete(self, points_selector, wait=True, **kwargs):
+        with self._lock:
+            self.calls.append(("delete", self.in_flight, wait))
+            return self._inner.delete(points_selector=points_selector, wait=wait, **kwargs)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._inner, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+
+def make_batch(count):
+    return ChunkBatch.from_dicts(
+        {"text": f"Chunk {i} " + "x" * 100, "url": f"https://a.example/{i // 10}", "chunk_index": i % 10}
+        for i in range(count)
+    )
+
+
+def test_batches_are_sized_by_bytes():
+    points = [PointStruct(id=i, vector=[0.0] * 100, payload={"text": "x" * 744}) for i in range(10)]
+    # Each point is estimated at 100 * 12 + 744 + 256 = 2200 bytes.
+    assert [len(batch) for batch in upload_batches(iter(points), max_bytes=5000)] == [2, 2, 2, 2, 2]
+    assert [len(batch) for batch in upload_batches(iter(points), max_bytes=100)] == [1] * 10
+    assert [len(batch) for batch in upload_batches(iter(points), max_bytes=10 ** 9, max_points=4)] == [4, 4, 2]
+
+
+def test_parallel_upload_without_wait_ends_with_a_barrier():
+    client = RecordingClient()
+    storage = QdrantStorage(client=client, collection_name="kb", vector_size=8)
+    # 8 * 12 + 1 + 256 = 353 bytes per point, 4 points per request.
+    points = (PointStruct(id=i, vector=[1.0] * 8, payload={"text": "t"}) for i in range(60))
+
+    assert storage.upload_points(points, wait=False, batch_bytes=4 * 353, parallel=3) == 60
+
+    upserts = [call for call in client.calls if call[0] == "upsert"]
+    assert [size for _, size, _ in upserts] == [4] * 15
+    assert all(wait is False for _, _, wait in upserts)
+    assert 1 < client.peak_in_flight <= 3
+    # The barrier comes last, once no upsert is in flight, and waits.
+    assert client.calls[-1] == ("delete", 0, True)
+    assert client.count("kb").count == 60
+
+
+def test_store_embeddings_uploads_in_parallel_and_returns_ids():
+    client = RecordingClient(delay=0.01)
+    storage = QdrantStorage(client=client, collection_name="kb", vector_size=8)
+    batch = make_batch(40)
+    vectors = np.random.default_rng(1).standard_normal((40, 8)).astype(np.float32)
+
+    with patch("app.storage.qdrant_client.QDRANT_UPLOAD_WAIT", True):
+        point_ids = storage.store_embeddings(batch, vectors)
+
+    assert len(point_ids) == 40
+    assert client.count("kb").count == 40
+    assert all(call[2] is True for call in client.calls if call[0] == "upsert")
+    assert not any(call[0] == "delete" for call in client.calls)
+    results = storage.search(vectors[5].tolist(), limit=1)
+    assert results[0]["id"] == point_ids[5] and results[0]["text"] == batch.texts[5]
+
+
+def test_failed_batch_raises_after_in_flight_batches_finish():
+    client = RecordingClient(fail_on=2)
+    storage = QdrantStorage(client=client, collection_name="kb", vector_size=8)
+    points = (PointStruct(id=i, vector=[1.0] * 8, payload={"text": "t"}) for i in range(40))
+
+    with pytest.raises(ConnectionError):
+        storage.upload_points(points, wait=False, batch_bytes=400, parallel=4)
+    assert client.in_flight == 0
+    assert not any(call[0] == "delete" for call in client.calls)